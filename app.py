@@ -1,96 +1,331 @@
 # app.py
 import os
-os.environ["TOKENIZERS_PARALLELISM"] = "false"  
-from flask import Flask, request, jsonify
-from utils.servicenow_api import update_ticket_v2, set_fields_and_note
-from chains.diagnose_chain import diagnose_issue
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+import copy
+import hmac
+import json
+import time
+from flask import Flask, request, jsonify, Response, stream_with_context, g
+from utils.metrics import (
+    configure_logging, timed, render_metrics, register_collector, HTTP_LATENCY
+)
+from utils.tracing import (
+    start_trace, end_trace, tag_current, trace, current_request_id, REQUEST_ID_HEADER
+)
+configure_logging()
+from utils.servicenow_api import build_incident_update, map_assignment_group
+from utils.servicenow_batch import write_incident_update, get_write_stats
+from utils.vector_store import search_similar, encode_query
+from utils.llm_utils import stream_llm_response
+from utils import action_classifier
+from utils.playbooks import match_playbook, format_playbook, get_playbook_stats
+from utils.tenant_registry import (
+    get_tenant_registry, get_tenant_stats, known_tenant, is_default_tenant, DEFAULT_TENANT, TENANT_HEADER
+)
+from utils.http_client import get_backend_stats
+from utils.rate_limiter import get_limiter_stats
+from utils.job_queue import get_job_queue, JobFailed
+from utils.circuit_breaker import get_breaker_stats
+from utils.profiler import profile_for, install_signal_handler, ProfilerBusy
+from utils.single_flight import get_single_flight, ticket_key, content_key, DEDUP_BY_CONTENT
+from chains.diagnose_chain import (
+    diagnose_issue,
+    predict_assignment_group_with_confidence
+)
+from chains.consolidated_chain import diagnose_and_decide
 from chains.agent_chain import (
     create_incident_agent,
-    process_incident,
-    tools  # ✅ Import tools from agent_chain
-)
-
-# Import MCP functions directly
-from mcp_agents.tools import (
-    retry_order_mcp,
-    sync_customer_data_mcp,
-    fix_asset_mismatch_mcp,
-    create_invoice_mcp
+    process_incident
 )
+from chains.remediation_planner import build_plan, execute_plan, get_planner_stats
+from mcp_agents.tools import get_batching_stats
 
 app = Flask(__name__)
 
+# One structured LLM call per ticket instead of separate suggestion /
+# assignment-group / decision / invoice prompts
+CONSOLIDATED_LLM_MODE = os.getenv("CONSOLIDATED_LLM_MODE", "false").lower() == "true"
+# Return 202 after the decision; MCP + ServiceNow updates run on the job queue
+ASYNC_REMEDIATION = os.getenv("ASYNC_REMEDIATION", "false").lower() == "true"
+# /admin/* is disabled unless set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
 # Initialize LangChain Agent
 agent = create_incident_agent()
 
-@app.route("/", methods=["GET"])
-def health_check():
-    return jsonify({"status": "healthy", "service": "ServiceNow RAG API"})
 
-@app.route("/incident", methods=["POST"])
-def search_incident():
-    data = request.get_json()
-    query = data.get("query", "")
-    configuration_item = data.get("configuration_item", "")
-    # Accept both keys so Postman can send either
-    ticket_id = data.get("ticket_id") or data.get("sys_id")
-    top_k = data.get("top_k", 5)
+# Scrapes would drown the trace file; a profile run is slow by design
+UNTRACED_PATHS = {"/metrics", "/admin/profile"}
 
-    if not query.strip():
-        return jsonify({"status": "error", "message": "Query required"}), 400
 
-    # --------------------------------------------------------------
-    # STEP 1 — RAG Pipeline (retrieve similar incidents)
-    # --------------------------------------------------------------
-    rag_result = diagnose_issue(query, top_k, configuration_item)
+@app.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+    if request.path not in UNTRACED_PATHS:
+        g.trace = start_trace(
+            f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+            request_id=request.headers.get(REQUEST_ID_HEADER),
+            http_method=request.method,
+            http_path=request.path,
+        )
 
-    # --------------------------------------------------------------
-    # STEP 2 — Decision Engine (safe automation)
-    # --------------------------------------------------------------
-    decision = process_incident(query, configuration_item, agent)
 
-    # --------------------------------------------------------------
-    # STEP 3 — If automation is allowed → run MCP tool
-    # --------------------------------------------------------------
-    mcp_result = None
-    if decision.get("automation_allowed"):
-        action = decision.get("approved_action")
-        payload = decision.get("payload")
-
-        # ✅ Map action names to actual MCP functions
-        action_map = {
-            "retry_order": retry_order_mcp,
-            "update_order": retry_order_mcp,  # Same function handles both
-            "sync_customer_data": sync_customer_data_mcp,
-            "fix_asset_mismatch": fix_asset_mismatch_mcp,
-            "create_invoice": create_invoice_mcp,
-            "update_invoice": create_invoice_mcp  # Same function handles both
-        }
+@app.after_request
+def _record_request(response):
+    start = g.get("request_start")
+    if start is not None:
+        # Streaming responses are measured to the first byte only
+        HTTP_LATENCY.observe(
+            time.perf_counter() - start,
+            endpoint=request.url_rule.rule if request.url_rule else "unmatched",
+            method=request.method,
+            status=response.status_code,
+        )
+    root, token = g.pop("trace", None) or (None, None)
+    if root is not None:
+        root.tag(http_status_code=response.status_code)
+        response.headers[REQUEST_ID_HEADER] = root.trace.request_id
+        # Closed once the body is fully sent, so streamed responses are covered to the last event
+        response.call_on_close(lambda: end_trace(root, token))
+    return response
 
-        try:
-            mcp_func = action_map.get(action)
-
-            if not mcp_func:
-                mcp_result = {
-                    "status": "error",
-                    "message": f"No MCP function mapped for action: {action}"
-                }
-            else:
-                # For invoice actions, pass payload
-                if action in ["create_invoice", "update_invoice"]:
-                    if payload:
-                        mcp_result = mcp_func(payload)
-                    else:
-                        mcp_result = {
-                            "status": "error",
-                            "message": "Invoice action requires payload"
-                        }
-                else:
-                    # For other actions, pass the query or CI
-                    mcp_result = mcp_func(query)
 
-        except Exception as e:
-            mcp_result = {"status": "error", "message": str(e)}
+def _parse_bool(value, default: bool) -> bool:
+    """JSON true/false, or the strings / numbers clients send instead."""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value != 0
+    text = str(value).strip().lower()
+    if text in ("true", "1", "yes", "on"):
+        return True
+    if text in ("false", "0", "no", "off", ""):
+        return False
+    raise ValueError(f"expected a boolean, got {value!r}")
+
+
+def _read_incident_request():
+    data = request.get_json() or {}
+    # Body wins over the header; neither means the default index
+    tenant = data.get("tenant") or request.headers.get(TENANT_HEADER) or DEFAULT_TENANT
+    tag_current(
+        ticket_id=data.get("ticket_id") or data.get("sys_id"),
+        configuration_item=data.get("configuration_item"),
+        query_chars=len(data.get("query") or ""),
+        tenant=tenant,
+    )
+    default_top_k = 5
+    if not is_default_tenant(tenant) and known_tenant(tenant):
+        default_top_k = get_tenant_registry().config(tenant).get("top_k", default_top_k)
+    return {
+        "query": data.get("query", ""),
+        "configuration_item": data.get("configuration_item", ""),
+        # Accept both keys so Postman can send either
+        "ticket_id": data.get("ticket_id") or data.get("sys_id"),
+        "tenant": tenant,
+        "top_k": data.get("top_k", default_top_k),
+        # Per-request override of ASYNC_REMEDIATION
+        "async": _parse_bool(data.get("async"), ASYNC_REMEDIATION),
+    }
+
+
+def run_remediation(decision: dict, query: str, configuration_item: str = ""):
+    """
+    STEP 3 — Run the planned MCP call (at most one per ticket).
+    Returns {"mcp_action_result", "remediation_calls"}; mcp_action_result is None
+    when nothing was planned.
+    """
+    with timed("remediation"):
+        plan = build_plan(query, configuration_item, decision)
+        return execute_plan(plan)
+
+
+def update_ticket(ticket_id: str, final_output: dict):
+    """
+    STEP 5 — Update ServiceNow Ticket.
+    Adds the ticket_* status keys to final_output in place. Goes to the
+    ticket's tenant instance (SERVICENOW_* for the default tenant).
+    """
+    tenant = final_output.get("tenant")
+    AI_SUGGESTION_FIELD = os.getenv("AI_SUGGESTION_FIELD", "u_ai_suggestion")
+    CONFIDENCE_THRESHOLD = float(os.getenv("AI_CONFIDENCE_THRESHOLD", "0.9"))
+
+    # Pull values from your final_output (as in your Postman response)
+    ai_suggestion = final_output.get("ai_suggestion", "")
+    decision      = (final_output.get("decision_engine") or {})
+    mcp_result    = (final_output.get("mcp_action_result") or {})  # may be None → {}
+
+    automation_allowed = bool(decision.get("automation_allowed", False))
+    confidence         = float(decision.get("confidence") or 0.0)
+    decision_reason    = decision.get("reason") or "No decision reason provided."
+    llm_raw            = decision.get("llm_raw_output") or ""
+    mcp_status         = mcp_result.get("status")
+    mcp_message        = mcp_result.get("message", "No MCP message")
+    approved_action    = decision.get("approved_action") or "N/A"
+    payload_summary    = decision.get("payload")
+
+    # 1) Store AI suggestion in custom field + add a context work note
+    base_note = (
+        f"AI suggestion saved to '{AI_SUGGESTION_FIELD}'.\n"
+        f"Decision reason: {decision_reason}\n"
+        f"MCP status: {mcp_status}\n"
+        f"MCP message: {mcp_message}"
+    )
+
+    # 2) Auto-resolve if automation succeeded and confidence is high
+    success_criteria = automation_allowed and (mcp_status == "success") and (confidence >= CONFIDENCE_THRESHOLD)
+
+    if success_criteria:
+        resolution_text = (
+            "Resolved by AI automation.\n"
+            f"Approved action: {approved_action}\n"
+            f"Confidence: {confidence:.2f}\n"
+            f"Payload: {payload_summary}\n"
+            f"MCP Result: {mcp_result}\n"
+        )
+        update_type, update_message = "resolve", resolution_text
+
+    else:
+        # 3) On fail/low confidence/not allowed → write detailed failure context to Work Notes and keep ticket in progress
+        fail_bits = []
+        if not automation_allowed: fail_bits.append("automation not allowed")
+        if mcp_result.get("circuit_open"):
+            fail_bits.append(f"remediation backend '{mcp_result.get('backend')}' unavailable (circuit breaker open), not attempted")
+        elif mcp_status != "success": fail_bits.append(f"MCP status: {mcp_status}")
+        if confidence < CONFIDENCE_THRESHOLD: fail_bits.append(f"low confidence ({confidence:.2f} < {CONFIDENCE_THRESHOLD})")
+        fail_reason = ", ".join(fail_bits) or "Unspecified"
+
+        failure_note = (
+            "AI could not auto-resolve.\n"
+            f"Failure reason: {fail_reason}\n\n"
+            f"AI Failure Message (from suggestion):\n{ai_suggestion}\n\n"
+            f"Decision reason: {decision_reason}\n"
+            f"LLM raw output: {llm_raw}\n"
+            f"Payload: {payload_summary}\n"
+            f"MCP Result: {mcp_result}\n"
+        )
+        update_type, update_message = "escalate", failure_note
+
+    field_updates = {AI_SUGGESTION_FIELD: ai_suggestion}
+    if update_type == "escalate":
+        # Route to the human team under the tenant's own group name, when mapped
+        mapped_group = map_assignment_group(final_output.get("assignment_group"), tenant)
+        if mapped_group:
+            field_updates["assignment_group"] = mapped_group
+
+    # 4) Field + work note + state change go out as ONE PATCH (batched if SNOW_BATCH_ENABLED)
+    payload = build_incident_update(
+        field_updates=field_updates,
+        note_text=base_note,
+        update_type=update_type,
+        message=update_message,
+    )
+    with timed("ticket_update"):
+        ok, sn_resp = write_incident_update(ticket_id, payload, tenant)
+    final_output["ticket_ai_field_update_ok"] = ok
+    final_output["ticket_ai_field_update_resp"] = sn_resp
+    final_output["ticket_update_status"] = (
+        {"resolve": "resolved", "escalate": "escalated"}[update_type] if ok else f"{update_type}_failed"
+    )
+    final_output["ticket_update_response"] = sn_resp
+
+    return final_output
+
+
+def _remediation_job_result(final_output: dict) -> dict:
+    return {
+        key: final_output.get(key)
+        for key in ("mcp_action_result", "remediation_calls", "ticket_ai_field_update_ok",
+                    "ticket_update_status", "ticket_update_response")
+    }
+
+
+def remediation_job(payload: dict):
+    """Job-queue handler: STEP 3 + STEP 5 for a request answered with 202."""
+    final_output = payload["final_output"]
+    decision = final_output.get("decision_engine") or {}
+    # Same request ID as the /incident call that queued it
+    with trace("job:remediation", request_id=payload.get("request_id"), kind="CONSUMER",
+               ticket_id=payload.get("ticket_id")):
+        if "remediation_calls" not in final_output:
+            final_output.update(run_remediation(decision, final_output["query"], final_output["configuration_item"]))
+            # The MCP action (retry-order, create-invoice, ...) is not idempotent:
+            # store its result so a retry of STEP 5 never runs it again
+            try:
+                job_queue.checkpoint(payload)
+            except Exception as e:
+                raise JobFailed(f"remediation ran but its result could not be stored: {e}",
+                                result=_remediation_job_result(final_output))
+        if payload.get("ticket_id"):
+            update_ticket(payload["ticket_id"], final_output)
+    result = _remediation_job_result(final_output)
+
+    # Both steps ran; a failure in either must not read as "succeeded"
+    errors = []
+    mcp_result = final_output.get("mcp_action_result")
+    if isinstance(mcp_result, dict) and mcp_result.get("status") != "success":
+        errors.append(f"remediation {mcp_result.get('status')}: {mcp_result.get('message')}")
+    if payload.get("ticket_id") and not final_output.get("ticket_ai_field_update_ok"):
+        errors.append(f"ServiceNow update {final_output.get('ticket_update_status')}")
+    if errors:
+        raise JobFailed("; ".join(errors), result=result)
+    return result
+
+
+job_queue = get_job_queue()
+job_queue.register_handler("remediation", remediation_job)
+# Drain jobs left queued by a previous run without waiting for the next
+# enqueue. serve.py imports this module in the gunicorn master and starts
+# the queue in each worker after fork instead.
+if not os.getenv("APP_PRELOAD"):
+    job_queue.start()
+single_flight = get_single_flight()
+
+
+@app.route("/", methods=["GET"])
+def health_check():
+    return jsonify({
+        "status": "healthy",
+        "service": "ServiceNow RAG API",
+        "decision_fast_path": action_classifier.get_stats(),
+        "playbooks": get_playbook_stats(),
+        "tenants": get_tenant_stats(),
+        "mcp_backends": get_backend_stats(),
+        "mcp_batching": get_batching_stats(),
+        "remediation": get_planner_stats(),
+        "jobs": job_queue.stats(),
+        "servicenow_writes": get_write_stats(),
+        "dedup": single_flight.stats(),
+        "circuit_breakers": {name: b["state"] for name, b in get_breaker_stats().items()},
+    })
+
+def _resolve_incident(req: dict) -> dict:
+    """STEP 1-4 (STEP 3 only for synchronous requests); no ServiceNow writes."""
+    query = req["query"]
+    configuration_item = req["configuration_item"]
+    top_k = req["top_k"]
+    tenant = req["tenant"]
+
+    if CONSOLIDATED_LLM_MODE:
+        # ----------------------------------------------------------
+        # STEP 1+2 — RAG + Decision in a single structured LLM call
+        # ----------------------------------------------------------
+        with timed("consolidated"):
+            rag_result, decision = diagnose_and_decide(query, top_k, configuration_item, agent, tenant)
+    else:
+        # ----------------------------------------------------------
+        # STEP 1 — RAG Pipeline (retrieve similar incidents)
+        # ----------------------------------------------------------
+        with timed("diagnose"):
+            rag_result = diagnose_issue(query, top_k, configuration_item, tenant)
+
+        # ----------------------------------------------------------
+        # STEP 2 — Decision Engine (safe automation)
+        # ----------------------------------------------------------
+        with timed("decision"):
+            decision = process_incident(query, configuration_item, agent)
 
     # --------------------------------------------------------------
     # STEP 4 — Build Final Response
@@ -98,88 +333,285 @@ def search_incident():
     final_output = {
         "query": query,
         "configuration_item": configuration_item,
+        "tenant": tenant,
         "similar_items": rag_result.get("similar_items", []),
         "ai_suggestion": rag_result.get("ai_suggestion", ""),
+        "suggestion_source": rag_result.get("suggestion_source", "llm"),
+        "assignment_group": rag_result.get("assignment_group"),
         "decision_engine": decision,
         "automation_triggered": decision.get("automation_allowed", False),
-        "mcp_action_result": mcp_result,
+        "mcp_action_result": None,
     }
 
+    if not req["async"]:
+        # ----------------------------------------------------------
+        # STEP 3 — If automation is allowed → run MCP tool
+        # ----------------------------------------------------------
+        final_output.update(run_remediation(decision, query, configuration_item))
+
+    return final_output
+
+
+def _handle_incident(req: dict):
+    """Full /incident pipeline. Returns (final_output, http_status)."""
+    ticket_id = req["ticket_id"]
+
+    if DEDUP_BY_CONTENT and ticket_id:
+        # Identical query+CI on different tickets share the computation;
+        # each ticket still gets its own ServiceNow update below
+        shared, _ = single_flight.do(
+            content_key(req["query"], req["configuration_item"], req["tenant"]),
+            lambda: _resolve_incident(req),
+        )
+        final_output = copy.deepcopy(shared)
+    else:
+        final_output = _resolve_incident(req)
+
+    if req["async"]:
+        # ----------------------------------------------------------
+        # STEP 3+5 — queued; poll /jobs/<job_id> for the outcome
+        # ----------------------------------------------------------
+        job_id = job_queue.enqueue("remediation", {
+            "ticket_id": ticket_id, "final_output": final_output, "request_id": current_request_id()})
+        final_output["job_id"] = job_id
+        final_output["job_status_url"] = f"/jobs/{job_id}"
+        return final_output, 202
+
     # --------------------------------------------------------------
     # STEP 5 — Update ServiceNow Ticket (if ticket_id provided)
     # --------------------------------------------------------------
-    AI_SUGGESTION_FIELD = os.getenv("AI_SUGGESTION_FIELD", "u_ai_suggestion")
-    CONFIDENCE_THRESHOLD = float(os.getenv("AI_CONFIDENCE_THRESHOLD", "0.9"))
-
     if ticket_id:
-        # Pull values from your final_output (as in your Postman response)
-        ai_suggestion = final_output.get("ai_suggestion", "")
-        decision      = (final_output.get("decision_engine") or {})
-        mcp_result    = (final_output.get("mcp_action_result") or {})  # may be None → {}
-
-        automation_allowed = bool(decision.get("automation_allowed", False))
-        confidence         = float(decision.get("confidence") or 0.0)
-        decision_reason    = decision.get("reason") or "No decision reason provided."
-        llm_raw            = decision.get("llm_raw_output") or ""
-        mcp_status         = mcp_result.get("status")
-        mcp_message        = mcp_result.get("message", "No MCP message")
-        approved_action    = decision.get("approved_action") or "N/A"
-        payload_summary    = decision.get("payload")
-
-        # 1) Store AI suggestion in custom field + add a context work note
-        base_note = (
-            f"AI suggestion saved to '{AI_SUGGESTION_FIELD}'.\n"
-            f"Decision reason: {decision_reason}\n"
-            f"MCP status: {mcp_status}\n"
-            f"MCP message: {mcp_message}"
-        )
-        ok_set, sn_resp_set = set_fields_and_note(
-            ticket_id=ticket_id,
-            field_updates={AI_SUGGESTION_FIELD: ai_suggestion},
-            note_text=base_note
-        )
-        final_output["ticket_ai_field_update_ok"] = ok_set
-        final_output["ticket_ai_field_update_resp"] = sn_resp_set
-
-        # 2) Auto-resolve if automation succeeded and confidence is high
-        success_criteria = automation_allowed and (mcp_status == "success") and (confidence >= CONFIDENCE_THRESHOLD)
-
-        if success_criteria:
-            resolution_text = (
-                "Resolved by AI automation.\n"
-                f"Approved action: {approved_action}\n"
-                f"Confidence: {confidence:.2f}\n"
-                f"Payload: {payload_summary}\n"
-                f"MCP Result: {mcp_result}\n"
-            )
-            ok_resolve, sn_resp_resolve = update_ticket_v2(ticket_id, "resolve", resolution_text)
-            final_output["ticket_update_status"] = "resolved" if ok_resolve else "resolve_failed"
-            final_output["ticket_update_response"] = sn_resp_resolve
+        update_ticket(ticket_id, final_output)
+
+    # Always return the final output
+    return final_output, 200
+
+
+@app.route("/incident", methods=["POST"])
+def search_incident():
+    try:
+        req = _read_incident_request()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Invalid 'async': {e}"}), 400
+
+    if not req["query"].strip():
+        return jsonify({"status": "error", "message": "Query required"}), 400
+    if not known_tenant(req["tenant"]):
+        return jsonify({"status": "error", "message": f"Unknown tenant '{req['tenant']}'"}), 400
+
+    # Duplicate webhook deliveries attach to the in-flight run (or replay its result)
+    if req["ticket_id"]:
+        key = ticket_key(req["ticket_id"], req["tenant"],
+                         {field: req[field] for field in ("query", "configuration_item", "top_k", "async")})
+    elif DEDUP_BY_CONTENT:
+        key = content_key(req["query"], req["configuration_item"], req["tenant"])
+    else:
+        final_output, status = _handle_incident(req)
+        return jsonify(final_output), status
+
+    (final_output, status), how = single_flight.do(key, lambda: _handle_incident(req))
+    tag_current(dedup=how)
+    return jsonify({**final_output, "dedup": {"key": key, "status": how}}), status
+
+
+def _stats_metrics():
+    """Existing *_stats() snapshots, exported as gauges at scrape time."""
+    states = {"closed": 0, "half_open": 1, "open": 2}
+    yield ("circuit_breaker_state", "gauge", "0=closed 1=half_open 2=open",
+           [({"name": name}, states.get(b["state"], 0)) for name, b in get_breaker_stats().items()])
+    yield ("job_queue_jobs", "gauge", "Jobs by status",
+           [({"status": status}, n) for status, n in job_queue.stats().items()])
+    limiters = get_limiter_stats()
+    yield ("llm_limiter_queued", "gauge", "Calls waiting for LLM quota",
+           [({"provider": name}, s["queued"]) for name, s in limiters.items()])
+    yield ("llm_limiter_concurrency_limit", "gauge", "AIMD concurrency limit",
+           [({"provider": name}, s["concurrency_limit"]) for name, s in limiters.items()])
+    fast_path = action_classifier.get_stats()
+    yield ("decision_source_total", "counter", "Decisions by source",
+           [({"source": "local_classifier"}, fast_path["local_decisions"]),
+            ({"source": "llm"}, fast_path["llm_decisions"])])
+    dedup = single_flight.stats()
+    yield ("dedup_requests_total", "counter", "Single-flight outcomes",
+           [({"result": k}, dedup[k]) for k in ("leader", "joined", "replayed")])
+    writes = get_write_stats()
+    yield ("servicenow_requests_per_ticket", "gauge", "ServiceNow HTTP requests per updated ticket",
+           [({}, writes["requests_per_ticket"])])
+
+
+register_collector(_stats_metrics)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+def _admin_authorized() -> bool:
+    supplied = request.headers.get("X-Admin-Token") or request.headers.get("Authorization", "").removeprefix("Bearer ")
+    return hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode())
+
 
+@app.route("/admin/profile", methods=["POST"])
+def admin_profile():
+    """
+    Samples this worker's stacks for ?seconds= (default 10) every ?interval_ms= (default 5).
+    Returns collapsed stacks for flamegraph.pl / speedscope, or summary + stacks with ?format=json.
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({"status": "error", "message": "Not found"}), 404
+    if not _admin_authorized():
+        return jsonify({"status": "error", "message": "Unauthorized"}), 401
+    try:
+        seconds = float(request.args.get("seconds", 10))
+        interval_ms = float(request.args.get("interval_ms", 5))
+    except ValueError:
+        return jsonify({"status": "error", "message": "seconds and interval_ms must be numbers"}), 400
+    include_idle = request.args.get("include_idle", "false").lower() == "true"
+
+    try:
+        profiler = profile_for(seconds, interval_ms, include_idle)
+    except ProfilerBusy as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+
+    if request.args.get("format") == "json":
+        return jsonify({"pid": os.getpid(), **profiler.summary(), "collapsed": profiler.collapsed()}), 200
+    return Response(profiler.collapsed(), mimetype="text/plain",
+                    headers={"X-Profile-Pid": str(os.getpid()), "X-Profile-Samples": str(profiler.samples)})
+
+
+# `kill -USR2 <pid>` writes a profile under PROFILE_DIR
+install_signal_handler()
+
+
+@app.route("/breakers", methods=["GET"])
+def breaker_status():
+    """Circuit breaker state, rolling rates and recent transitions per dependency."""
+    return jsonify(get_breaker_stats()), 200
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Unknown job {job_id}"}), 404
+    return jsonify({
+        "job_id": job["id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }), 200
+
+
+def _sse(event: str, data) -> str:
+    """Formats one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@app.route("/incident/stream", methods=["POST"])
+def stream_incident():
+    """
+    Streaming variant of /incident (text/event-stream).
+    Events: retrieval → suggestion_token* (none for a playbook hit) → suggestion → decision →
+    remediation → ticket_update → done (final_output, same shape as /incident).
+    A failure part-way ends the stream with `error` ({"status", "message", "after"})
+    instead of cutting it off.
+    """
+    try:
+        req = _read_incident_request()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Invalid 'async': {e}"}), 400
+    query = req["query"]
+    configuration_item = req["configuration_item"]
+    ticket_id = req["ticket_id"]
+    top_k = req["top_k"]
+    tenant = req["tenant"]
+
+    if not query.strip():
+        return jsonify({"status": "error", "message": "Query required"}), 400
+    if not known_tenant(tenant):
+        return jsonify({"status": "error", "message": f"Unknown tenant '{tenant}'"}), 400
+
+    def events():
+        # STEP 1 — retrieval goes out as soon as FAISS returns
+        with timed("retrieval"):
+            similar_items = search_similar(query, top_k, tenant)
+        yield "retrieval", {"similar_items": similar_items}
+
+        # STEP 1b — precomputed cluster playbook, else suggestion tokens as the model produces them
+        playbook = match_playbook(encode_query(query)) if is_default_tenant(tenant) else None
+        if playbook:
+            ai_suggestion, suggestion_source = format_playbook(playbook[0]), "playbook"
         else:
-            # 3) On fail/low confidence/not allowed → write detailed failure context to Work Notes and keep ticket in progress
-            fail_bits = []
-            if not automation_allowed: fail_bits.append("automation not allowed")
-            if mcp_status != "success": fail_bits.append(f"MCP status: {mcp_status}")
-            if confidence < CONFIDENCE_THRESHOLD: fail_bits.append(f"low confidence ({confidence:.2f} < {CONFIDENCE_THRESHOLD})")
-            fail_reason = ", ".join(fail_bits) or "Unspecified"
-
-            failure_note = (
-                "AI could not auto-resolve.\n"
-                f"Failure reason: {fail_reason}\n\n"
-                f"AI Failure Message (from suggestion):\n{ai_suggestion}\n\n"
-                f"Decision reason: {decision_reason}\n"
-                f"LLM raw output: {llm_raw}\n"
-                f"Payload: {payload_summary}\n"
-                f"MCP Result: {mcp_result}\n"
-            )
-            ok_escalate, sn_resp_escalate = update_ticket_v2(ticket_id, "escalate", failure_note)
-            final_output["ticket_update_status"] = "escalated" if ok_escalate else "escalate_failed"
-            final_output["ticket_update_response"] = sn_resp_escalate
+            chunks = []
+            for text in stream_llm_response(query, similar_items, configuration_item):
+                chunks.append(text)
+                yield "suggestion_token", {"text": text}
+            ai_suggestion, suggestion_source = "".join(chunks).strip(), "llm"
 
-    # Always return the final output
-    return jsonify(final_output), 200
+        with timed("assignment_group"):
+            assignment_group, group_confidence, group_source = predict_assignment_group_with_confidence(
+                query, similar_items, tenant)
+        yield "suggestion", {
+            "ai_suggestion": ai_suggestion,
+            "suggestion_source": suggestion_source,
+            "assignment_group": assignment_group,
+            "assignment_group_confidence": round(group_confidence, 4),
+            "assignment_group_source": group_source,
+        }
 
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=False)
+        # STEP 2 — Decision Engine
+        with timed("decision"):
+            decision = process_incident(query, configuration_item, agent)
+        yield "decision", decision
+
+        # STEP 3 — MCP remediation
+        remediation = run_remediation(decision, query, configuration_item)
+        yield "remediation", remediation
+
+        final_output = {
+            "query": query,
+            "configuration_item": configuration_item,
+            "tenant": tenant,
+            "similar_items": similar_items,
+            "ai_suggestion": ai_suggestion,
+            "suggestion_source": suggestion_source,
+            "assignment_group": assignment_group,
+            "decision_engine": decision,
+            "automation_triggered": decision.get("automation_allowed", False),
+            **remediation,
+        }
+
+        # STEP 5 — ServiceNow update
+        if ticket_id:
+            update_ticket(ticket_id, final_output)
+            yield "ticket_update", {
+                key: final_output.get(key)
+                for key in ("ticket_ai_field_update_ok", "ticket_update_status", "ticket_update_response")
+            }
 
+        yield "done", final_output
+
+    def generate():
+        # Headers are already sent, so a failure can only be reported in-band
+        last_event = None
+        try:
+            for event, data in events():
+                last_event = event
+                yield _sse(event, data)
+        except Exception as e:
+            app.logger.exception("/incident/stream failed after %s", last_event or "start")
+            tag_current(error=str(e)[:200])
+            yield _sse("error", {"status": "error", "message": str(e), "after": last_event})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")), debug=False, threaded=True)
@@ -0,0 +1,214 @@
+# benchmarks/bench_compression.py
+"""
+Size, load time and recall@k of compressed embedding artifacts against
+the current float32 / IndexFlatIP ones.
+
+    python benchmarks/bench_compression.py                       # data_prep/embeddings_data.pkl
+    python benchmarks/bench_compression.py --synthetic 100000    # bench_retrieval's synthetic corpus
+    python benchmarks/bench_compression.py --variants float16:fp16,int8:sq8:pca128
+
+A variant is dtype:index[:pcaN], i.e. what
+`generate_embeddings.py --dtype <dtype> [--pca-dim N]` followed by
+`build_faiss_index.py --index <index>` would write. --queries records are
+held out of the corpus and used as queries. Ground truth is exact float32
+inner-product search over the rest, so recall@k is the share of the true
+top-k neighbours that each variant still returns. Search goes through
+embedding_codec.project_queries, the same path as search_similar.
+
+Load time is the median of --repeats warm-cache loads (pickle.load +
+faiss.read_index) in this process. Metadata unpickling is part of it and
+does not shrink, so `vectors_mb` is reported separately from the file size.
+"""
+import os
+import gc
+import sys
+import json
+import time
+import pickle
+import argparse
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_VARIANTS = ("float32:flat,float16:flat,float16:fp16,int8:sq8,"
+                    "float16:fp16:pca192,float16:fp16:pca128,int8:sq8:pca128")
+
+
+def parse_variant(spec: str) -> dict:
+    parts = spec.split(":")
+    if len(parts) not in (2, 3) or (len(parts) == 3 and not parts[2].startswith("pca")):
+        raise ValueError(f"bad variant '{spec}', expected dtype:index[:pcaN]")
+    return {"name": spec, "dtype": parts[0], "index": parts[1],
+            "pca_dim": int(parts[2][3:]) if len(parts) == 3 else 0}
+
+
+def build_index(vectors, index_type: str):
+    """Same index types as data_prep/build_faiss_index.py."""
+    import faiss
+
+    vectors = vectors.copy()
+    faiss.normalize_L2(vectors)
+    quantizers = {"fp16": faiss.ScalarQuantizer.QT_fp16, "sq8": faiss.ScalarQuantizer.QT_8bit}
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(vectors.shape[1])
+    elif index_type in quantizers:
+        index = faiss.IndexScalarQuantizer(vectors.shape[1], quantizers[index_type], faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+    else:
+        raise ValueError(f"unknown index type '{index_type}'")
+    index.add(vectors)
+    return index
+
+
+def median_load_s(index_file: str, embeddings_file: str, repeats: int) -> dict:
+    import faiss
+
+    def timed(fn):
+        samples = []
+        for _ in range(repeats):
+            gc.collect()
+            start = time.perf_counter()
+            obj = fn()
+            samples.append(time.perf_counter() - start)
+            del obj
+        return statistics.median(samples)
+
+    def load_pickle():
+        with open(embeddings_file, "rb") as f:
+            return pickle.load(f)
+
+    index_s = timed(lambda: faiss.read_index(index_file))
+    embeddings_s = timed(load_pickle)
+    return {"load.index_s": index_s, "load.embeddings_s": embeddings_s, "load.total_s": index_s + embeddings_s}
+
+
+def recall_at(found, truth, k: int) -> float:
+    hits = sum(len(set(f[:k]) & set(t[:k])) for f, t in zip(found, truth))
+    return hits / (k * len(truth))
+
+
+def run_variant(variant: dict, corpus, metadata, model_info, queries, truth, ks, repeats, workdir) -> dict:
+    import faiss
+    from utils.embedding_codec import compress, stored_vectors, project_queries
+
+    stored, codec = compress(corpus, variant["dtype"], variant["pca_dim"])
+    data = {"embeddings": stored, "codec": codec, "metadata": metadata,
+            "model_info": {**model_info, "stored_dim": stored.shape[1], "dtype": variant["dtype"]}}
+    tag = variant["name"].replace(":", "_")
+    embeddings_file = os.path.join(workdir, f"{tag}.pkl")
+    index_file = os.path.join(workdir, f"{tag}.index")
+    with open(embeddings_file, "wb") as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    faiss.write_index(build_index(stored_vectors(data), variant["index"]), index_file)
+
+    result = {
+        "size.embeddings_file_mb": os.path.getsize(embeddings_file) / 2 ** 20,
+        "size.vectors_mb": stored.nbytes / 2 ** 20,
+        "size.index_file_mb": os.path.getsize(index_file) / 2 ** 20,
+    }
+    result["size.total_mb"] = result["size.embeddings_file_mb"] + result["size.index_file_mb"]
+    result.update(median_load_s(index_file, embeddings_file, repeats))
+
+    index = faiss.read_index(index_file)
+    projected = project_queries(queries, codec)
+    start = time.perf_counter()
+    _, found = index.search(projected, max(ks))
+    result["search.per_query_s"] = (time.perf_counter() - start) / len(queries)
+    for k in ks:
+        result[f"recall@{k}"] = recall_at(found, truth, k)
+
+    os.remove(embeddings_file)
+    os.remove(index_file)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embeddings", default=os.path.join(ROOT, "data_prep", "embeddings_data.pkl"))
+    parser.add_argument("--index", default=os.path.join(ROOT, "data_prep", "faiss_index.index"),
+                        help="current index, for its size / load time only")
+    parser.add_argument("--synthetic", type=int, default=0, help="use bench_retrieval's synthetic corpus of this size")
+    parser.add_argument("--variants", default=DEFAULT_VARIANTS)
+    parser.add_argument("--queries", type=int, default=1000, help="records held out as queries")
+    parser.add_argument("--k", default="1,5,10,20")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default=None, help="results JSON (default benchmarks/results/compression_<ts>.json)")
+    args = parser.parse_args()
+
+    import faiss
+    import numpy as np
+    from utils.embedding_codec import model_vectors
+
+    if args.synthetic:
+        from benchmarks.bench_retrieval import build_corpus, corpus_paths
+        build_corpus(args.synthetic, args.seed)
+        _, args.index, args.embeddings = corpus_paths(args.synthetic)
+
+    variants = [parse_variant(v) for v in args.variants.split(",") if v]
+    ks = [int(k) for k in args.k.split(",") if k]
+
+    print(f"loading {args.embeddings} ...")
+    current = {"size.embeddings_file_mb": os.path.getsize(args.embeddings) / 2 ** 20}
+    if os.path.exists(args.index):
+        current["size.index_file_mb"] = os.path.getsize(args.index) / 2 ** 20
+        current.update(median_load_s(args.index, args.embeddings, args.repeats))
+    with open(args.embeddings, "rb") as f:
+        data = pickle.load(f)
+
+    vectors = model_vectors(data)
+    rng = np.random.default_rng(args.seed)
+    order = rng.permutation(len(vectors))
+    n_queries = min(args.queries, len(vectors) // 10)
+    held_out, kept = np.sort(order[:n_queries]), np.sort(order[n_queries:])
+    queries = np.ascontiguousarray(vectors[held_out])
+    corpus = np.ascontiguousarray(vectors[kept])
+    metadata = [data["metadata"][i] for i in kept]
+    print(f"{len(corpus):,} corpus vectors, {len(queries):,} held-out queries, dim {corpus.shape[1]}")
+
+    exact = faiss.IndexFlatIP(corpus.shape[1])
+    exact.add(corpus)
+    _, truth = exact.search(queries, max(ks))
+    del exact
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_compression_") as workdir:
+        for variant in variants:
+            print(f"  {variant['name']} ...")
+            results[variant["name"]] = {
+                k: round(v, 6) for k, v in run_variant(
+                    variant, corpus, metadata, data.get("model_info", {}), queries, truth, ks, args.repeats,
+                    workdir).items()}
+
+    base = results.get("float32:flat")
+    columns = ["size.total_mb", "size.vectors_mb", "load.total_s", "search.per_query_s"] + [f"recall@{k}" for k in ks]
+    print(f"\n{'variant':<24}" + "".join(f"{c:>20}" for c in columns))
+    for name, metrics in results.items():
+        cells = []
+        for c in columns:
+            value = metrics[c] * (1000 if c.endswith("_s") else 1)
+            cell = f"{value:.3f}" + ("ms" if c.endswith("_s") else "")
+            if base and not c.startswith("recall") and base[c] > 0 and name != "float32:flat":
+                cell += f" ({metrics[c] / base[c]:.2f}x)"
+            cells.append(f"{cell:>20}")
+        print(f"{name:<24}" + "".join(cells))
+    print("\ncurrent artifacts: " + ", ".join(
+        f"{k} {v * 1000:.1f}ms" if k.endswith("_s") else f"{k} {v:.2f}" for k, v in current.items()))
+
+    out = args.out or os.path.join(ROOT, "benchmarks", "results", f"compression_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({
+            "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "embeddings": args.embeddings,
+                     "corpus": len(corpus), "queries": len(queries), "dim": int(corpus.shape[1]),
+                     "repeats": args.repeats, "seed": args.seed},
+            "current": {k: round(v, 6) for k, v in current.items()},
+            "results": results,
+        }, f, indent=2)
+    print(f"results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
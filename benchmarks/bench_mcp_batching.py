@@ -0,0 +1,67 @@
+# benchmarks/bench_mcp_batching.py
+"""
+Throughput of MCP remediation calls, one POST per call vs micro-batched.
+
+    SIMULATED_LATENCY_MS=20 python dummy_services/osm_service.py &
+    python benchmarks/bench_mcp_batching.py --calls 1000 --concurrency 64
+
+Runs the same burst of retry_order_mcp calls twice against the local
+dummy OSM service: MCP_BATCHING off, then on.
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run(tools, calls: int, concurrency: int, batching: bool) -> dict:
+    tools.MCP_BATCHING = batching
+    latencies = []
+
+    def one(i):
+        start = time.perf_counter()
+        result = tools.retry_order_mcp(f"ORD{i:06d}")
+        latencies.append(time.perf_counter() - start)
+        return result.get("status") == "success"
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        ok = sum(pool.map(one, range(calls)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "mode": "batched" if batching else "single",
+        "calls": calls,
+        "ok": ok,
+        "elapsed_s": round(elapsed, 3),
+        "calls_per_s": round(calls / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--max-items", type=int, default=50)
+    parser.add_argument("--window-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    os.environ["MCP_BATCH_MAX_ITEMS"] = str(args.max_items)
+    os.environ["MCP_BATCH_WINDOW_MS"] = str(args.window_ms)
+    from mcp_agents import tools
+
+    single = run(tools, args.calls, args.concurrency, batching=False)
+    batched = run(tools, args.calls, args.concurrency, batching=True)
+    for row in (single, batched):
+        print(row)
+    print(f"throughput gain: {batched['calls_per_s'] / single['calls_per_s']:.2f}x  "
+          f"batching stats: {tools.get_batching_stats()['osm']}")
+
+
+if __name__ == "__main__":
+    main()
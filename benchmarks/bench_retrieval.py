@@ -0,0 +1,314 @@
+# benchmarks/bench_retrieval.py
+"""
+Retrieval micro-benchmarks for utils/vector_store.py on synthetic corpora.
+
+    python benchmarks/bench_retrieval.py                          # 10k, 100k, 1M
+    python benchmarks/bench_retrieval.py --sizes 10000,100000 --save-baseline
+    python benchmarks/bench_retrieval.py --sizes 10000,100000     # exit 1 on regression
+
+For each corpus size, synthetic artifacts in the production format
+(faiss_index.index + embeddings_data.pkl, 384-d, clustered like real
+ticket families) are generated once into benchmarks/data/ and reused.
+A fresh worker process then points FAISS_INDEX_FILE / EMBEDDINGS_FILE at
+them, imports utils.vector_store and times, separately:
+
+    load         faiss.read_index, pickle.load of the metadata, RSS after import
+    encode       encode_query (uncached) and model.encode at several batch sizes
+    search       index.search at several top_k and query batch sizes
+    materialize  _materialize at several top_k
+    end_to_end   search_similar with a cache miss
+
+Runs on CPU only (CUDA_VISIBLE_DEVICES is cleared in the worker). Each
+timing is the median of --repeats runs. With a baseline file, any metric
+more than --threshold slower (or larger, for memory) fails the run.
+"""
+import os
+import gc
+import sys
+import json
+import time
+import pickle
+import random
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DATA_DIR = os.path.join(ROOT, "benchmarks", "data")
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "retrieval_baseline.json")
+DIM = 384
+N_CLUSTERS = 200
+
+TOP_KS = (1, 5, 20, 100)
+SEARCH_BATCHES = (1, 8, 32)
+ENCODE_BATCHES = (1, 8, 32)
+
+GROUPS = ["Service Desk", "OSM Support", "CRM Support", "BRM Billing", "Network Operations", "Email Team"]
+CIS = ["ROD-OSM", "Sie-CRM", "ROD-BRM", "NinjaInvoice", "Email", "VPN"]
+PHRASES = [
+    "order stuck in fallout after provisioning", "customer profile not synced to billing",
+    "asset mismatch on subscription", "invoice missing monthly fee", "VPN login fails",
+    "mailbox keeps asking for password", "activation task failed", "address outdated in CRM",
+]
+
+
+# ============================================================
+# 1️⃣ Synthetic corpus
+# ============================================================
+
+def corpus_paths(size: int):
+    directory = os.path.join(DATA_DIR, f"retrieval_{size}")
+    return directory, os.path.join(directory, "faiss_index.index"), os.path.join(directory, "embeddings_data.pkl")
+
+
+def _record(i: int, rng: random.Random) -> dict:
+    phrase = rng.choice(PHRASES)
+    is_kb = rng.random() < 0.2
+    return {
+        "id": f"KB{i:07d}" if is_kb else f"INC{i:07d}",
+        "source": "kb" if is_kb else "incident",
+        "training_text": f"Short description: {phrase} (ref {i}). Description: " + " ".join(
+            rng.choice(PHRASES) for _ in range(8)) + ". Resolution: restarted the job and verified with the customer.",
+        "Assignment group": rng.choice(GROUPS),
+        "Configuration item": rng.choice(CIS),
+        "Category": rng.choice(["Software", "Network", "Billing", "Inquiry"]),
+    }
+
+
+def build_corpus(size: int, seed: int, chunk: int = 50_000):
+    """Clustered unit vectors + metadata, written in the production artifact format."""
+    import faiss
+    import numpy as np
+
+    directory, index_file, embeddings_file = corpus_paths(size)
+    if os.path.exists(index_file) and os.path.exists(embeddings_file):
+        return
+    os.makedirs(directory, exist_ok=True)
+    print(f"generating {size:,} synthetic records in {directory} ...")
+
+    np_rng = np.random.default_rng(seed)
+    rng = random.Random(seed)
+    centers = np_rng.standard_normal((N_CLUSTERS, DIM)).astype("float32")
+    embeddings = np.empty((size, DIM), dtype="float32")
+    index = faiss.IndexFlatIP(DIM)
+    for start in range(0, size, chunk):
+        n = min(chunk, size - start)
+        block = centers[np_rng.integers(0, N_CLUSTERS, n)] + 0.6 * np_rng.standard_normal((n, DIM)).astype("float32")
+        faiss.normalize_L2(block)
+        embeddings[start:start + n] = block
+        index.add(block)
+
+    faiss.write_index(index, index_file)
+    with open(embeddings_file, "wb") as f:
+        pickle.dump({
+            "embeddings": embeddings,
+            "metadata": [_record(i, rng) for i in range(size)],
+            "model_info": {"model_name": "synthetic", "embedding_dim": DIM, "num_records": size,
+                           "date_created": time.strftime("%Y-%m-%d %H:%M:%S")},
+        }, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+# ============================================================
+# 2️⃣ Worker (one process per corpus size)
+# ============================================================
+
+def rss_mb() -> float:
+    """Current resident set size (Linux), else peak RSS."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def median_s(fn, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def worker(size: int, repeats: int, seed: int) -> dict:
+    import faiss
+    import numpy as np
+
+    _, index_file, embeddings_file = corpus_paths(size)
+    results = {"size": size}
+
+    # Artifact load on its own, before vector_store holds a second copy
+    start = time.perf_counter()
+    probe = faiss.read_index(index_file)
+    results["load.index_s"] = time.perf_counter() - start
+    start = time.perf_counter()
+    with open(embeddings_file, "rb") as f:
+        probe_data = pickle.load(f)
+    results["load.metadata_s"] = time.perf_counter() - start
+    del probe, probe_data
+    gc.collect()
+
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    from utils import vector_store
+    results["load.import_s"] = time.perf_counter() - start
+    results["memory.rss_mb"] = rss_mb()
+    results["memory.import_delta_mb"] = results["memory.rss_mb"] - rss_before
+    results["memory.index_file_mb"] = os.path.getsize(index_file) / 2 ** 20
+    results["memory.embeddings_file_mb"] = os.path.getsize(embeddings_file) / 2 ** 20
+
+    rng = random.Random(seed)
+    queries = iter(f"{rng.choice(PHRASES)} for account {n}" for n in range(10 ** 9))
+
+    # Encode: encode_query is lru_cached, so always pass a new string
+    vector_store.encode_query(next(queries))  # model warm-up
+    results["encode.query_s"] = median_s(lambda: vector_store.encode_query(next(queries)), repeats)
+    for batch in ENCODE_BATCHES:
+        results[f"encode.batch{batch}_per_query_s"] = median_s(
+            lambda: vector_store.model.encode([next(queries) for _ in range(batch)], batch_size=batch,
+                                              normalize_embeddings=True), repeats) / batch
+
+    # Search: queries are perturbed corpus vectors, so neighbours are realistic
+    index = vector_store.index
+    np_rng = np.random.default_rng(seed)
+    pool = index.reconstruct_n(0, min(index.ntotal, 1000))
+    max_batch = max(SEARCH_BATCHES)
+
+    def query_block(n):
+        block = pool[np_rng.integers(0, len(pool), n)] + 0.3 * np_rng.standard_normal((n, DIM)).astype("float32")
+        faiss.normalize_L2(block)
+        return block
+
+    for top_k in TOP_KS:
+        for batch in SEARCH_BATCHES:
+            block = query_block(max_batch)
+            results[f"search.k{top_k}.batch{batch}_per_query_s"] = median_s(
+                lambda: index.search(block[:batch], top_k), repeats) / batch
+
+    for top_k in TOP_KS:
+        distances, indices = index.search(query_block(1), top_k)
+        results[f"materialize.k{top_k}_s"] = median_s(
+            lambda: vector_store._materialize(distances, indices), repeats)
+
+    for top_k in (5,):
+        results[f"end_to_end.k{top_k}_s"] = median_s(
+            lambda: vector_store.search_similar(next(queries), top_k), repeats)
+
+    results["memory.peak_rss_mb"] = max(results["memory.rss_mb"], rss_mb())
+    return {k: (round(v, 6) if isinstance(v, float) else v) for k, v in results.items()}
+
+
+def run_worker(size: int, repeats: int, seed: int) -> dict:
+    _, index_file, embeddings_file = corpus_paths(size)
+    env = {
+        **os.environ,
+        "FAISS_INDEX_FILE": index_file,
+        "EMBEDDINGS_FILE": embeddings_file,
+        "GROUP_CENTROIDS_FILE": os.path.join(DATA_DIR, "no_centroids.pkl"),
+        "CUDA_VISIBLE_DEVICES": "",
+        "METRICS_ENABLED": "false",
+        "LOG_LEVEL": "WARNING",
+    }
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", str(size), "--repeats", str(repeats),
+         "--seed", str(seed)],
+        cwd=ROOT, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"worker for {size:,} records failed:\n{out.stderr[-4000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+# ============================================================
+# 3️⃣ Regression check
+# ============================================================
+
+def regressions(current: dict, baseline: dict, threshold: float, min_delta_s: float) -> list:
+    """Metrics worse than baseline by more than threshold (fraction)."""
+    failed = []
+    for size, metrics in current.items():
+        base = baseline.get(size)
+        if not base:
+            continue
+        for name, value in metrics.items():
+            old = base.get(name)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old <= 0:
+                continue
+            if name.startswith("memory.") and name.endswith("_mb"):
+                worse = value > old * (1 + threshold)
+            else:
+                # Ignore sub-min_delta_s jitter on tiny timings
+                worse = value > old * (1 + threshold) and value - old > min_delta_s
+            if worse:
+                failed.append((size, name, old, value))
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write results to --baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown / growth (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.2, help="ignore timing regressions smaller than this")
+    parser.add_argument("--out", help="also write results JSON here")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.worker, args.repeats, args.seed)))
+        return
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    results = {}
+    for size in sizes:
+        build_corpus(size, args.seed)
+        print(f"benchmarking {size:,} records ...")
+        results[str(size)] = run_worker(size, args.repeats, args.seed)
+
+    names = sorted({name for metrics in results.values() for name in metrics if name != "size"})
+    print(f"\n{'metric':<40}" + "".join(f"{s:>14}" for s in results))
+    for name in names:
+        scale = 1000 if name.endswith("_s") else 1
+        unit = "ms" if scale == 1000 else ""
+        cells = "".join(f"{results[s].get(name, 0) * scale:>12.3f}{unit:>2}" for s in results)
+        print(f"{name:<40}{cells}")
+
+    report = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "python": sys.version.split()[0],
+                 "cpus": os.cpu_count(), "repeats": args.repeats},
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nbaseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nno baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    failed = regressions(results, baseline, args.threshold, args.min_delta_ms / 1000)
+    if failed:
+        print(f"\n❌ {len(failed)} regression(s) over {args.threshold:.0%}:")
+        for size, name, old, new in failed:
+            print(f"   {size:>8} {name:<40} {old:.6g} -> {new:.6g}")
+        sys.exit(1)
+    print(f"\n✅ no regressions over {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
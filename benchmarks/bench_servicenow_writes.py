@@ -0,0 +1,68 @@
+# benchmarks/bench_servicenow_writes.py
+"""
+Requests-per-ticket for ServiceNow updates against the local stub.
+
+    python dummy_services/servicenow_stub.py &
+    python benchmarks/bench_servicenow_writes.py --tickets 200 --concurrency 16
+    python benchmarks/bench_servicenow_writes.py --tickets 200 --concurrency 16 --batch
+
+Compares against the old two-PATCH-per-ticket flow (set_fields_and_note +
+update_ticket_v2).
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stub-url", default="http://localhost:7004")
+    parser.add_argument("--tickets", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch", action="store_true", help="Enable the batch API writer")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--window-ms", type=float, default=200)
+    args = parser.parse_args()
+
+    # Configure before the modules read their env settings
+    os.environ.update({
+        "SERVICENOW_INSTANCE": args.stub_url,
+        "SERVICENOW_USERNAME": "bench",
+        "SERVICENOW_PASSWORD": "bench",
+        "SNOW_BATCH_ENABLED": "true" if args.batch else "false",
+        "SNOW_BATCH_SIZE": str(args.batch_size),
+        "SNOW_BATCH_WINDOW_MS": str(args.window_ms),
+    })
+    import requests
+    from utils.servicenow_api import build_incident_update
+    from utils.servicenow_batch import write_incident_update, get_write_stats
+
+    before = requests.get(f"{args.stub_url}/stub/stats", timeout=5).json()
+
+    def one(i):
+        payload = build_incident_update(
+            {"u_ai_suggestion": f"suggestion {i}"}, f"context note {i}",
+            "resolve" if i % 2 else "escalate", f"details {i}",
+        )
+        return write_incident_update(f"INC{i:07d}", payload)[0]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one, range(args.tickets)))
+    elapsed = time.perf_counter() - start
+
+    after = requests.get(f"{args.stub_url}/stub/stats", timeout=5).json()
+    sent = after["http_requests"] - before["http_requests"]
+    print(f"mode={'batch' if args.batch else 'single-patch'} tickets={args.tickets} ok={sum(results)} "
+          f"elapsed={elapsed:.2f}s")
+    print(f"stub http requests={sent} per_ticket={sent / args.tickets:.3f} "
+          f"saved_per_ticket={2 - sent / args.tickets:.3f} (baseline 2.0)")
+    print(f"client stats={get_write_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# benchmarks/fake_groq.py
+"""
+Local stand-in for the Groq OpenAI-compatible chat completions API.
+
+    python benchmarks/fake_groq.py --port 7010 --ttft-ms 300 --tokens-per-s 200
+    GROQ_BASE_URL=http://localhost:7010 GROQ_API_KEY=fake python app.py
+
+Latency = time-to-first-token (log-normal around --ttft-ms) + completion
+tokens / --tokens-per-s. Answers are shaped like the app's prompts expect
+(decision JSON, invoice payload, consolidated JSON, assignment group, steps),
+so the whole pipeline runs. Supports stream=true with a final x_groq usage chunk.
+"""
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+from flask import Flask, request, jsonify, Response
+
+app = Flask(__name__)
+
+CONFIG = {"ttft_ms": 300.0, "tokens_per_s": 200.0, "jitter": 0.3, "error_rate": 0.0, "throttle_rate": 0.0}
+
+# Keyword in the ticket text -> (action, confidence) the fake model "decides"
+ACTION_RULES = [
+    (("invoice", "billing"), ("create_invoice", 0.95)),
+    (("fallout", "order"), ("update_order", 0.94)),
+    (("profile", "crm", "customer data"), ("sync_customer_data", 0.93)),
+]
+
+STEPS = [
+    "Check the service health dashboard for the affected CI.",
+    "Review recent changes and deployments.",
+    "Re-run the failed transaction or sync.",
+    "Verify the fix with the customer.",
+    "Escalate to the owning team if unresolved.",
+]
+
+
+def _ticket_text(prompt: str) -> str:
+    match = re.search(r'QUERY: "(.*?)"', prompt, re.S) or re.search(r"USER ISSUE:\s*(.*?)\n\s*\n", prompt, re.S)
+    return (match.group(1) if match else prompt).lower()
+
+
+def _decide(text: str):
+    for keywords, decision in ACTION_RULES:
+        if any(k in text for k in keywords):
+            return decision
+    return "none", 0.0
+
+
+def _invoice_payload():
+    return {"client_id": "C-1001", "line_items": [
+        {"product_key": "broadband-500", "notes": "monthly fee", "cost": 49.0, "quantity": 1}]}
+
+
+def answer(prompt: str) -> str:
+    """Reply text for one of the app's prompt shapes."""
+    text = _ticket_text(prompt)
+    if "Return ONLY the group name" in prompt:
+        return "Service Desk"
+    if '"suggestion_steps"' in prompt:
+        action, confidence = _decide(text)
+        return json.dumps({
+            "suggestion_steps": STEPS[:4],
+            "assignment_group": "Service Desk",
+            "action": action,
+            "confidence": confidence,
+            "reasoning": "fake model decision",
+            "invoice_payload": _invoice_payload() if "invoice" in action else None,
+        })
+    if "Extract from this query" in prompt and "client_id" in prompt:
+        return json.dumps(_invoice_payload())
+    if "Extract:" in prompt and "action" in prompt:
+        action, confidence = _decide(text)
+        return json.dumps({"action": action, "confidence": confidence, "reasoning": "fake model decision"})
+    return "\n".join(f"{i}. {step}" for i, step in enumerate(STEPS, 1))
+
+
+def _apply_stop(content: str, stop) -> str:
+    for seq in ([stop] if isinstance(stop, str) else stop or []):
+        if seq and seq in content:
+            content = content[:content.index(seq)]
+    return content
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _ttft_s() -> float:
+    return random.lognormvariate(0, CONFIG["jitter"]) * CONFIG["ttft_ms"] / 1000.0
+
+
+def _fault():
+    roll = random.random()
+    if roll < CONFIG["error_rate"]:
+        return jsonify({"error": {"message": "fake upstream error", "type": "server_error"}}), 500
+    if roll < CONFIG["error_rate"] + CONFIG["throttle_rate"]:
+        resp = jsonify({"error": {"message": "Rate limit reached (fake)", "type": "tokens", "code": "rate_limit_exceeded"}})
+        resp.headers["retry-after"] = "1"
+        return resp, 429
+    return None
+
+
+@app.get("/health")
+def health():
+    return jsonify({"status": "ok", **CONFIG})
+
+
+@app.post("/openai/v1/chat/completions")
+@app.post("/v1/chat/completions")
+def chat_completions():
+    fault = _fault()
+    if fault:
+        return fault
+
+    body = request.get_json() or {}
+    prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+    content = _apply_stop(answer(prompt), body.get("stop"))
+    model = body.get("model", "fake-llama")
+    prompt_tokens, completion_tokens = _tokens(prompt), _tokens(content)
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+             "total_tokens": prompt_tokens + completion_tokens}
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+    per_token_s = 1.0 / CONFIG["tokens_per_s"] if CONFIG["tokens_per_s"] > 0 else 0.0
+
+    if not body.get("stream"):
+        time.sleep(_ttft_s() + completion_tokens * per_token_s)
+        return jsonify({
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def chunk(delta, finish_reason=None, extra=None):
+        data = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}], **(extra or {})}
+        return f"data: {json.dumps(data)}\n\n"
+
+    def generate():
+        time.sleep(_ttft_s())
+        yield chunk({"role": "assistant", "content": ""})
+        # ~4 chars per token, a few tokens per chunk
+        for i in range(0, len(content), 16):
+            piece = content[i:i + 16]
+            yield chunk({"content": piece})
+            time.sleep(_tokens(piece) * per_token_s)
+        yield chunk({}, "stop", {"x_groq": {"id": completion_id, "usage": usage}})
+        yield "data: [DONE]\n\n"
+
+    return Response(generate(), mimetype="text/event-stream")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=7010)
+    parser.add_argument("--ttft-ms", type=float, default=CONFIG["ttft_ms"])
+    parser.add_argument("--tokens-per-s", type=float, default=CONFIG["tokens_per_s"])
+    parser.add_argument("--jitter", type=float, default=CONFIG["jitter"], help="log-normal sigma of TTFT")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with HTTP 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of calls answered with HTTP 429")
+    args = parser.parse_args()
+    CONFIG.update(ttft_ms=args.ttft_ms, tokens_per_s=args.tokens_per_s, jitter=args.jitter,
+                  error_rate=args.error_rate, throttle_rate=args.throttle_rate)
+    app.run(host="0.0.0.0", port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+# benchmarks/fake_ninja.py
+"""Local stand-in for Ninja Invoice POST /invoices (NINJA_URL=http://localhost:7011)."""
+import argparse
+import itertools
+from flask import Flask, request, jsonify
+
+app = Flask(__name__)
+_ids = itertools.count(1)
+
+
+@app.post("/invoices")
+def create_invoice():
+    body = request.get_json() or {}
+    return jsonify({"id": f"INV-{next(_ids):06d}", "client_id": body.get("client_id")})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=7011)
+    app.run(host="0.0.0.0", port=parser.parse_args().port, threaded=True)
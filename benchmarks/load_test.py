@@ -0,0 +1,390 @@
+# benchmarks/load_test.py
+"""
+End-to-end load test for /incident and /incident/stream.
+
+Starts the stand-ins (benchmarks/standins.py) and app.py, drives a ticket
+mix, and writes a JSON results file:
+
+    # open-loop Poisson arrivals at 5 tickets/s for 2 minutes
+    python benchmarks/load_test.py --mode poisson --rate 5 --duration 120
+
+    # fixed-rate arrivals, 20% streaming, slower fake LLM
+    python benchmarks/load_test.py --mode fixed --rate 2 --stream-fraction 0.2 --fake-llm-args="--ttft-ms 800"
+
+    # closed loop: 8 clients back-to-back
+    python benchmarks/load_test.py --mode closed --concurrency 8 --duration 60
+
+    # against an already running app (no stand-ins started)
+    python benchmarks/load_test.py --target http://localhost:5000 --rate 3
+
+Latency is measured from each request's *scheduled* arrival time, so
+queueing inside the client when the service falls behind is included
+(no coordinated omission). Per-stage quantiles come from the difference of
+two /metrics scrapes around the measured window.
+"""
+import os
+import re
+import sys
+import json
+import time
+import shlex
+import random
+import argparse
+import threading
+import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.standins import ROOT, StandIns, process_tree_memory
+
+# (weight, ticket type, configuration item, query variants)
+TICKET_MIX = [
+    (0.30, "order_fallout", "ROD-OSM", [
+        "Order {n} stuck in fallout after provisioning step, customer waiting",
+        "Order fallout for order {n}: activation task failed in OSM",
+    ]),
+    (0.20, "crm_profile", "Sie-CRM", [
+        "Customer {n} profile not synced between CRM and billing",
+        "CRM profile mismatch for customer {n}, address outdated",
+    ]),
+    (0.15, "asset_mismatch", "ROD-BRM", [
+        "Asset mismatch for subscription {n} in BRM",
+    ]),
+    (0.10, "invoice", "NinjaInvoice", [
+        "Create invoice for client {n}: broadband monthly fee missing",
+    ]),
+    (0.15, "network", "Sie-CRM", [
+        "VPN login fails for user {n} since this morning",
+        "No internet connectivity at branch {n}",
+    ]),
+    (0.10, "unknown", "Email", [
+        "Outlook keeps asking for password on laptop {n}",
+    ]),
+]
+
+
+def pick_ticket(rng: random.Random, seq: int, ticket_id_fraction: float) -> dict:
+    roll, acc = rng.random(), 0.0
+    for weight, kind, ci, variants in TICKET_MIX:
+        acc += weight
+        if roll <= acc:
+            break
+    ticket = {
+        "type": kind,
+        "body": {"query": rng.choice(variants).format(n=rng.randint(10000, 99999)), "configuration_item": ci},
+    }
+    if rng.random() < ticket_id_fraction:
+        ticket["body"]["ticket_id"] = f"LOAD{seq:08d}"
+    return ticket
+
+
+# ============================================================
+# 1️⃣ Request execution
+# ============================================================
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = []
+
+    def add(self, **row):
+        with self.lock:
+            self.rows.append(row)
+
+
+def send(session: requests.Session, base_url: str, ticket: dict, stream: bool, scheduled: float,
+         recorder: Recorder, timeout_s: float):
+    endpoint = "/incident/stream" if stream else "/incident"
+    started = time.perf_counter()
+    status, error, first_byte = None, None, None
+    try:
+        resp = session.post(f"{base_url}{endpoint}", json=ticket["body"], timeout=timeout_s, stream=stream)
+        status = resp.status_code
+        if stream:
+            for line in resp.iter_lines():
+                if first_byte is None and line:
+                    first_byte = time.perf_counter()
+                if line.startswith(b"event: done"):
+                    break
+            resp.close()
+        else:
+            resp.content
+        if status >= 400:
+            error = f"HTTP {status}"
+    except requests.exceptions.RequestException as e:
+        error = type(e).__name__
+    done = time.perf_counter()
+    recorder.add(
+        endpoint=endpoint, type=ticket["type"], status=status, error=error,
+        latency_s=done - scheduled, service_s=done - started, queue_s=started - scheduled,
+        ttfb_s=(first_byte - scheduled) if first_byte else None,
+    )
+
+
+def arrivals(mode: str, rate: float, duration_s: float, rng: random.Random):
+    """Scheduled offsets (s) for open-loop modes."""
+    t = 0.0
+    while True:
+        t += rng.expovariate(rate) if mode == "poisson" else 1.0 / rate
+        if t >= duration_s:
+            return
+        yield t
+
+
+def run_open_loop(args, base_url, rng, recorder, duration_s):
+    session = _session(args.max_in_flight)
+    with ThreadPoolExecutor(max_workers=args.max_in_flight) as pool:
+        start = time.perf_counter()
+        for seq, offset in enumerate(arrivals(args.mode, args.rate, duration_s, rng)):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            ticket = pick_ticket(rng, seq, args.ticket_id_fraction)
+            pool.submit(send, session, base_url, ticket, rng.random() < args.stream_fraction,
+                        start + offset, recorder, args.timeout)
+
+
+def run_closed_loop(args, base_url, rng, recorder, duration_s):
+    session = _session(args.concurrency)
+    end = time.perf_counter() + duration_s
+    counter = iter(range(10 ** 9))
+    lock = threading.Lock()
+
+    def client(client_rng):
+        while time.perf_counter() < end:
+            with lock:
+                seq = next(counter)
+            ticket = pick_ticket(client_rng, seq, args.ticket_id_fraction)
+            send(session, base_url, ticket, client_rng.random() < args.stream_fraction,
+                 time.perf_counter(), recorder, args.timeout)
+
+    threads = [threading.Thread(target=client, args=(random.Random(rng.random()),)) for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def _session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    return session
+
+
+# ============================================================
+# 2️⃣ Statistics
+# ============================================================
+
+def quantile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(rows, duration_s):
+    latencies = sorted(r["latency_s"] for r in rows if r["error"] is None)
+    errors = sum(1 for r in rows if r["error"] is not None)
+    out = {
+        "requests": len(rows),
+        "ok": len(rows) - errors,
+        "errors": errors,
+        "error_rate": round(errors / len(rows), 4) if rows else 0.0,
+        "throughput_rps": round((len(rows) - errors) / duration_s, 3) if duration_s else None,
+        "p50_s": _round(quantile(latencies, 0.50)),
+        "p95_s": _round(quantile(latencies, 0.95)),
+        "p99_s": _round(quantile(latencies, 0.99)),
+        "max_s": _round(latencies[-1] if latencies else None),
+        "mean_queue_s": _round(sum(r["queue_s"] for r in rows) / len(rows) if rows else None),
+    }
+    ttfb = sorted(r["ttfb_s"] for r in rows if r.get("ttfb_s") is not None)
+    if ttfb:
+        out.update(ttfb_p50_s=_round(quantile(ttfb, 0.5)), ttfb_p99_s=_round(quantile(ttfb, 0.99)))
+    error_kinds = defaultdict(int)
+    for r in rows:
+        if r["error"]:
+            error_kinds[r["error"]] += 1
+    if error_kinds:
+        out["error_kinds"] = dict(error_kinds)
+    return out
+
+
+def _round(value, digits=4):
+    return round(value, digits) if value is not None else None
+
+
+_SAMPLE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})?\s+(\S+)$")
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def scrape(base_url: str) -> dict:
+    """{(name, frozenset(labels)): value} from /metrics."""
+    samples = {}
+    text = requests.get(f"{base_url}/metrics", timeout=10).text
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = _SAMPLE.match(line)
+        if match:
+            labels = frozenset(_LABEL.findall(match.group(2) or ""))
+            samples[(match.group(1), labels)] = float(match.group(3))
+    return samples
+
+
+def histogram_quantiles(before: dict, after: dict, metric: str, group_by: str) -> dict:
+    """Per-label quantiles from bucket deltas, interpolated like histogram_quantile()."""
+    buckets = defaultdict(dict)
+    sums, counts = defaultdict(float), defaultdict(float)
+    for (name, labels), value in after.items():
+        delta = value - before.get((name, labels), 0.0)
+        label_map = dict(labels)
+        key = label_map.get(group_by, "")
+        if name == f"{metric}_bucket":
+            le = label_map["le"]
+            bound = float("inf") if le == "+Inf" else float(le)
+            buckets[key][bound] = buckets[key].get(bound, 0.0) + delta
+        elif name == f"{metric}_sum":
+            sums[key] += delta
+        elif name == f"{metric}_count":
+            counts[key] += delta
+
+    result = {}
+    for key, by_bound in buckets.items():
+        total = counts.get(key, 0.0)
+        if total <= 0:
+            continue
+        bounds = sorted(by_bound)
+
+        def q(p):
+            rank, prev_bound, prev_count = p * total, 0.0, 0.0
+            for bound in bounds:
+                cum = by_bound[bound]
+                if cum >= rank:
+                    if bound == float("inf"):
+                        return prev_bound
+                    span = cum - prev_count
+                    return prev_bound + (bound - prev_bound) * ((rank - prev_count) / span if span else 1.0)
+                prev_bound, prev_count = bound, cum
+            return prev_bound
+
+        result[key] = {"count": int(total), "mean_s": _round(sums[key] / total),
+                       "p50_s": _round(q(0.50)), "p95_s": _round(q(0.95)), "p99_s": _round(q(0.99))}
+    return dict(sorted(result.items()))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+# ============================================================
+# 3️⃣ Main
+# ============================================================
+
+def run(args, base_url, app_pid=None):
+    rng = random.Random(args.seed)
+    runner = run_closed_loop if args.mode == "closed" else run_open_loop
+
+    if args.warmup > 0:
+        print(f"warm-up {args.warmup:.0f}s ...")
+        runner(args, base_url, rng, Recorder(), args.warmup)
+
+    before = scrape(base_url)
+    recorder = Recorder()
+    print(f"measuring {args.duration:.0f}s, mode={args.mode} rate={args.rate} concurrency={args.concurrency} ...")
+    start = time.perf_counter()
+    runner(args, base_url, rng, recorder, args.duration)
+    elapsed = time.perf_counter() - start
+    after = scrape(base_url)
+    memory = process_tree_memory(app_pid) if app_pid and os.path.isdir("/proc") else None
+
+    rows = recorder.rows
+    by_endpoint, by_type = defaultdict(list), defaultdict(list)
+    for r in rows:
+        by_endpoint[r["endpoint"]].append(r)
+        by_type[r["type"]].append(r)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": git_commit(),
+            "base_url": base_url,
+            "args": vars(args),
+        },
+        "offered_rate_rps": args.rate if args.mode != "closed" else None,
+        "elapsed_s": round(elapsed, 3),
+        "app_memory": memory,
+        "overall": summarize(rows, elapsed),
+        "endpoints": {k: summarize(v, elapsed) for k, v in sorted(by_endpoint.items())},
+        "ticket_types": {k: summarize(v, elapsed) for k, v in sorted(by_type.items())},
+        "server": {
+            "stages": histogram_quantiles(before, after, "ticket_stage_duration_seconds", "stage"),
+            "endpoints": histogram_quantiles(before, after, "http_request_duration_seconds", "endpoint"),
+            "llm": histogram_quantiles(before, after, "llm_request_duration_seconds", "provider"),
+            "backends": histogram_quantiles(before, after, "backend_request_duration_seconds", "backend"),
+        },
+    }
+
+
+def print_report(results):
+    o = results["overall"]
+    print(f"\n{o['requests']} requests, {o['throughput_rps']} ok/s, error rate {o['error_rate']:.2%}, "
+          f"p50 {o['p50_s']}s p95 {o['p95_s']}s p99 {o['p99_s']}s")
+    if results.get("app_memory"):
+        m = results["app_memory"]
+        print(f"app memory: {m['processes']} process(es), RSS {m['rss_mb']} MB, PSS {m['pss_mb']} MB, USS {m['uss_mb']} MB")
+    for title, table in (("endpoint", results["endpoints"]), ("stage", results["server"]["stages"])):
+        print(f"\n{title:<28}{'count':>8}{'p50_s':>10}{'p95_s':>10}{'p99_s':>10}")
+        for key, row in table.items():
+            print(f"{key:<28}{row.get('count', row.get('requests')):>8}{str(row['p50_s']):>10}"
+                  f"{str(row['p95_s']):>10}{str(row['p99_s']):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["fixed", "poisson", "closed"], default="poisson")
+    parser.add_argument("--rate", type=float, default=2.0, help="arrivals per second (fixed / poisson)")
+    parser.add_argument("--concurrency", type=int, default=4, help="clients (closed)")
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--warmup", type=float, default=10.0)
+    parser.add_argument("--stream-fraction", type=float, default=0.0)
+    parser.add_argument("--ticket-id-fraction", type=float, default=1.0,
+                        help="share of tickets carrying a ticket_id (ServiceNow update)")
+    parser.add_argument("--max-in-flight", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--target", help="base URL of a running app; skips stand-ins")
+    parser.add_argument("--fake-llm-args", default="", help='e.g. "--ttft-ms 300 --tokens-per-s 200"')
+    parser.add_argument("--backend-latency-ms", type=float, default=5.0)
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra env for app.py, e.g. CONSOLIDATED_LLM_MODE=true")
+    parser.add_argument("--app-command", default=None,
+                        help='server to start instead of "python app.py", e.g. "python serve.py --workers 4"')
+    parser.add_argument("--out", default=None, help="results file (default benchmarks/results/load_<ts>.json)")
+    args = parser.parse_args()
+
+    if args.target:
+        results = run(args, args.target.rstrip("/"))
+    else:
+        extra_env = dict(item.split("=", 1) for item in args.app_env)
+        with StandIns(shlex.split(args.fake_llm_args), args.backend_latency_ms) as standins:
+            command = shlex.split(args.app_command) if args.app_command else None
+            if command and command[0] in ("python", "python3"):
+                command[0] = sys.executable
+            with standins.app(extra_env, command) as base_url:
+                results = run(args, base_url, standins.app_process.pid)
+
+    out = args.out or os.path.join(ROOT, "benchmarks", "results", f"load_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print_report(results)
+    print(f"\nresults written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# benchmarks/profile_incident.py
+"""
+Profiles /incident end to end in-process, with every outbound call served
+by the local stand-ins (fake Groq, ServiceNow stub, fake Ninja, OSM/CRM/BRM).
+
+    python benchmarks/profile_incident.py
+    python benchmarks/profile_incident.py --calls 20 --fake-llm-args="--ttft-ms 0 --tokens-per-s 0"
+    python benchmarks/profile_incident.py --include-idle     # wall clock, incl. waits on the stand-ins
+
+app.py is imported into this process, one warm-up call is made (skip with
+--cold), then utils.profiler samples every thread while --calls requests
+go through Flask's test client. Writes collapsed stacks (flamegraph.pl /
+speedscope input) and prints the per-component breakdown.
+"""
+import os
+import sys
+import time
+import shlex
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.standins import ROOT, StandIns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--query", default="Order 12345 stuck in fallout after provisioning step, customer waiting")
+    parser.add_argument("--configuration-item", default="ROD-OSM")
+    parser.add_argument("--ticket-id", default="PROF0000001", help="empty to skip the ServiceNow update")
+    parser.add_argument("--stream", action="store_true", help="profile /incident/stream instead")
+    parser.add_argument("--calls", type=int, default=5)
+    parser.add_argument("--cold", action="store_true", help="no warm-up call before profiling")
+    parser.add_argument("--interval-ms", type=float, default=1.0)
+    parser.add_argument("--include-idle", action="store_true")
+    parser.add_argument("--fake-llm-args", default="--ttft-ms 20 --tokens-per-s 0")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument("--out", default=None, help="collapsed stacks (default benchmarks/results/profile_<ts>.collapsed)")
+    args = parser.parse_args()
+
+    with StandIns(shlex.split(args.fake_llm_args)) as standins:
+        os.environ.update(standins.app_env())
+        os.environ.update(dict(item.split("=", 1) for item in args.app_env))
+        os.environ.setdefault("TRACING_ENABLED", "false")
+        os.chdir(ROOT)
+
+        start = time.perf_counter()
+        import app as app_module
+        from utils.profiler import SamplingProfiler
+        print(f"app imported in {time.perf_counter() - start:.1f}s")
+
+        client = app_module.app.test_client()
+        endpoint = "/incident/stream" if args.stream else "/incident"
+        body = {"query": args.query, "configuration_item": args.configuration_item}
+
+        def call(i):
+            if args.ticket_id:
+                # Distinct IDs so single-flight replay doesn't short-circuit the pipeline
+                body["ticket_id"] = f"{args.ticket_id}-{i}"
+            resp = client.post(endpoint, json=body)
+            resp.get_data()
+            resp.close()
+            return resp.status_code
+
+        if not args.cold:
+            call("warmup")
+
+        profiler = SamplingProfiler(args.interval_ms / 1000, include_idle=args.include_idle).start()
+        latencies, statuses = [], []
+        for i in range(args.calls):
+            t0 = time.perf_counter()
+            statuses.append(call(i))
+            latencies.append(time.perf_counter() - t0)
+        profiler.stop()
+
+    out = args.out or os.path.join(ROOT, "benchmarks", "results", f"profile_{time.strftime('%Y%m%d_%H%M%S')}.collapsed")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        f.write(profiler.collapsed())
+
+    summary = profiler.summary()
+    print(f"\n{args.calls} x {endpoint}: statuses {sorted(set(statuses))}, "
+          f"mean {sum(latencies) / len(latencies) * 1000:.1f}ms, {summary['samples']} samples")
+    print("\ncomponent share of samples:")
+    for component, share in summary["components"].items():
+        print(f"  {component:<24}{share:>8.1%}")
+    print("\ntop leaf frames:")
+    for row in summary["top_leaf_frames"]:
+        print(f"  {row['share']:>7.1%}  {row['frame']}")
+    print(f"\ncollapsed stacks written to {out}")
+
+    svg = os.path.splitext(out)[0] + ".svg"
+    try:
+        with open(out) as src, open(svg, "w") as dst:
+            subprocess.run(["flamegraph.pl"], stdin=src, stdout=dst, check=True)
+        print(f"flamegraph written to {svg}")
+    except (OSError, subprocess.CalledProcessError):
+        if os.path.exists(svg):
+            os.remove(svg)
+        print("open the .collapsed file in https://www.speedscope.app or pipe it to flamegraph.pl")
+
+
+if __name__ == "__main__":
+    main()
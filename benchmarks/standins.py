@@ -0,0 +1,181 @@
+# benchmarks/standins.py
+"""
+Starts the local stand-ins and app.py for load tests and profiling.
+
+    fake Groq        benchmarks/fake_groq.py          :7010
+    fake Ninja       benchmarks/fake_ninja.py         :7011
+    ServiceNow stub  dummy_services/servicenow_stub.py :7004
+    OSM / CRM / BRM  dummy_services/*_service.py      :7001-7003
+
+    with StandIns(fake_llm_args=["--ttft-ms", "300"]) as standins:
+        with standins.app(extra_env={"CONSOLIDATED_LLM_MODE": "true"}) as base_url:
+            ...
+"""
+import os
+import sys
+import time
+import socket
+import subprocess
+from contextlib import contextmanager
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FAKE_GROQ_PORT = 7010
+FAKE_NINJA_PORT = 7011
+SERVICENOW_PORT = 7004
+APP_PORT = int(os.getenv("LOAD_TEST_APP_PORT", "5055"))
+
+
+def wait_for_port(port: int, timeout_s: float = 30.0):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            sock.settimeout(0.5)
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.2)
+    raise TimeoutError(f"nothing listening on :{port} after {timeout_s:.0f}s")
+
+
+def process_tree_memory(pid: int) -> dict:
+    """
+    RSS / PSS / USS (MB) summed over pid and its descendants, from
+    /proc/<pid>/smaps_rollup (Linux). PSS splits shared pages between the
+    processes sharing them, so it is the number to compare across pre-fork setups.
+    """
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+
+    pids, todo = [], [pid]
+    while todo:
+        current = todo.pop()
+        pids.append(current)
+        todo.extend(children.get(current, []))
+
+    totals = {"processes": 0, "rss_mb": 0.0, "pss_mb": 0.0, "uss_mb": 0.0}
+    for current in pids:
+        fields = {}
+        try:
+            with open(f"/proc/{current}/smaps_rollup") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) >= 2 and parts[1].isdigit():
+                        fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+        except OSError:
+            continue
+        totals["processes"] += 1
+        totals["rss_mb"] += fields.get("Rss", 0.0)
+        totals["pss_mb"] += fields.get("Pss", 0.0)
+        totals["uss_mb"] += fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0)
+    return {k: round(v, 1) if isinstance(v, float) else v for k, v in totals.items()}
+
+
+class StandIns:
+    def __init__(self, fake_llm_args=None, backend_latency_ms: float = 0.0, log_dir: str = None):
+        self.fake_llm_args = list(fake_llm_args or [])
+        self.backend_latency_ms = backend_latency_ms
+        self.log_dir = log_dir or os.path.join(ROOT, "benchmarks", "logs")
+        self.processes = []
+        self.app_process = None
+
+    def _spawn(self, name: str, args, port: int, env=None):
+        os.makedirs(self.log_dir, exist_ok=True)
+        log = open(os.path.join(self.log_dir, f"{name}.log"), "w")
+        proc = subprocess.Popen([sys.executable] + args, cwd=ROOT, stdout=log, stderr=subprocess.STDOUT,
+                                env={**os.environ, **(env or {})})
+        self.processes.append((name, proc, log))
+        wait_for_port(port)
+        return proc
+
+    def start(self):
+        backend_env = {"SIMULATED_LATENCY_MS": str(self.backend_latency_ms)}
+        self._spawn("fake_groq", ["benchmarks/fake_groq.py", "--port", str(FAKE_GROQ_PORT)] + self.fake_llm_args,
+                    FAKE_GROQ_PORT)
+        self._spawn("fake_ninja", ["benchmarks/fake_ninja.py", "--port", str(FAKE_NINJA_PORT)], FAKE_NINJA_PORT)
+        self._spawn("servicenow_stub", ["dummy_services/servicenow_stub.py"], SERVICENOW_PORT)
+        self._spawn("osm", ["dummy_services/osm_service.py"], 7001, backend_env)
+        self._spawn("crm", ["dummy_services/crm_service.py"], 7002, backend_env)
+        self._spawn("brm", ["dummy_services/brm_service.py"], 7003, backend_env)
+        return self
+
+    def app_env(self) -> dict:
+        """Environment that points app.py at the stand-ins."""
+        return {
+            "LLM_PROVIDER": "llama",
+            "GROQ_API_KEY": "fake",
+            "GROQ_BASE_URL": f"http://127.0.0.1:{FAKE_GROQ_PORT}",
+            "SERVICENOW_INSTANCE": f"http://127.0.0.1:{SERVICENOW_PORT}",
+            "SERVICENOW_USERNAME": "bench",
+            "SERVICENOW_PASSWORD": "bench",
+            "OSM_SERVICE_URL": "http://127.0.0.1:7001",
+            "CRM_SERVICE_URL": "http://127.0.0.1:7002",
+            "BRM_SERVICE_URL": "http://127.0.0.1:7003",
+            "NINJA_URL": f"http://127.0.0.1:{FAKE_NINJA_PORT}",
+            "NINJAINVOICE_API_KEY": "fake",
+            "CASSETTE_MODE": "off",
+            # The fake endpoint has no real quota; keep the limiter out of the measurement
+            "GROQ_RPM": "100000",
+            "GROQ_TPM": "100000000",
+            "JOB_QUEUE_DB": os.path.join(self.log_dir, "jobs.sqlite3"),
+            "PORT": str(APP_PORT),
+        }
+
+    @contextmanager
+    def app(self, extra_env=None, command=None, startup_timeout_s: float = 300.0):
+        """Runs app.py (or `command`) against the stand-ins; yields its base URL."""
+        env = {**self.app_env(), **(extra_env or {})}
+        name = "app"
+        os.makedirs(self.log_dir, exist_ok=True)
+        log = open(os.path.join(self.log_dir, f"{name}.log"), "w")
+        proc = subprocess.Popen(command or [sys.executable, "app.py"], cwd=ROOT, stdout=log,
+                                stderr=subprocess.STDOUT, env={**os.environ, **env})
+        self.app_process = proc
+        base_url = f"http://127.0.0.1:{APP_PORT}"
+        try:
+            # Model + FAISS loading dominates startup
+            deadline = time.monotonic() + startup_timeout_s
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"app exited with {proc.returncode}; see {log.name}")
+                try:
+                    if requests.get(f"{base_url}/", timeout=2).status_code == 200:
+                        break
+                except requests.exceptions.RequestException:
+                    pass
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"app not healthy after {startup_timeout_s:.0f}s; see {log.name}")
+                time.sleep(1.0)
+            yield base_url
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            log.close()
+            self.app_process = None
+
+    def stop(self):
+        for _, proc, log in reversed(self.processes):
+            proc.terminate()
+        for _, proc, log in reversed(self.processes):
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            log.close()
+        self.processes = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
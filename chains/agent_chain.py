@@ -1,56 +1,35 @@
 # agent_chain.py
 
-import json
+import os
 import re
 from langchain.agents import Tool, initialize_agent
 from langchain.prompts import PromptTemplate
 
-# MCP tool imports
-from mcp_agents.tools import (
-    retry_order_mcp,
-    sync_customer_data_mcp,
-    fix_asset_mismatch_mcp,
-    create_invoice_mcp
-)
-
-# LLaMA LangChain LLM wrapper
-from utils.llama_wrapper import LlamaLangChainWrapper
+# MCP tools come from the planner's action table
+from chains.remediation_planner import ACTION_TABLE
 
-# ============================================================
-# 1️⃣ Initialize LLM (LLaMA)
-# ============================================================
+# Shared LLM (LLaMA by default, see LLM_PROVIDER)
+from utils.llm_utils import llm_model
+from utils.structured_output import complete_json, InvalidJSONError
+from utils.vector_store import encode_query
+from utils import action_classifier
+from utils.metrics import timed
 
-llm_model = LlamaLangChainWrapper()
+# ReAct trace on stdout; off by default, it prints every prompt
+AGENT_VERBOSE = os.getenv("AGENT_VERBOSE", "false").lower() == "true"
 
 # ============================================================
-# 2️⃣ MCP Tools
+# 1️⃣ MCP Tools
 # ============================================================
 
 tools = [
-    Tool(
-        name="retry_order",
-        description="Use for OSM / ROD-OSM / order fallout issues.",
-        func=retry_order_mcp
-    ),
-    Tool(
-        name="sync_customer_data",
-        description="Use for Sie-CRM / OurTelco / CRM profile mismatch.",
-        func=sync_customer_data_mcp
-    ),
-    Tool(
-        name="fix_asset_mismatch",
-        description="Use for ROD-BRM / BRM asset mismatch.",
-        func=fix_asset_mismatch_mcp
-    ),
-    Tool(
-        name="create_invoice",
-        description="Creates invoice in Ninjainvoice. Only auto-execute for approved actions (create/update invoice).",
-        func=create_invoice_mcp
-    ),
+    Tool(name=action, description=entry["tool_description"], func=entry["func"])
+    for action, entry in ACTION_TABLE.items()
+    if "tool_description" in entry
 ]
 
 # ============================================================
-# 3️⃣ Instruction prompt
+# 2️⃣ Instruction prompt
 # ============================================================
 
 prompt = PromptTemplate(
@@ -132,7 +111,7 @@ Context: {context}
 )
 
 # ============================================================
-# 4️⃣ LangChain Agent
+# 3️⃣ LangChain Agent
 # ============================================================
 
 def create_incident_agent():
@@ -141,13 +120,13 @@ def create_incident_agent():
         tools=tools,
         llm=llm_model,
         agent="zero-shot-react-description",
-        verbose=True,
+        verbose=AGENT_VERBOSE,
         max_iterations=3,
         handle_parsing_errors=True
     )
 
 # ============================================================
-# 5️⃣ Auto-Approved Action Logic
+# 4️⃣ Auto-Approved Action Logic
 # ============================================================
 
 AUTO_APPROVED_ACTIONS = [
@@ -173,33 +152,139 @@ ISSUE_CI_MAP = {
     "invoice": "billing",
 }
 
+# All keywords compiled into one alternation; the lookahead reports
+# overlapping hits so a single scan finds every keyword present.
+_KEYWORD_PRIORITY = {keyword: i for i, keyword in enumerate(ISSUE_CI_MAP)}
+_KEYWORD_PATTERN = re.compile(
+    "(?=(" + "|".join(re.escape(k) for k in ISSUE_CI_MAP) + "))"
+)
+
+
 def classify_issue_type(text: str):
-    text = text.lower()
-    for keyword, cat in ISSUE_CI_MAP.items():
-        if keyword in text:
-            return cat
-    return "unknown"
+    # Earliest keyword in ISSUE_CI_MAP order wins, as with the old linear scan
+    hits = {m.group(1) for m in _KEYWORD_PATTERN.finditer(text.lower())}
+    if not hits:
+        return "unknown"
+    return ISSUE_CI_MAP[min(hits, key=_KEYWORD_PRIORITY.__getitem__)]
 
 # ============================================================
-# 6️⃣ Decision Engine — ensures safe automation
+# 5️⃣ Decision Engine — ensures safe automation
 # ============================================================
 
+INVOICE_ACTIONS = ["create_invoice", "update_invoice"]
+
+# Completion caps sized to each JSON answer instead of a blanket 1024;
+# generation is also cut as soon as the JSON object closes
+DECISION_MAX_TOKENS = 160
+INVOICE_PAYLOAD_MAX_TOKENS = 320
+# Prose models tend to append after the JSON; never matches inside it
+JSON_STOP_SEQUENCES = ["\nNote:", "\nExplanation:", "\n\n\n"]
+NETWORK_BLOCKED_CIS = ["sie-crm", "rod-brm", "rod-osm"]
+
+
+def network_rule_decision(query, ci_name):
+    """Returns the blocking decision if the network rule applies, else None."""
+    if classify_issue_type(query) == "network" and ci_name.lower() in NETWORK_BLOCKED_CIS:
+        return {
+            "automation_allowed": False,
+            "approved_action": None,
+            "confidence": 0.0,
+            "reason": "Network issues cannot trigger CRM/BRM/OSM automation.",
+            "decision_source": "network_rule"
+        }
+    return None
+
+
+def is_valid_invoice_payload(payload) -> bool:
+    """Invoice payload must carry client_id and a non-empty line_items list."""
+    return (
+        isinstance(payload, dict)
+        and "error" not in payload
+        and bool(payload.get("client_id"))
+        and isinstance(payload.get("line_items"), list)
+        and len(payload["line_items"]) > 0
+    )
+
+
+def extract_invoice_payload(query, ci_name):
+    """Separate LLM call that extracts the invoice payload. Returns dict or None."""
+    payload_prompt = f"""
+You MUST return ONLY valid JSON payload for the invoice. No extra text.
+
+Extract from this query:
+QUERY: "{query}"
+CI: "{ci_name}"
+
+Required format:
+{{
+  "client_id": "extracted_client_id",
+  "line_items": [
+    {{
+      "product_key": "item_name",
+      "notes": "description",
+      "cost": 100.0,
+      "quantity": 1
+    }}
+  ]
+}}
+
+If you cannot extract client_id or line_items, return: {{"error": "insufficient_data"}}
+"""
+    try:
+        with timed("llm_invoice_payload"):
+            payload, _ = complete_json(llm_model, payload_prompt,
+                                       max_tokens=INVOICE_PAYLOAD_MAX_TOKENS, stop=JSON_STOP_SEQUENCES)
+    except Exception:
+        return None
+    return payload if is_valid_invoice_payload(payload) else None
+
+
+def build_decision(action, conf, payload, ai_output):
+    """
+    Applies the auto-approval policy to an (action, confidence, payload) triple.
+    Shared by the per-prompt and the consolidated decision paths.
+    """
+    automation_allowed = action in AUTO_APPROVED_ACTIONS and conf >= 0.90
+    if automation_allowed and action in INVOICE_ACTIONS and not is_valid_invoice_payload(payload):
+        automation_allowed = False
+    if not automation_allowed:
+        payload = None
+
+    return {
+        "automation_allowed": automation_allowed,
+        "approved_action": action if automation_allowed else None,
+        "confidence": conf,
+        "reason": "Action auto-approved and payload validated." if automation_allowed else "Action not auto-approved or confidence too low.",
+        "payload": payload,
+        "llm_raw_output": (ai_output or "")[:500]  # Include for debugging
+    }
+
+
 def process_incident(query, ci_name, agent):
     """
     Process incident safely:
     - Returns JSON with 'action', 'confidence', 'reasoning'
     - Only triggers MCP tools if auto-approved and valid
     """
-    issue_type = classify_issue_type(query)
-
     # Network issue rule
-    if issue_type == "network" and ci_name.lower() in ["sie-crm", "rod-brm", "rod-osm"]:
-        return {
-            "automation_allowed": False,
-            "approved_action": None,
-            "confidence": 0.0,
-            "reason": "Network issues cannot trigger CRM/BRM/OSM automation."
-        }
+    blocked = network_rule_decision(query, ci_name)
+    if blocked:
+        return blocked
+
+    # Fast path: local classifier on the cached query embedding
+    with timed("local_classifier"):
+        local = action_classifier.confident_prediction(encode_query(query)[0])
+    if local:
+        action, conf = local
+        action_classifier.record_decision_source("local")
+        payload = None
+        if action in INVOICE_ACTIONS and action in AUTO_APPROVED_ACTIONS and conf >= 0.90:
+            payload = extract_invoice_payload(query, ci_name)
+        decision = build_decision(action, conf, payload, f"local classifier: {action} ({conf:.3f})")
+        decision["decision_source"] = "local_classifier"
+        return decision
+
+    action_classifier.record_decision_source("llm")
 
     # Ask LLM to classify intended action (DIRECT LLM CALL)
     decision_prompt = f"""
@@ -218,103 +303,35 @@ CI: "{ci_name}"
 Output ONLY valid JSON:
 """
 
-    # ✅ Safe LLaMA call
+    # ✅ Safe LLaMA call, streamed and stopped once the JSON object is complete
     try:
-        llm_response = llm_model._call(decision_prompt)
-        if isinstance(llm_response, list):
-            ai_output = llm_response[0].content
-        else:
-            ai_output = str(llm_response)
-    except Exception as e:
+        with timed("llm_decision"):
+            decision, ai_output = complete_json(llm_model, decision_prompt,
+                                                max_tokens=DECISION_MAX_TOKENS, stop=JSON_STOP_SEQUENCES)
+    except InvalidJSONError as e:
+        # extract_json_object's error already carries the start of the output
         return {
             "automation_allowed": False,
             "approved_action": None,
             "confidence": 0.0,
-            "reason": f"LLM call failed: {str(e)}"
+            "reason": f"Invalid JSON returned by LLM. Error: {str(e)}"
         }
-
-    # Extract JSON safely
-    try:
-        cleaned_output = ai_output.strip()
-        if cleaned_output.startswith("```json"):
-            cleaned_output = cleaned_output.replace("```json", "").replace("```", "").strip()
-        elif cleaned_output.startswith("```"):
-            cleaned_output = cleaned_output.replace("```", "").strip()
-
-        match = re.search(r'\{.*\}', cleaned_output, re.DOTALL)
-        if not match:
-            raise ValueError(f"No JSON found in output: {ai_output[:200]}")
-        decision = json.loads(match.group())
     except Exception as e:
         return {
             "automation_allowed": False,
             "approved_action": None,
             "confidence": 0.0,
-            "reason": f"Invalid JSON returned by LLM. Error: {str(e)}. Output was: {ai_output[:200]}"
+            "reason": f"LLM call failed: {str(e)}"
         }
 
     action = decision.get("action", "none")
     conf = float(decision.get("confidence", 0))
 
-    # Only allow auto-approved + high confidence
-    automation_allowed = action in AUTO_APPROVED_ACTIONS and conf >= 0.90
-
     payload = None
-    # If invoice, validate payload
-    if automation_allowed and action in ["create_invoice", "update_invoice"]:
-        payload_prompt = f"""
-You MUST return ONLY valid JSON payload for the invoice. No extra text.
-
-Extract from this query:
-QUERY: "{query}"
-CI: "{ci_name}"
-
-Required format:
-{{
-  "client_id": "extracted_client_id",
-  "line_items": [
-    {{
-      "product_key": "item_name",
-      "notes": "description",
-      "cost": 100.0,
-      "quantity": 1
-    }}
-  ]
-}}
-
-If you cannot extract client_id or line_items, return: {{"error": "insufficient_data"}}
-"""
-        try:
-            payload_response = llm_model._call(payload_prompt)
-            if isinstance(payload_response, list):
-                payload_output = payload_response[0].content
-            else:
-                payload_output = str(payload_response)
-
-            cleaned_payload = payload_output.strip()
-            if cleaned_payload.startswith("```json"):
-                cleaned_payload = cleaned_payload.replace("```json", "").replace("```", "").strip()
-            elif cleaned_payload.startswith("```"):
-                cleaned_payload = cleaned_payload.replace("```", "").strip()
-
-            match = re.search(r'\{.*\}', cleaned_payload, re.DOTALL)
-            if not match:
-                raise ValueError("No invoice JSON found")
-            payload = json.loads(match.group())
-
-            if "error" in payload or "client_id" not in payload or "line_items" not in payload:
-                automation_allowed = False
-                payload = None
-        except Exception:
-            automation_allowed = False
-            payload = None
-
-    return {
-        "automation_allowed": automation_allowed,
-        "approved_action": action if automation_allowed else None,
-        "confidence": conf,
-        "reason": "Action auto-approved and payload validated." if automation_allowed else "Action not auto-approved or confidence too low.",
-        "payload": payload,
-        "llm_raw_output": ai_output[:500]  # Include for debugging
-    }
+    # If invoice, extract payload with a dedicated prompt
+    if action in INVOICE_ACTIONS and action in AUTO_APPROVED_ACTIONS and conf >= 0.90:
+        payload = extract_invoice_payload(query, ci_name)
 
+    decision = build_decision(action, conf, payload, ai_output)
+    decision["decision_source"] = "llm"
+    return decision
@@ -0,0 +1,174 @@
+# consolidated_chain.py
+
+from utils.vector_store import search_similar, encode_query
+from utils.llm_utils import generate_llm_response, llm_model
+from utils.structured_output import complete_json, validate_fields
+from utils.prompt_builder import build_prompt
+from utils.playbooks import match_playbook, format_playbook
+from utils.tenant_registry import is_default_tenant
+from chains.diagnose_chain import predict_assignment_group
+from chains.agent_chain import (
+    AUTO_APPROVED_ACTIONS,
+    INVOICE_ACTIONS,
+    JSON_STOP_SEQUENCES,
+    build_decision,
+    extract_invoice_payload,
+    is_valid_invoice_payload,
+    network_rule_decision,
+    process_incident,
+)
+
+# ============================================================
+# 1️⃣ Schema for the single per-ticket LLM answer
+# ============================================================
+
+def _is_step_list(value):
+    return isinstance(value, list) and 0 < len(value) <= 10 and all(
+        isinstance(step, str) and step.strip() for step in value
+    )
+
+
+def _is_confidence(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and 0.0 <= float(value) <= 1.0
+
+
+# Steps + decision + optional invoice payload
+CONSOLIDATED_MAX_TOKENS = 700
+
+TICKET_SCHEMA = {
+    "suggestion_steps": _is_step_list,
+    "assignment_group": lambda v: isinstance(v, str) and 0 < len(v.strip()) <= 100,
+    "action": lambda v: v in AUTO_APPROVED_ACTIONS + ["none"],
+    "confidence": _is_confidence,
+    # Only required for invoice actions; checked separately below
+    "invoice_payload": lambda v: v is None or is_valid_invoice_payload(v),
+}
+
+
+CONSOLIDATED_TEMPLATE = """
+You are an IT support assistant and Autonomous Ticket Resolution Agent for ServiceNow.
+You MUST reply in EXACT JSON only. No extra text before or after.
+
+USER ISSUE:
+{query}
+
+CONFIGURATION ITEM:
+{configuration_item}
+
+SIMILAR CONTEXT (Incidents and KB Articles):
+{context}
+
+Return ONE JSON object with these keys:
+- "suggestion_steps": list of 3-6 short resolution steps, based on the context
+- "assignment_group": the team that should handle this issue
+  (examples: Application Support, Network Support, Database Team, Service Desk)
+- "action": intended operation, one of: {actions}, or "none"
+- "confidence": number between 0.0 and 1.0 for the action
+- "reasoning": short explanation of the action
+- "invoice_payload": null, unless action is create_invoice or update_invoice, then:
+  {{"client_id": "<client_id>", "line_items": [{{"product_key": "<string>", "notes": "<string>", "cost": <number>, "quantity": <number>}}]}}
+
+If unclear or query is too vague → action = "none", confidence = 0.0
+
+Output ONLY valid JSON:
+"""
+
+
+def build_consolidated_prompt(query: str, configuration_item: str, similar_items: list) -> str:
+    return build_prompt(
+        CONSOLIDATED_TEMPLATE, similar_items,
+        max_completion_tokens=CONSOLIDATED_MAX_TOKENS,
+        query=query, configuration_item=configuration_item,
+        actions=", ".join(AUTO_APPROVED_ACTIONS)
+    )
+
+
+# ============================================================
+# 2️⃣ Consolidated pipeline — one LLM round trip per ticket
+# ============================================================
+
+def diagnose_and_decide(query: str, top_k: int = 5, configuration_item: str = "", agent=None, tenant: str = None):
+    """
+    Retrieval + a single structured LLM call that returns suggestion,
+    assignment group, action, confidence and invoice payload together.
+
+    Fields that fail schema validation are repaired with the original
+    per-field calls, so output matches diagnose_issue + process_incident.
+    Returns (rag_result, decision).
+    """
+    similar_items = search_similar(query, top_k, tenant)
+
+    playbook = match_playbook(encode_query(query)) if is_default_tenant(tenant) else None
+    if playbook:
+        return _playbook_result(query, configuration_item, similar_items, playbook[0], agent, tenant)
+
+    try:
+        answer, ai_output = complete_json(
+            llm_model, build_consolidated_prompt(query, configuration_item, similar_items),
+            max_tokens=CONSOLIDATED_MAX_TOKENS, stop=JSON_STOP_SEQUENCES
+        )
+    except Exception as e:
+        ai_output, answer = f"Consolidated call failed: {e}", {}
+
+    fields, invalid = validate_fields(answer, TICKET_SCHEMA)
+
+    # --- Suggestion / assignment group fallbacks ---
+    if "suggestion_steps" in fields:
+        ai_suggestion = "\n".join(
+            f"{i}. {step.strip()}" for i, step in enumerate(fields["suggestion_steps"], 1)
+        )
+    else:
+        ai_suggestion = generate_llm_response(query, similar_items, configuration_item)
+
+    if "assignment_group" in fields:
+        assignment_group = fields["assignment_group"].strip()
+    else:
+        assignment_group = predict_assignment_group(query, similar_items, tenant)
+
+    # --- Decision fallbacks ---
+    decision = network_rule_decision(query, configuration_item)
+    if decision is None:
+        if "action" not in fields or "confidence" not in fields:
+            decision = process_incident(query, configuration_item, agent)
+        else:
+            action = fields["action"]
+            conf = float(fields["confidence"])
+            payload = fields.get("invoice_payload")
+            if action in INVOICE_ACTIONS and payload is None and conf >= 0.90:
+                payload = extract_invoice_payload(query, configuration_item)
+            decision = build_decision(action, conf, payload, ai_output)
+
+    decision["consolidated_fallback_fields"] = invalid
+
+    rag_result = {
+        "query": query,
+        "configuration_item": configuration_item,
+        "tenant": tenant,
+        "ai_suggestion": ai_suggestion,
+        "suggestion_source": "llm",
+        "assignment_group": assignment_group,
+        "similar_items": similar_items,
+    }
+    return rag_result, decision
+
+
+def _playbook_result(query: str, configuration_item: str, similar_items: list, playbook: dict, agent=None,
+                     tenant: str = None):
+    """
+    Covered by a cluster playbook: the suggestion is precomputed, so the
+    consolidated prompt would only buy the decision. Use the per-field
+    path instead (rules, local classifier, then the decision LLM).
+    """
+    decision = process_incident(query, configuration_item, agent)
+    decision["consolidated_fallback_fields"] = []
+    rag_result = {
+        "query": query,
+        "configuration_item": configuration_item,
+        "tenant": tenant,
+        "ai_suggestion": format_playbook(playbook),
+        "suggestion_source": "playbook",
+        "playbook_cluster": playbook["cluster_id"],
+        "assignment_group": predict_assignment_group(query, similar_items, tenant),
+        "similar_items": similar_items,
+    }
+    return rag_result, decision
@@ -1,86 +1,152 @@
 
-from utils.vector_store import search_similar
+import os
+import numpy as np
+from utils.vector_store import search_similar, nearest_group_centroids, known_assignment_groups, encode_query
 from utils.llm_utils import generate_llm_response, llm_model
-from mcp_agents.tools import retry_order_mcp, sync_customer_data_mcp, fix_asset_mismatch_mcp
+from utils.structured_output import llm_text
+from utils.prompt_builder import build_prompt
+from utils.metrics import timed
+from utils.playbooks import match_playbook, format_playbook
+from utils.tenant_registry import is_default_tenant
 
-def predict_assignment_group(query: str, similar_items: list) -> str:
+# Minimum (top - runner-up) / total vote weight before we trust the neighbors
+ASSIGNMENT_VOTE_MIN_MARGIN = float(os.getenv("ASSIGNMENT_VOTE_MIN_MARGIN", "0.2"))
+# Minimum cosine gap between the two nearest group centroids
+CENTROID_MIN_MARGIN = float(os.getenv("CENTROID_MIN_MARGIN", "0.05"))
+UNKNOWN_GROUPS = ["Not Provided", "Not Applicable"]
+DEFAULT_GROUP_EXAMPLES = ["Application Support", "Network Support", "Database Team", "Service Desk"]
+
+
+def vote_assignment_group(similar_items: list):
     """
-    Predict assignment group using metadata from the most similar incident.
-    Fallback to LLM if metadata is missing.
+    Similarity-weighted vote over all incident neighbors.
+    Returns (group, margin_confidence) or (None, 0.0) if no neighbor carries a group.
+    """
+    neighbors = [
+        item for item in similar_items
+        if item.get("source") == "incident" and item.get("assignment_group") not in UNKNOWN_GROUPS
+    ]
+    if not neighbors:
+        return None, 0.0
+
+    groups, inverse = np.unique([item["assignment_group"] for item in neighbors], return_inverse=True)
+    scores = np.clip([item.get("similarity_score", 0.0) for item in neighbors], 0.0, None)
+    weights = np.bincount(inverse, weights=scores, minlength=len(groups))
+
+    order = np.argsort(weights)[::-1]
+    total = weights.sum()
+    if total <= 0:
+        return str(groups[order[0]]), 0.0
+    runner_up = weights[order[1]] if len(order) > 1 else 0.0
+    return str(groups[order[0]]), float((weights[order[0]] - runner_up) / total)
+
+
+ASSIGNMENT_GROUP_TEMPLATE = """
+    You are an IT support assistant.
+    USER ISSUE: {query}
+    SIMILAR CONTEXT:
+    {context}
+
+    Predict the most appropriate assignment group for handling this issue.
+    Candidates: {examples}.
+    Return ONLY the group name.
     """
-    
-    # ✅ Check top match
-    if similar_items:
-        top_item = similar_items[0]
-        if top_item.get("source") == "incident" and top_item.get("assignment_group") not in ["Not Provided", "Not Applicable"]:
-            return top_item["assignment_group"]
 
 
-    # ✅ Fallback: Use LLM if metadata missing or Use LLM if top match is KB or assignment group missing
-    if llm_model:
-        context = "\n".join([
-            f"{item['source']} {i+1}: {item['training_text']}"
-            for i, item in enumerate(similar_items[:3])
-        ])
-        prompt = f"""
-        You are an IT support assistant.
-        USER ISSUE: {query}
-        SIMILAR CONTEXT:
-        {context}
-
-        Predict the most appropriate assignment group for handling this issue.
-        Examples: Application Support, Network Support, Database Team, Service Desk.
-        Return ONLY the group name.
-        """
-        try:
-            response = llm_model.generate_content(prompt)
-            return response.text.strip()
-        except Exception:
-            return "Service Desk"
-
-    return "Service Desk"  # Final fallback
-
-
-def diagnose_issue(query: str, top_k: int = 5, configuration_item: str = "") -> dict:
+def _llm_assignment_group(query: str, similar_items: list, candidates: list, allowed: list):
     """
-    Main pipeline: search similar incidents, generate AI suggestion, predict assignment group.
+    Asks the LLM for ambiguous cases only. Returns one of `allowed`
+    (canonical spelling) or None on any failure or an unknown group.
     """
-    similar_items = search_similar(query, top_k)
-    ai_suggestion = generate_llm_response(query, similar_items)
-    assignment_group = predict_assignment_group(query, similar_items)
-
-    # ---------------------------------------------------
-    # ✅ STEP 3: CALL MCP TOOL BASED ON THE CONFIGURATION ITEM
-    # ---------------------------------------------------
-    mcp_action_result = None
-
-    from mcp_agents.tools import (
-        retry_order_mcp,
-        sync_customer_data_mcp,
-        fix_asset_mismatch_mcp
+    examples = ", ".join(candidates or DEFAULT_GROUP_EXAMPLES)
+    prompt = build_prompt(
+        ASSIGNMENT_GROUP_TEMPLATE, similar_items,
+        max_completion_tokens=32, label="", query=query, examples=examples
     )
+    try:
+        group = llm_text(llm_model.invoke(prompt)).strip()
+    except Exception:
+        return None
+    if not group or "Error:" in group or len(group) > 100:
+        return None
+    # A free-text answer must name a group that exists; anything else is dropped
+    by_name = {name.lower(): name for name in allowed}
+    return by_name.get(group.strip(" \t\"'`.").lower())
+
+
+def predict_assignment_group_with_confidence(query: str, similar_items: list, tenant: str = None):
+    """
+    Returns (assignment_group, confidence, source) where source is one of
+    "neighbor_vote", "group_centroid", "llm" or "default".
+    """
+    # ✅ Weighted vote over the top-k incident neighbors
+    group, margin = vote_assignment_group(similar_items)
+    if group and margin >= ASSIGNMENT_VOTE_MIN_MARGIN:
+        return group, margin, "neighbor_vote"
+
+    # ✅ No incident neighbors: nearest precomputed group centroid
+    candidates = [group] if group else []
+    if group is None:
+        nearest = nearest_group_centroids(query, k=2, tenant=tenant)
+        if nearest:
+            best_group, best_sim = nearest[0]
+            gap = best_sim - (nearest[1][1] if len(nearest) > 1 else 0.0)
+            if gap >= CENTROID_MIN_MARGIN:
+                return best_group, float(gap), "group_centroid"
+            candidates = [g for g, _ in nearest]
+
+    # ✅ Ambiguous: let the LLM pick, preferring the vote's best guess on failure
+    if llm_model:
+        neighbor_groups = [item.get("assignment_group") for item in similar_items
+                           if item.get("source") == "incident"
+                           and item.get("assignment_group") not in UNKNOWN_GROUPS + [None]]
+        allowed = set(candidates or DEFAULT_GROUP_EXAMPLES) | set(neighbor_groups) | set(known_assignment_groups(tenant))
+        llm_group = _llm_assignment_group(query, similar_items, candidates, sorted(allowed))
+        if llm_group:
+            return llm_group, margin, "llm"
 
-    if configuration_item.upper() in ["ROD-OSM", "OSM"]:
-        mcp_action_result = retry_order_mcp(query)
+    if group:
+        return group, margin, "neighbor_vote"
+    return "Service Desk", 0.0, "default"  # Final fallback
 
-    elif configuration_item.upper() in ["OURTELCO", "CRM", "SIE-CRM"]:
-        mcp_action_result = sync_customer_data_mcp(query)
 
-    elif configuration_item.upper() in ["ROD-BRM", "BRM"]:
-        mcp_action_result = fix_asset_mismatch_mcp(query)
+def predict_assignment_group(query: str, similar_items: list, tenant: str = None) -> str:
+    """
+    Predict assignment group from a similarity-weighted vote of the
+    similar incidents, falling back to group centroids and then the LLM.
+    """
+    return predict_assignment_group_with_confidence(query, similar_items, tenant)[0]
 
-    else:
-        mcp_action_result = "No automation available for this CI"
 
-    # ---------------------------------------------------
+def diagnose_issue(query: str, top_k: int = 5, configuration_item: str = "", tenant: str = None) -> dict:
+    """
+    Main pipeline: search similar incidents, generate AI suggestion, predict assignment group.
+    """
+    with timed("retrieval"):
+        similar_items = search_similar(query, top_k, tenant)
+    # ✅ Recurring problem: precomputed cluster playbook, no LLM call (built from the default corpus)
+    playbook = match_playbook(encode_query(query)) if is_default_tenant(tenant) else None
+    if playbook:
+        ai_suggestion, suggestion_source = format_playbook(playbook[0]), "playbook"
+    else:
+        with timed("llm_suggestion"):
+            ai_suggestion, suggestion_source = generate_llm_response(query, similar_items), "llm"
+    with timed("assignment_group"):
+        assignment_group, group_confidence, group_source = predict_assignment_group_with_confidence(
+            query, similar_items, tenant)
 
+    # MCP remediation runs once, after the decision (chains/remediation_planner.py)
     return {
         "query": query,
         "configuration_item": configuration_item,
+        "tenant": tenant,
         "ai_suggestion": ai_suggestion,
+        "suggestion_source": suggestion_source,
+        "playbook_cluster": playbook[0]["cluster_id"] if playbook else None,
         "assignment_group": assignment_group,
+        "assignment_group_confidence": round(group_confidence, 4),
+        "assignment_group_source": group_source,
         "similar_items": similar_items,
-        "mcp_action_result": mcp_action_result   # <-- STEP 3 OUTPUT
     }
 
 
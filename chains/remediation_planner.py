@@ -0,0 +1,179 @@
+# chains/remediation_planner.py
+"""
+Single place that decides which MCP backend call a ticket gets.
+
+Retrieval + decision outputs → build_plan() → at most one step →
+execute_plan() runs it and records exactly what was called.
+The agent tools, the decision-approved actions and the old CI-based
+automation all dispatch through ACTION_TABLE.
+"""
+import os
+import time
+import threading
+from dotenv import load_dotenv
+
+from mcp_agents.tools import (
+    retry_order_mcp,
+    sync_customer_data_mcp,
+    fix_asset_mismatch_mcp,
+    create_invoice_mcp
+)
+from utils.circuit_breaker import get_breaker
+from utils.metrics import timed
+from utils.tracing import tag_current
+
+load_dotenv()
+
+# Opt-in legacy behaviour: when the decision approves nothing, still run the
+# CI's default action (what diagnose_issue used to do unconditionally).
+# Off by default, so only automation_allowed decisions produce a step.
+REMEDIATION_CI_FALLBACK = os.getenv("REMEDIATION_CI_FALLBACK", "false").lower() == "true"
+
+# ============================================================
+# 1️⃣ Lookup tables
+# ============================================================
+
+# action -> backend, MCP function, what it is called with, agent tool description
+ACTION_TABLE = {
+    "retry_order": {
+        "backend": "osm", "func": retry_order_mcp, "input": "query",
+        "tool_description": "Use for OSM / ROD-OSM / order fallout issues.",
+    },
+    "update_order": {"backend": "osm", "func": retry_order_mcp, "input": "query"},
+    "sync_customer_data": {
+        "backend": "crm", "func": sync_customer_data_mcp, "input": "query",
+        "tool_description": "Use for Sie-CRM / OurTelco / CRM profile mismatch.",
+    },
+    "fix_asset_mismatch": {
+        "backend": "brm", "func": fix_asset_mismatch_mcp, "input": "query",
+        "tool_description": "Use for ROD-BRM / BRM asset mismatch.",
+    },
+    "create_invoice": {
+        "backend": "ninja", "func": create_invoice_mcp, "input": "payload",
+        "tool_description": "Creates invoice in Ninjainvoice. Only auto-execute for approved actions (create/update invoice).",
+    },
+    "update_invoice": {"backend": "ninja", "func": create_invoice_mcp, "input": "payload"},
+}
+
+# configuration item (upper-case) -> default action
+CI_ACTIONS = {
+    "ROD-OSM": "retry_order",
+    "OSM": "retry_order",
+    "OURTELCO": "sync_customer_data",
+    "CRM": "sync_customer_data",
+    "SIE-CRM": "sync_customer_data",
+    "ROD-BRM": "fix_asset_mismatch",
+    "BRM": "fix_asset_mismatch",
+}
+
+
+# ============================================================
+# 2️⃣ Plan
+# ============================================================
+
+def build_plan(query: str, configuration_item: str, decision: dict) -> dict:
+    """
+    Returns {"steps": [...], "skipped": reason or None, "error": bool}; steps holds
+    at most one call. error marks an approved action that cannot be executed.
+    """
+    decision = decision or {}
+    action, source = None, None
+
+    if decision.get("automation_allowed"):
+        action, source = decision.get("approved_action"), "decision"
+        if action not in ACTION_TABLE:
+            return {"steps": [], "skipped": f"No MCP function mapped for action: {action}", "error": True}
+    elif decision.get("decision_source") == "network_rule":
+        return {"steps": [], "skipped": decision.get("reason"), "error": False}
+    elif REMEDIATION_CI_FALLBACK:
+        action, source = CI_ACTIONS.get((configuration_item or "").upper()), "ci_fallback"
+
+    if action is None:
+        return {"steps": [], "skipped": "Automation not allowed and no CI default action", "error": False}
+
+    entry = ACTION_TABLE[action]
+    if entry["input"] == "payload":
+        argument = decision.get("payload")
+        if not argument:
+            return {"steps": [], "skipped": "Invoice action requires payload", "error": True}
+    else:
+        argument = query
+
+    return {
+        "steps": [{"action": action, "backend": entry["backend"], "source": source, "argument": argument}],
+        "skipped": None,
+        "error": False,
+    }
+
+
+# ============================================================
+# 3️⃣ Execution + accounting
+# ============================================================
+
+_stats_lock = threading.Lock()
+_stats = {"plans": 0, "calls": {}, "skipped": 0, "circuit_open": 0}
+
+
+def _count(backend=None, skipped=False, circuit_open=False):
+    with _stats_lock:
+        _stats["plans"] += 1
+        if backend:
+            _stats["calls"][backend] = _stats["calls"].get(backend, 0) + 1
+        _stats["skipped"] += int(skipped)
+        _stats["circuit_open"] += int(circuit_open)
+
+
+def execute_plan(plan: dict) -> dict:
+    """
+    Runs the plan. Returns {"mcp_action_result", "remediation_calls"}; remediation_calls
+    lists every backend call actually made for the ticket (empty if none).
+    """
+    if not plan["steps"]:
+        _count(skipped=True)
+        return {
+            "mcp_action_result": {"status": "error", "message": plan["skipped"]} if plan["error"] else None,
+            "remediation_calls": [],
+        }
+
+    step = plan["steps"][0]
+    entry = ACTION_TABLE[step["action"]]
+    backend = step["backend"]
+
+    # Open breaker → escalate right away instead of waiting on the backend
+    if get_breaker(backend).is_open():
+        _count(circuit_open=True)
+        return {
+            "mcp_action_result": {
+                "status": "error",
+                "circuit_open": True,
+                "backend": backend,
+                "message": f"{backend} is unavailable (circuit breaker open); remediation skipped"
+            },
+            "remediation_calls": [],
+        }
+
+    start = time.perf_counter()
+    try:
+        with timed(f"mcp_{backend}"):
+            tag_current(action=step["action"], source=step["source"])
+            result = entry["func"](step["argument"])
+            tag_current(status=result.get("status") if isinstance(result, dict) else None)
+    except Exception as e:
+        result = {"status": "error", "message": str(e)}
+    _count(backend=backend)
+
+    return {
+        "mcp_action_result": result,
+        "remediation_calls": [{
+            "action": step["action"],
+            "backend": backend,
+            "source": step["source"],
+            "status": result.get("status") if isinstance(result, dict) else None,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+        }],
+    }
+
+
+def get_planner_stats() -> dict:
+    with _stats_lock:
+        return {**_stats, "calls": dict(_stats["calls"]), "ci_fallback": REMEDIATION_CI_FALLBACK}
@@ -0,0 +1,201 @@
+
+import os
+import sys
+import json
+import pickle
+import argparse
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.embedding_codec import model_vectors
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+EMBEDDINGS_FILE = "embeddings_data.pkl"
+OUTPUT_FILE = "cluster_playbooks.pkl"
+# Human-readable copy for review; edit "approved" / "steps" and re-apply with --apply-review
+REVIEW_FILE = "cluster_playbooks_review.json"
+N_CLUSTERS = 40
+KMEANS_ITERATIONS = 25
+MIN_CLUSTER_SIZE = 5
+EXAMPLES_PER_CLUSTER = 5
+# A member this far out (percentile of member similarity) still belongs to the cluster
+RADIUS_PERCENTILE = 10
+PLAYBOOK_MAX_TOKENS = 400
+PLAYBOOK_CONTEXT_TOKENS = 1500
+UNKNOWN_GROUPS = ["Not Provided", "Not Applicable"]
+
+parser = argparse.ArgumentParser(description="Cluster the corpus and write one LLM playbook per cluster")
+parser.add_argument("--clusters", type=int, default=N_CLUSTERS)
+parser.add_argument("--seed", type=int, default=42)
+parser.add_argument("--apply-review", action="store_true",
+                    help=f"only copy approvals / edited steps from {REVIEW_FILE} into {OUTPUT_FILE}")
+parser.add_argument("--auto-approve", action="store_true",
+                    help="approve schema-valid playbooks without review (default: every playbook starts unapproved)")
+args = parser.parse_args()
+
+print("="*70)
+print("BUILD CLUSTER PLAYBOOKS")
+print("="*70)
+
+# ============================================================================
+# APPLY REVIEW (no re-clustering, no LLM calls)
+# ============================================================================
+if args.apply_review:
+    with open(OUTPUT_FILE, 'rb') as f:
+        output = pickle.load(f)
+    with open(REVIEW_FILE) as f:
+        review = {r["cluster_id"]: r for r in json.load(f)}
+    for playbook in output['playbooks']:
+        edited = review.get(playbook['cluster_id'])
+        if edited:
+            playbook['approved'] = bool(edited.get('approved')) and bool(edited.get('steps'))
+            playbook['steps'] = [s.strip() for s in edited.get('steps') or [] if s.strip()]
+            playbook['title'] = edited.get('title', playbook['title'])
+    with open(OUTPUT_FILE, 'wb') as f:
+        pickle.dump(output, f)
+    approved = sum(p['approved'] for p in output['playbooks'])
+    print(f"✅ Applied review: {approved}/{len(output['playbooks'])} playbooks approved")
+    sys.exit(0)
+
+# ============================================================================
+# LOAD EMBEDDINGS
+# ============================================================================
+print(f"\n📂 Loading embeddings from {EMBEDDINGS_FILE}...")
+with open(EMBEDDINGS_FILE, 'rb') as f:
+    data = pickle.load(f)
+
+embeddings = model_vectors(data)
+metadata = data['metadata']
+print(f"✅ Loaded {embeddings.shape[0]} embeddings of dimension {embeddings.shape[1]}")
+
+# ============================================================================
+# K-MEANS (spherical, so centroids are comparable by cosine)
+# ============================================================================
+k = min(args.clusters, max(1, embeddings.shape[0] // MIN_CLUSTER_SIZE))
+print(f"\n🚀 Clustering into {k} clusters...")
+kmeans = faiss.Kmeans(embeddings.shape[1], k, niter=KMEANS_ITERATIONS, spherical=True, seed=args.seed, verbose=False)
+kmeans.train(embeddings)
+centroids = kmeans.centroids.copy()
+faiss.normalize_L2(centroids)
+
+sims = embeddings @ centroids.T
+assignment = sims.argmax(axis=1)
+member_sims = sims[np.arange(len(assignment)), assignment]
+
+clusters = []
+for c in range(k):
+    members = np.where(assignment == c)[0]
+    if len(members) < MIN_CLUSTER_SIZE:
+        continue
+    order = members[np.argsort(member_sims[members])[::-1]]
+    groups = [str(metadata[i].get("Assignment group", "Not Provided")) for i in members
+              if metadata[i].get("source") == "incident"]
+    groups = [g for g in groups if g not in UNKNOWN_GROUPS]
+    top_group, top_share = None, 0.0
+    if groups:
+        names, counts = np.unique(groups, return_counts=True)
+        top_group, top_share = str(names[counts.argmax()]), float(counts.max() / len(groups))
+    clusters.append({
+        "cluster_id": int(c),
+        "size": int(len(members)),
+        "radius": float(np.percentile(member_sims[members], RADIUS_PERCENTILE)),
+        "examples": [int(i) for i in order[:EXAMPLES_PER_CLUSTER]],
+        "assignment_group": top_group,
+        "assignment_group_share": round(top_share, 3),
+    })
+
+covered = sum(c["size"] for c in clusters)
+print(f"✅ {len(clusters)} clusters with >= {MIN_CLUSTER_SIZE} members "
+      f"({covered / len(metadata):.1%} of the corpus)")
+
+# ============================================================================
+# ONE PLAYBOOK PER CLUSTER (LLM)
+# ============================================================================
+from utils.llm_utils import llm_model
+from utils.prompt_builder import build_prompt
+from utils.structured_output import complete_json, validate_fields
+
+PLAYBOOK_TEMPLATE = """
+You are a senior IT support engineer writing a reusable runbook for ServiceNow.
+You MUST reply in EXACT JSON only. No extra text before or after.
+
+The following past incidents and KB articles all describe the same recurring problem:
+{context}
+
+Return ONE JSON object with these keys:
+- "title": short name of the recurring problem (max 10 words)
+- "steps": list of 3-6 short, concrete resolution steps that apply to every ticket of this kind
+- "applies_when": one sentence describing which tickets this runbook fits
+
+Do not mention ticket numbers, customer names or IDs from the examples.
+
+Output ONLY valid JSON:
+"""
+
+PLAYBOOK_SCHEMA = {
+    "title": lambda v: isinstance(v, str) and 0 < len(v.strip()) <= 120,
+    "steps": lambda v: isinstance(v, list) and 3 <= len(v) <= 6 and all(
+        isinstance(s, str) and 0 < len(s.strip()) <= 300 for s in v),
+    "applies_when": lambda v: isinstance(v, str) and v.strip(),
+}
+
+
+def example_items(cluster):
+    return [{
+        "training_text": str(metadata[i].get("training_text", ""))[:500],
+        "source": metadata[i].get("source", "unknown"),
+        "similarity_score": float(member_sims[i]),
+    } for i in cluster["examples"]]
+
+
+print(f"\n⚡ Generating playbooks for {len(clusters)} clusters...")
+playbooks = []
+for cluster in clusters:
+    prompt = build_prompt(PLAYBOOK_TEMPLATE, example_items(cluster), max_completion_tokens=PLAYBOOK_MAX_TOKENS,
+                          budget_tokens=PLAYBOOK_CONTEXT_TOKENS, max_items=EXAMPLES_PER_CLUSTER, label="Example")
+    try:
+        answer, raw = complete_json(llm_model, prompt, max_tokens=PLAYBOOK_MAX_TOKENS)
+    except Exception as e:
+        answer, raw = {}, f"Error: {e}"
+    fields, invalid = validate_fields(answer, PLAYBOOK_SCHEMA)
+
+    # Vetting: schema-valid, no provider error text. Nothing is served before a reviewer
+    # approves it in REVIEW_FILE, unless --auto-approve was given explicitly
+    valid = not invalid and "Error:" not in raw
+    approved = valid and args.auto_approve
+    playbooks.append({
+        **cluster,
+        "title": (fields.get("title") or "").strip(),
+        "steps": [s.strip() for s in fields.get("steps") or []],
+        "applies_when": (fields.get("applies_when") or "").strip(),
+        "approved": approved,
+        "rejected_fields": invalid,
+    })
+    mark = "✅" if approved else ("📝" if valid else "⚠️ ")
+    print(f"   {mark} cluster {cluster['cluster_id']:>3} ({cluster['size']} records): "
+          f"{playbooks[-1]['title'] or 'rejected: ' + ', '.join(invalid)}")
+
+# ============================================================================
+# SAVE
+# ============================================================================
+output = {
+    'centroids': centroids.astype('float32'),
+    'playbooks': playbooks,
+    'model_name': data['model_info']['model_name'],
+    'num_records': len(metadata),
+}
+with open(OUTPUT_FILE, 'wb') as f:
+    pickle.dump(output, f)
+with open(REVIEW_FILE, 'w') as f:
+    json.dump([{key: p[key] for key in ("cluster_id", "size", "title", "applies_when", "steps", "approved",
+                                        "assignment_group")} for p in playbooks], f, indent=2)
+
+approved = sum(p['approved'] for p in playbooks)
+approved_records = sum(p['size'] for p in playbooks if p['approved'])
+print(f"\n💾 Saved {OUTPUT_FILE} and {REVIEW_FILE}")
+print(f"✅ {approved}/{len(playbooks)} playbooks approved, covering {approved_records / len(metadata):.1%} of the corpus")
+if approved < len(playbooks):
+    print(f"   Review {REVIEW_FILE} (set \"approved\": true), then: python build_cluster_playbooks.py --apply-review")
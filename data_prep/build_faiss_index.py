@@ -3,12 +3,27 @@ import pickle
 import faiss
 import numpy as np
 import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.embedding_codec import stored_vectors, project_queries
 
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 EMBEDDINGS_FILE = "embeddings_data.pkl"
 FAISS_INDEX_FILE = "faiss_index.index"  # ✅ Updated extension
+# flat = exact float32; fp16 / sq8 = faiss ScalarQuantizer (1/2 and 1/4 of the size)
+INDEX_TYPES = {
+    "flat": None,
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+parser = argparse.ArgumentParser(description="Build the FAISS index from embeddings_data.pkl")
+parser.add_argument("--index", choices=list(INDEX_TYPES), default="flat")
+args = parser.parse_args()
 
 # ============================================================================
 # LOAD EMBEDDINGS
@@ -21,11 +36,13 @@ print(f"\n📂 Loading embeddings from {EMBEDDINGS_FILE}...")
 with open(EMBEDDINGS_FILE, 'rb') as f:
     data = pickle.load(f)
 
-embeddings = data['embeddings']  # shape: (num_records, embedding_dim)
+embeddings = stored_vectors(data)  # shape: (num_records, embedding_dim), float32, PCA-reduced if enabled
 metadata = data['metadata']
 embedding_dim = embeddings.shape[1]
+codec = data.get('codec')
 
-print(f"✅ Loaded {embeddings.shape[0]} embeddings of dimension {embedding_dim}")
+print(f"✅ Loaded {embeddings.shape[0]} embeddings of dimension {embedding_dim}"
+      + (f" (stored as {codec['dtype']})" if codec else ""))
 
 # ============================================================================
 # CREATE FAISS INDEX
@@ -36,10 +53,14 @@ print("\n🚀 Creating FAISS index (cosine similarity)...")
 faiss.normalize_L2(embeddings)
 
 # Create index
-index = faiss.IndexFlatIP(embedding_dim)  # Inner Product for cosine similarity
+if INDEX_TYPES[args.index] is None:
+    index = faiss.IndexFlatIP(embedding_dim)  # Inner Product for cosine similarity
+else:
+    index = faiss.IndexScalarQuantizer(embedding_dim, INDEX_TYPES[args.index], faiss.METRIC_INNER_PRODUCT)
+    index.train(embeddings)
 index.add(embeddings)
 
-print(f"✅ FAISS index created with {index.ntotal} vectors")
+print(f"✅ FAISS index ({args.index}) created with {index.ntotal} vectors")
 
 # ============================================================================
 # SAVE INDEX
@@ -67,6 +88,7 @@ def search_faiss(query_text, model, index, metadata, top_k=5):
     # Encode query
     query_vector = model.encode([query_text], normalize_embeddings=True)
     faiss.normalize_L2(query_vector)
+    query_vector = project_queries(query_vector, codec)
 
     # Search
     D, I = index.search(query_vector, top_k)
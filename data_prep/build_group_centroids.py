@@ -0,0 +1,66 @@
+
+import pickle
+import numpy as np
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.embedding_codec import model_vectors
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+EMBEDDINGS_FILE = "embeddings_data.pkl"
+OUTPUT_FILE = "group_centroids.pkl"
+MIN_INCIDENTS_PER_GROUP = 3
+UNKNOWN_GROUPS = ["Not Provided", "Not Applicable"]
+
+# ============================================================================
+# LOAD EMBEDDINGS
+# ============================================================================
+print("="*70)
+print("BUILD ASSIGNMENT GROUP CENTROIDS")
+print("="*70)
+
+print(f"\n📂 Loading embeddings from {EMBEDDINGS_FILE}...")
+with open(EMBEDDINGS_FILE, 'rb') as f:
+    data = pickle.load(f)
+
+embeddings = model_vectors(data)  # the query encoder's space, whatever the storage codec
+metadata = data['metadata']
+
+groups = np.array([
+    str(m.get("Assignment group", "Not Provided")) if m.get("source") == "incident" else "Not Applicable"
+    for m in metadata
+])
+mask = ~np.isin(groups, UNKNOWN_GROUPS)
+print(f"✅ {mask.sum()} incidents carry an assignment group")
+
+# ============================================================================
+# COMPUTE CENTROIDS
+# ============================================================================
+names, inverse, counts = np.unique(groups[mask], return_inverse=True, return_counts=True)
+sums = np.zeros((len(names), embeddings.shape[1]), dtype='float32')
+np.add.at(sums, inverse, embeddings[mask])
+
+keep = counts >= MIN_INCIDENTS_PER_GROUP
+centroids = sums[keep] / counts[keep][:, None]
+centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+
+print(f"✅ {keep.sum()} groups kept (>= {MIN_INCIDENTS_PER_GROUP} incidents each)")
+for name, count in zip(names[keep], counts[keep]):
+    print(f"   - {name}: {count}")
+
+# ============================================================================
+# SAVE
+# ============================================================================
+output = {
+    'groups': [str(n) for n in names[keep]],
+    'centroids': centroids.astype('float32'),
+    'counts': counts[keep].tolist(),
+    'model_name': data['model_info']['model_name'],
+}
+with open(OUTPUT_FILE, 'wb') as f:
+    pickle.dump(output, f)
+file_size = os.path.getsize(OUTPUT_FILE) / 1024
+print(f"\n💾 Saved {OUTPUT_FILE} ({file_size:.1f} KB)")
@@ -1,5 +1,7 @@
 
 import os
+import sys
+import argparse
 import pandas as pd
 import numpy as np
 import pickle
@@ -8,6 +10,9 @@ from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 from sklearn.metrics.pairwise import cosine_similarity
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.embedding_codec import compress, DTYPES
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
@@ -17,6 +22,13 @@ MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 BATCH_SIZE = 16
 MAX_TEXT_LENGTH = 2000
 
+parser = argparse.ArgumentParser(description="Embed combined_training_data.csv into embeddings_data.pkl")
+parser.add_argument("--dtype", choices=DTYPES, default="float32",
+                    help="storage type of the vectors (int8 = per-dimension scalar quantization)")
+parser.add_argument("--pca-dim", type=int, default=0,
+                    help="project onto this many principal directions before storing (0 = keep all)")
+args = parser.parse_args()
+
 # ============================================================================
 # LOAD DATA
 # ============================================================================
@@ -90,12 +102,19 @@ print(f"✅ Prepared metadata for {len(metadata)} records")
 # ============================================================================
 # SAVE TO DISK
 # ============================================================================
+stored, codec = compress(embeddings, args.dtype, args.pca_dim)
+print(f"✅ Stored as {args.dtype}, {stored.shape[1]} dimensions"
+      + (f" (PCA from {embeddings.shape[1]})" if args.pca_dim else ""))
+
 output_data = {
-    'embeddings': embeddings.astype('float32'),
+    'embeddings': stored,
+    'codec': codec,
     'metadata': metadata,
     'model_info': {
         'model_name': MODEL_NAME,
         'embedding_dim': embeddings.shape[1],
+        'stored_dim': stored.shape[1],
+        'dtype': args.dtype,
         'num_records': len(embeddings),
         'date_created': time.strftime('%Y-%m-%d %H:%M:%S')
     }
@@ -0,0 +1,128 @@
+
+import os
+import sys
+import time
+import pickle
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.embedding_codec import model_vectors
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+EMBEDDINGS_FILE = "embeddings_data.pkl"
+# Optional labeled decisions: columns "text" and "action"
+LABELS_FILE = "action_labels.csv"
+OUTPUT_FILE = "action_classifier.pkl"
+
+# Weak labels from the incident history when no labeled decisions exist.
+# The configuration item only says which backend a ticket concerns, not
+# that automation resolved it, so a model trained on these is saved as
+# label_source="weak_ci" and never skips the LLM at runtime
+# (utils/action_classifier.py): "none" here also covers invoice and
+# billing tickets the LLM may well automate.
+CI_ACTION_LABELS = {
+    "ROD-OSM": "update_order",
+    "OSM": "update_order",
+    "SIE-CRM": "sync_customer_data",
+    "OURTELCO": "sync_customer_data",
+    "CRM": "sync_customer_data",
+}
+
+print("="*70)
+print("TRAIN LOCAL ACTION CLASSIFIER")
+print("="*70)
+
+# ============================================================================
+# LOAD EMBEDDINGS + LABELS
+# ============================================================================
+print(f"\n📂 Loading embeddings from {EMBEDDINGS_FILE}...")
+with open(EMBEDDINGS_FILE, 'rb') as f:
+    data = pickle.load(f)
+
+model_name = data['model_info']['model_name']
+
+if os.path.exists(LABELS_FILE):
+    from sentence_transformers import SentenceTransformer
+    df = pd.read_csv(LABELS_FILE).dropna(subset=["text", "action"])
+    print(f"✅ Loaded {len(df)} labeled decisions from {LABELS_FILE}")
+    model = SentenceTransformer(model_name)
+    X = model.encode(df["text"].astype(str).tolist(), batch_size=32,
+                     convert_to_numpy=True, normalize_embeddings=True)
+    y = df["action"].astype(str).to_numpy()
+    label_source = "labeled"
+else:
+    print(f"⚠️ {LABELS_FILE} not found, using CI-derived labels from incident history")
+    print("   (weak labels: the model is only evaluated; it will not skip the LLM until trained on labels)")
+    label_source = "weak_ci"
+    keep = [i for i, m in enumerate(data['metadata']) if m.get("source") == "incident"]
+    X = model_vectors(data)[keep]
+    y = np.array([
+        CI_ACTION_LABELS.get(str(data['metadata'][i].get("Configuration item", "")).upper(), "none")
+        for i in keep
+    ])
+
+X = X.astype('float32')
+classes, counts = np.unique(y, return_counts=True)
+print(f"✅ {len(y)} examples, classes: {dict(zip(classes, counts))}")
+if len(classes) < 2:
+    print("❌ ERROR: need at least two action classes to train")
+    exit(1)
+
+# ============================================================================
+# TRAIN + CALIBRATE
+# ============================================================================
+stratify = y if counts.min() >= 2 else None
+X_train, X_cal, y_train, y_cal = train_test_split(X, y, test_size=0.2, random_state=42, stratify=stratify)
+
+print("\n🚀 Training logistic regression...")
+start_time = time.time()
+clf = LogisticRegression(max_iter=2000, C=4.0)
+clf.fit(X_train, y_train)
+print(f"✅ Trained in {time.time() - start_time:.2f}s")
+
+# Temperature scaling on the held-out split so probabilities are calibrated
+logits = X_cal @ clf.coef_.T + clf.intercept_
+if logits.shape[1] == 1:
+    # Binary LR stores a single row; expand to two-class logits
+    logits = np.hstack([np.zeros_like(logits), logits])
+label_idx = np.searchsorted(clf.classes_, y_cal)
+
+
+def nll(temperature):
+    z = logits / temperature
+    z -= z.max(axis=1, keepdims=True)
+    log_probs = z - np.log(np.exp(z).sum(axis=1, keepdims=True))
+    return -log_probs[np.arange(len(label_idx)), label_idx].mean()
+
+
+temperatures = np.linspace(0.25, 5.0, 96)
+temperature = float(temperatures[np.argmin([nll(t) for t in temperatures])])
+accuracy = float((clf.classes_[logits.argmax(axis=1)] == y_cal).mean())
+print(f"✅ Calibration temperature={temperature:.2f}, held-out accuracy={accuracy:.3f}")
+
+coef, intercept = clf.coef_, clf.intercept_
+if coef.shape[0] == 1:
+    coef = np.vstack([np.zeros_like(coef), coef])
+    intercept = np.concatenate([np.zeros_like(intercept), intercept])
+
+# ============================================================================
+# SAVE
+# ============================================================================
+output = {
+    'coef': coef.astype('float32'),
+    'intercept': intercept.astype('float32'),
+    'classes': [str(c) for c in clf.classes_],
+    'temperature': temperature,
+    'model_name': model_name,
+    'heldout_accuracy': accuracy,
+    'label_source': label_source,
+    'date_created': time.strftime('%Y-%m-%d %H:%M:%S')
+}
+with open(OUTPUT_FILE, 'wb') as f:
+    pickle.dump(output, f)
+print(f"\n💾 Saved classifier to {OUTPUT_FILE}")
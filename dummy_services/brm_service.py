@@ -1,15 +1,36 @@
+import os
+import time
 from flask import Flask, request, jsonify
 
 app = Flask(__name__)
 
+# Per-request backend overhead (auth, connection, commit), paid once per call
+SIMULATED_LATENCY_MS = float(os.getenv("SIMULATED_LATENCY_MS", "0"))
+
+
+def simulate_latency():
+    if SIMULATED_LATENCY_MS > 0:
+        time.sleep(SIMULATED_LATENCY_MS / 1000.0)
+
+
+def fix_one(asset_id):
+    return {
+        "status": "success",
+        "message": f"Asset mismatch fixed for asset {asset_id} in BRM."
+    }
+
 @app.post("/fix-asset")
 def fix_asset():
+    simulate_latency()
     asset_id = request.json.get("asset_id")
-    return jsonify({
-        "status": "success",
-        "message": f"Asset mismatch fixed for asset {asset_id} in BRM."
-    })
+    return jsonify(fix_one(asset_id))
 
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=7003)
+@app.post("/fix-asset/bulk")
+def fix_asset_bulk():
+    """{"items": [{"asset_id": ...}, ...]} → {"results": [...]} in the same order."""
+    simulate_latency()
+    items = (request.json or {}).get("items", [])
+    return jsonify({"results": [fix_one(item.get("asset_id")) for item in items]})
 
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=7003, threaded=True)
@@ -1,15 +1,36 @@
+import os
+import time
 from flask import Flask, request, jsonify
 
 app = Flask(__name__)
 
+# Per-request backend overhead (auth, connection, commit), paid once per call
+SIMULATED_LATENCY_MS = float(os.getenv("SIMULATED_LATENCY_MS", "0"))
+
+
+def simulate_latency():
+    if SIMULATED_LATENCY_MS > 0:
+        time.sleep(SIMULATED_LATENCY_MS / 1000.0)
+
+
+def sync_one(customer_id):
+    return {
+        "status": "success",
+        "message": f"Customer {customer_id} data synced successfully in Sie-CRM/OurTelco."
+    }
+
 @app.post("/sync-customer-data")
 def sync_customer():
+    simulate_latency()
     customer_id = request.json.get("customer_id")
-    return jsonify({
-        "status": "success",
-        "message": f"Customer {customer_id} data synced successfully in Sie-CRM/OurTelco."
-    })
+    return jsonify(sync_one(customer_id))
 
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=7002)
+@app.post("/sync-customer-data/bulk")
+def sync_customer_bulk():
+    """{"items": [{"customer_id": ...}, ...]} → {"results": [...]} in the same order."""
+    simulate_latency()
+    items = (request.json or {}).get("items", [])
+    return jsonify({"results": [sync_one(item.get("customer_id")) for item in items]})
 
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=7002, threaded=True)
@@ -1,15 +1,36 @@
+import os
+import time
 from flask import Flask, request, jsonify
 
 app = Flask(__name__)
 
+# Per-request backend overhead (auth, connection, commit), paid once per call
+SIMULATED_LATENCY_MS = float(os.getenv("SIMULATED_LATENCY_MS", "0"))
+
+
+def simulate_latency():
+    if SIMULATED_LATENCY_MS > 0:
+        time.sleep(SIMULATED_LATENCY_MS / 1000.0)
+
+
+def retry_one(order_id):
+    return {
+        "status": "success",
+        "message": f"Order {order_id} has been successfully retried in OSM."
+    }
+
 @app.post("/retry-order")
 def retry_order():
+    simulate_latency()
     order_id = request.json.get("order_id")
-    return jsonify({
-        "status": "success",
-        "message": f"Order {order_id} has been successfully retried in OSM."
-    })
+    return jsonify(retry_one(order_id))
 
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=7001)
+@app.post("/retry-order/bulk")
+def retry_order_bulk():
+    """{"items": [{"order_id": ...}, ...]} → {"results": [...]} in the same order."""
+    simulate_latency()
+    items = (request.json or {}).get("items", [])
+    return jsonify({"results": [retry_one(item.get("order_id")) for item in items]})
 
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=7001, threaded=True)
@@ -0,0 +1,68 @@
+import base64
+import json
+import threading
+from flask import Flask, request, jsonify
+
+# Local stand-in for the ServiceNow Table API + Batch API.
+# Point SERVICENOW_INSTANCE=http://localhost:7004 (any username/password).
+
+app = Flask(__name__)
+
+incidents = {}
+counters = {"table_patch": 0, "batch": 0, "batched_requests": 0}
+lock = threading.Lock()
+
+
+def apply_patch(sys_id, payload):
+    with lock:
+        record = incidents.setdefault(sys_id, {"sys_id": sys_id, "work_notes_journal": []})
+        for key, value in payload.items():
+            if key == "work_notes":
+                record["work_notes_journal"].append(value)
+            else:
+                record[key] = value
+        return dict(record)
+
+
+@app.patch("/api/now/table/incident/<sys_id>")
+def patch_incident(sys_id):
+    with lock:
+        counters["table_patch"] += 1
+    return jsonify({"result": apply_patch(sys_id, request.json or {})})
+
+
+@app.post("/api/now/v1/batch")
+def batch():
+    body = request.json or {}
+    serviced = []
+    for item in body.get("rest_requests", []):
+        sys_id = item["url"].rstrip("/").split("/")[-1]
+        payload = json.loads(base64.b64decode(item.get("body") or "e30=").decode("utf-8"))
+        result = {"result": apply_patch(sys_id, payload)}
+        serviced.append({
+            "id": item["id"],
+            "status_code": 200,
+            "status_text": "OK",
+            "headers": [{"name": "Content-Type", "value": "application/json"}],
+            "body": base64.b64encode(json.dumps(result).encode("utf-8")).decode("ascii"),
+            "execution_time": 1,
+        })
+    with lock:
+        counters["batch"] += 1
+        counters["batched_requests"] += len(serviced)
+    return jsonify({
+        "batch_request_id": body.get("batch_request_id"),
+        "serviced_requests": serviced,
+        "unserviced_requests": [],
+    })
+
+
+@app.get("/stub/stats")
+def stats():
+    with lock:
+        return jsonify({"http_requests": counters["table_patch"] + counters["batch"], **counters,
+                        "incidents": len(incidents)})
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=7004, threaded=True)
@@ -1,8 +1,196 @@
 # mcp_agents/tools.py
 
+import os
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 import requests
+from utils.http_client import get_backend
+from utils.circuit_breaker import CircuitOpenError
+from utils.tracing import current_request_id, tag_current
+
+logger = logging.getLogger(__name__)
 
 # MCP TOOL WRAPPERS (simple LangChain-callable functions)
+# Backend URLs/ports come from OSM_SERVICE_URL, CRM_SERVICE_URL, BRM_SERVICE_URL, NINJA_URL
+
+# Group concurrent OSM/CRM/BRM calls into one request to their /bulk endpoints
+MCP_BATCHING = os.getenv("MCP_BATCHING", "false").lower() == "true"
+MCP_BATCH_MAX_ITEMS = int(os.getenv("MCP_BATCH_MAX_ITEMS", "50"))
+MCP_BATCH_WINDOW_MS = float(os.getenv("MCP_BATCH_WINDOW_MS", "5"))
+MCP_BATCH_RESULT_TIMEOUT_S = float(os.getenv("MCP_BATCH_RESULT_TIMEOUT_S", "30"))
+# Bulk requests in flight per backend; the flusher thread never waits on one
+MCP_BATCH_CONCURRENCY = int(os.getenv("MCP_BATCH_CONCURRENCY", "4"))
+
+# Flusher → caller: "send this one yourself" (single item, or no /bulk endpoint)
+_SEND_DIRECTLY = object()
+
+
+def _circuit_open_result(backend: str, error: CircuitOpenError) -> dict:
+    return {"status": "error", "circuit_open": True, "backend": backend, "message": str(error)}
+
+
+def _post_json(backend: str, path: str, body: dict):
+    """POST through the backend's pooled session; network failures become an error result."""
+    try:
+        resp = get_backend(backend).request("POST", path, json=body)
+    except CircuitOpenError as e:
+        return _circuit_open_result(backend, e)
+    except requests.exceptions.RequestException as e:
+        return {"status": "error", "message": f"{backend} unreachable: {e}"}
+    try:
+        return resp.json()
+    except ValueError:
+        return {"status": "error", "message": f"{backend} returned HTTP {resp.status_code}: {resp.text[:200]}"}
+
+
+class MicroBatcher:
+    """
+    Collects single-item calls for up to MCP_BATCH_WINDOW_MS (or
+    MCP_BATCH_MAX_ITEMS items), sends one POST <path>/bulk and hands each
+    caller its own result. Single-item windows, and every call once /bulk is
+    known to be missing, are sent by the caller's own thread, so low load
+    is as concurrent as without batching. A call that times out before its
+    batch was taken is withdrawn and never sent. The bulk request runs in
+    the first caller's trace context; every caller's stage span is tagged
+    with the batch size and that caller's request ID.
+    """
+
+    def __init__(self, backend: str, path: str, max_items: int = MCP_BATCH_MAX_ITEMS,
+                 window_ms: float = MCP_BATCH_WINDOW_MS):
+        self.backend = backend
+        self.path = path
+        self.max_items = max(1, max_items)
+        self.window_s = window_ms / 1000.0
+        self.cond = threading.Condition()
+        self.pending = []            # [(body, future, caller's contextvars.Context)]
+        self.first_pending_at = None
+        self._started_pid = None
+        self._pool = None
+        self.bulk_supported = True
+        self.batches = 0
+        self.items = 0
+
+    def call(self, body: dict) -> dict:
+        if not self.bulk_supported:
+            return _post_json(self.backend, self.path, body)
+
+        future = Future()
+        with self.cond:
+            if self._started_pid != os.getpid():
+                self._started_pid = os.getpid()
+                self._pool = ThreadPoolExecutor(max_workers=max(1, MCP_BATCH_CONCURRENCY),
+                                                thread_name_prefix=f"mcp-bulk-{self.backend}")
+                threading.Thread(target=self._flush_loop, name=f"mcp-batch-{self.backend}", daemon=True).start()
+            self.pending.append((body, future, contextvars.copy_context()))
+            if self.first_pending_at is None:
+                self.first_pending_at = time.monotonic()
+            self.cond.notify()
+        try:
+            result, batch = future.result(timeout=MCP_BATCH_RESULT_TIMEOUT_S)
+        except FutureTimeout:
+            with self.cond:
+                self.pending = [item for item in self.pending if item[1] is not future]
+                if not self.pending:
+                    self.first_pending_at = None
+            if future.cancel():
+                return {"status": "error", "message": f"{self.backend} call not sent within "
+                                                      f"{MCP_BATCH_RESULT_TIMEOUT_S}s; withdrawn"}
+            return {"status": "error", "outcome_unknown": True,
+                    "message": f"{self.backend} bulk call sent but no result within {MCP_BATCH_RESULT_TIMEOUT_S}s"}
+        except Exception as e:
+            return {"status": "error", "message": f"{self.backend} batch call failed: {e}"}
+        if result is _SEND_DIRECTLY:
+            return _post_json(self.backend, self.path, body)
+        tag_current(mcp_batch_size=batch["size"], mcp_batch_request_id=batch["request_id"])
+        return result
+
+    def _take_due(self):
+        with self.cond:
+            while True:
+                if self.pending:
+                    waited = time.monotonic() - self.first_pending_at
+                    if len(self.pending) >= self.max_items or waited >= self.window_s:
+                        break
+                    self.cond.wait(self.window_s - waited)
+                else:
+                    self.cond.wait()
+            batch, self.pending = self.pending[:self.max_items], self.pending[self.max_items:]
+            self.first_pending_at = time.monotonic() if self.pending else None
+            return batch
+
+    def _flush_loop(self):
+        while True:
+            # Callers that timed out and withdrew are dropped here
+            batch = [item for item in self._take_due() if item[1].set_running_or_notify_cancel()]
+            if len(batch) == 1 or not self.bulk_supported:
+                for _, future, _ in batch:
+                    future.set_result((_SEND_DIRECTLY, None))
+            elif batch:
+                self._pool.submit(self._flush, batch)
+
+    def _flush(self, batch):
+        # The bulk HTTP span lands in the first caller's trace
+        context = batch[0][2]
+        info = {"size": len(batch), "request_id": context.run(current_request_id)}
+        try:
+            results = context.run(self._send, batch)
+        except Exception as e:
+            logger.exception("%s bulk flush failed", self.backend)
+            results = [{"status": "error", "message": f"{self.backend} bulk flush failed: {e}"}] * len(batch)
+        for (_, future, _), result in zip(batch, results):
+            future.set_result((result, info))
+
+    def _send(self, batch):
+        bodies = [body for body, _, _ in batch]
+        try:
+            resp = get_backend(self.backend).request("POST", f"{self.path}/bulk", json={"items": bodies})
+        except CircuitOpenError as e:
+            return [_circuit_open_result(self.backend, e)] * len(bodies)
+        except requests.exceptions.RequestException as e:
+            return [{"status": "error", "message": f"{self.backend} unreachable: {e}"}] * len(bodies)
+
+        if resp.status_code in (404, 405):
+            logger.warning("%s has no %s/bulk endpoint; sending single calls", self.backend, self.path)
+            self.bulk_supported = False
+            return [_SEND_DIRECTLY] * len(bodies)
+
+        try:
+            results = resp.json().get("results")
+        except (ValueError, AttributeError):
+            results = None
+        if not isinstance(results, list) or len(results) != len(bodies):
+            error = {"status": "error", "message": f"{self.backend} bulk returned HTTP {resp.status_code}: {resp.text[:200]}"}
+            return [error] * len(bodies)
+
+        self.batches += 1
+        self.items += len(bodies)
+        return results
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else None,
+                "bulk_supported": self.bulk_supported}
+
+
+_batchers = {
+    "osm": MicroBatcher("osm", "/retry-order"),
+    "crm": MicroBatcher("crm", "/sync-customer-data"),
+    "brm": MicroBatcher("brm", "/fix-asset"),
+}
+
+
+def _call_backend(backend: str, path: str, body: dict):
+    if MCP_BATCHING:
+        return _batchers[backend].call(body)
+    return _post_json(backend, path, body)
+
+
+def get_batching_stats() -> dict:
+    return {"enabled": MCP_BATCHING, **{name: b.stats() for name, b in _batchers.items()}}
+
 
 def retry_order_mcp(input_text: str):
     """
@@ -10,49 +198,37 @@ def retry_order_mcp(input_text: str):
     Example: "order_id=12345"
     """
     order_id = input_text.strip()
-    resp = requests.post(
-        "http://localhost:7001/retry-order",
-        json={"order_id": order_id}
-    )
-    return resp.json()
+    return _call_backend("osm", "/retry-order", {"order_id": order_id})
 
 def sync_customer_data_mcp(input_text: str):
     """
     Expects: customer_id inside input_text
     """
     customer_id = input_text.strip()
-    resp = requests.post(
-        "http://localhost:7002/sync-customer-data",
-        json={"customer_id": customer_id}
-    )
-    return resp.json()
+    return _call_backend("crm", "/sync-customer-data", {"customer_id": customer_id})
 
 def fix_asset_mismatch_mcp(input_text: str):
     """
     Expects: asset_id inside input_text
     """
     asset_id = input_text.strip()
-    resp = requests.post(
-        "http://localhost:7003/fix-asset",
-        json={"asset_id": asset_id}
-    )
-    return resp.json()
+    return _call_backend("brm", "/fix-asset", {"asset_id": asset_id})
 
 def create_invoice_mcp(invoice_data: dict):
     """
-    Calls Ninjainvoice API to create invoice. 
+    Calls Ninjainvoice API to create invoice.
     Can be triggered by your LangChain agent if approved.
     """
-    import requests, os
-    API_KEY = os.getenv("NINJAINVOICE_API_KEY")
-    BASE_URL = os.getenv("NINJA_URL")
-
-    headers = {"Content-Type": "application/json", 
-        "X-Requested-With": "XMLHttpRequest", "X-API-TOKEN": API_KEY}
-    response = requests.post(f"{BASE_URL}/invoices", json=invoice_data, headers=headers)
+    headers = {"Content-Type": "application/json",
+        "X-Requested-With": "XMLHttpRequest", "X-API-TOKEN": os.getenv("NINJAINVOICE_API_KEY")}
+    try:
+        response = get_backend("ninja").request("POST", "/invoices", json=invoice_data, headers=headers)
+    except CircuitOpenError as e:
+        return _circuit_open_result("ninja", e)
+    except requests.exceptions.RequestException as e:
+        return {"status": "failure", "message": f"Ninja Invoice unreachable: {e}"}
 
     if response.status_code == 200:
         return {"status": "success", "message": "Invoice created successfully", "invoice_id": response.json().get("id")}
     else:
         return {"status": "failure", "message": response.text}
-
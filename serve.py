@@ -0,0 +1,182 @@
+# serve.py
+"""
+Production launcher: gunicorn, pre-fork, model and index shared copy-on-write.
+
+    python serve.py                                 # workers sized from the CPU count
+    python serve.py --workers 4 --threads 8 --bind 0.0.0.0:5000
+    python serve.py --dry-run                       # print the sizing and exit
+
+app.py (SentenceTransformer, FAISS index, metadata, classifiers) is
+imported ONCE in the master with GC frozen, then workers are forked, so
+model weights and the index buffer stay in shared pages instead of being
+loaded N times. Each worker gets `intra_op_threads` torch / FAISS / BLAS
+threads so N workers don't each spawn a thread per core. Background
+threads (job queue, ServiceNow batch writer, MCP batchers, HTTP sessions)
+already start lazily per pid, so nothing started in the master leaks
+into the workers. Each worker writes its own TRACE_FILE / SLOW_REQUEST_LOG
+(<name>.<pid><ext>).
+
+`python app.py` remains the single-process development server.
+"""
+import os
+import gc
+import sys
+import argparse
+
+
+def available_cores() -> int:
+    """CPUs this process may run on (respects taskset / cgroup cpusets)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def llm_slots() -> int:
+    """Concurrent LLM calls one worker may have in flight (per-process limiter caps, utils/rate_limiter.py)."""
+    return (int(os.getenv("GROQ_MAX_CONCURRENCY", "8"))
+            + int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")))
+
+
+def plan(workers=None, threads=None, intra_op_threads=None) -> dict:
+    """
+    Worker sizing. Default: one worker per `intra_op_threads` cores (1 by
+    default, since a MiniLM encode is small and the request mostly waits on
+    the LLM). gthread threads are sized for that wait, not for the cores:
+    enough to fill every LLM slot of the worker's limiters and keep as many
+    requests again in retrieval / MCP / the limiter queue
+    (llm_slots() x SERVE_IO_WAIT_FACTOR). A fixed small pool caps in-flight
+    requests below what the LLM limit allows and is slower than the
+    threaded dev server.
+    """
+    cores = available_cores()
+    intra = max(1, intra_op_threads or int(os.getenv("INTRA_OP_THREADS", "1")))
+    if workers is None:
+        workers = int(os.getenv("WEB_CONCURRENCY", "0")) or max(1, cores // intra)
+        workers = min(workers, int(os.getenv("SERVE_MAX_WORKERS", "16")))
+    if threads is None:
+        threads = int(os.getenv("GUNICORN_THREADS", "0")) or \
+            llm_slots() * int(os.getenv("SERVE_IO_WAIT_FACTOR", "2"))
+    return {
+        "cores": cores,
+        "workers": max(1, workers),
+        "threads": max(1, threads),
+        "intra_op_threads": intra,
+    }
+
+
+def limit_native_threads(n: int):
+    """Must run before numpy / torch / faiss are imported; the pools size themselves on first use."""
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS"):
+        os.environ[var] = str(n)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+
+def pin_worker_threads(n: int):
+    """Per-worker torch / FAISS thread counts, called after fork."""
+    try:
+        import torch
+        torch.set_num_threads(n)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass   # only settable before the first inter-op call
+    except ImportError:
+        pass
+    try:
+        import faiss
+        faiss.omp_set_num_threads(n)
+    except ImportError:
+        pass
+
+
+def _warm_up_worker():
+    """
+    First encode in each worker initializes its own native thread pool.
+    Deliberately not done in the master: an OpenMP pool created before
+    fork() is not usable in the children.
+    """
+    from utils import vector_store
+    vector_store.model.encode(["warm-up"], normalize_embeddings=True)
+
+
+def run(settings: dict, bind: str, timeout: int):
+    from gunicorn.app.base import BaseApplication
+
+    intra = settings["intra_op_threads"]
+
+    def post_fork(server, worker):
+        gc.enable()
+        pin_worker_threads(intra)
+
+    def post_worker_init(worker):
+        # gunicorn resets signal handlers in the worker; re-arm the profiler trigger
+        from utils.profiler import install_signal_handler
+        install_signal_handler()
+        app_module = sys.modules["app"]
+        app_module.job_queue.start()   # drain jobs left queued by a previous run
+        _warm_up_worker()
+
+    class Server(BaseApplication):
+        def __init__(self):
+            self.application = None
+            super().__init__()
+
+        def load_config(self):
+            for key, value in {
+                "bind": bind,
+                "workers": settings["workers"],
+                "worker_class": "gthread",
+                "threads": settings["threads"],
+                "preload_app": True,
+                "timeout": timeout,
+                "graceful_timeout": 30,
+                "keepalive": 5,
+                "post_fork": post_fork,
+                "post_worker_init": post_worker_init,
+                "accesslog": os.getenv("GUNICORN_ACCESS_LOG") or None,
+            }.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            if self.application is None:
+                # No GC passes while the model and index are built, then move
+                # everything to the permanent generation so collections in the
+                # workers don't write to (and un-share) the inherited pages
+                gc.disable()
+                os.environ["APP_PRELOAD"] = "1"   # job queue starts in post_worker_init, not here
+                import app as app_module
+                gc.collect()
+                gc.freeze()
+                self.application = app_module.app
+            return self.application
+
+    Server().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=None, help="gthread threads per worker")
+    parser.add_argument("--intra-op-threads", type=int, default=None, help="torch / FAISS / BLAS threads per worker")
+    parser.add_argument("--bind", default=os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}"))
+    parser.add_argument("--timeout", type=int, default=int(os.getenv("GUNICORN_TIMEOUT", "120")))
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    settings = plan(args.workers, args.threads, args.intra_op_threads)
+    print(f"serve: {settings['workers']} workers x {settings['threads']} threads, "
+          f"{settings['intra_op_threads']} intra-op thread(s) each, {settings['cores']} cores, bind {args.bind}")
+    if args.dry_run:
+        return
+
+    limit_native_threads(settings["intra_op_threads"])
+    # LLM rate limits are split across workers (utils/rate_limiter.py)
+    os.environ["WEB_CONCURRENCY"] = str(settings["workers"])
+    # Workers must not share (and concurrently roll over) one trace file (utils/tracing.py)
+    os.environ.setdefault("TRACE_FILE_PER_PROCESS", "true")
+    run(settings, args.bind, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# utils/action_classifier.py
+import os
+import pickle
+import logging
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Trained offline by data_prep/train_action_classifier.py
+ACTION_CLASSIFIER_FILE = os.getenv("ACTION_CLASSIFIER_FILE", "data_prep/action_classifier.pkl")
+# Calibrated probability the local model needs before we skip the decision LLM
+ACTION_CLASSIFIER_THRESHOLD = float(os.getenv("ACTION_CLASSIFIER_THRESHOLD", "0.9"))
+# Stricter bar before a local prediction may approve automation. Only models
+# trained on real decision labels (label_source == "labeled") skip the LLM at all
+ACTION_CLASSIFIER_APPROVE_THRESHOLD = float(os.getenv("ACTION_CLASSIFIER_APPROVE_THRESHOLD", "0.97"))
+NO_ACTION = "none"
+
+_model = None
+_model_loaded = False
+_stats = {"local": 0, "llm": 0}
+_lock = threading.Lock()
+
+
+def _load_model():
+    """Loads the linear model once; returns None when no artifact exists."""
+    global _model, _model_loaded
+    if not _model_loaded:
+        with _lock:
+            if not _model_loaded:
+                if os.path.exists(ACTION_CLASSIFIER_FILE):
+                    with open(ACTION_CLASSIFIER_FILE, "rb") as f:
+                        _model = pickle.load(f)
+                    logger.info("📌 Loaded action classifier (%s)", ", ".join(_model["classes"]))
+                _model_loaded = True
+    return _model
+
+
+def predict_action(query_vec):
+    """
+    Temperature-scaled softmax over a logistic-regression head on the
+    MiniLM query embedding. Returns (action, probability) or None.
+    """
+    clf = _load_model()
+    if clf is None:
+        return None
+
+    logits = (clf["coef"] @ np.asarray(query_vec, dtype=np.float32).reshape(-1) + clf["intercept"]) / clf["temperature"]
+    logits -= logits.max()
+    probs = np.exp(logits)
+    probs /= probs.sum()
+    best = int(probs.argmax())
+    return clf["classes"][best], float(probs[best])
+
+
+def confident_prediction(query_vec):
+    """
+    Returns (action, probability) only when the LLM may be skipped, which
+    needs a model trained on labeled decisions:
+    - "none" above ACTION_CLASSIFIER_THRESHOLD;
+    - any other action above ACTION_CLASSIFIER_APPROVE_THRESHOLD.
+    Weak CI-derived labels say which backend a ticket concerns, not what
+    should be done: every ticket outside the OSM/CRM CIs (invoices and
+    billing included) is labeled "none", so such a model can neither
+    authorise an action nor rule one out.
+    """
+    prediction = predict_action(query_vec)
+    if not prediction or _model.get("label_source") != "labeled":
+        return None
+    action, probability = prediction
+    if action == NO_ACTION:
+        return prediction if probability >= ACTION_CLASSIFIER_THRESHOLD else None
+    return prediction if probability >= ACTION_CLASSIFIER_APPROVE_THRESHOLD else None
+
+
+def record_decision_source(source: str):
+    """source is 'local' (LLM skipped) or 'llm'."""
+    with _lock:
+        _stats[source] = _stats.get(source, 0) + 1
+
+
+def get_stats() -> dict:
+    with _lock:
+        local, llm = _stats["local"], _stats["llm"]
+    total = local + llm
+    clf = _load_model()
+    return {
+        "classifier_loaded": clf is not None,
+        "label_source": clf.get("label_source", "weak_ci") if clf else None,
+        "local_decisions": local,
+        "llm_decisions": llm,
+        "llm_skip_rate": round(local / total, 4) if total else 0.0,
+    }
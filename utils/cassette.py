@@ -0,0 +1,234 @@
+# utils/cassette.py
+"""
+Record/replay transport for every outbound call (LLM providers, ServiceNow,
+MCP backends, Ninja Invoice).
+
+CASSETTE_MODE=off     normal network calls (default)
+CASSETTE_MODE=record  real calls, responses + latencies appended to the cassette
+CASSETTE_MODE=replay  no network; responses served from the cassette
+
+CASSETTE_LATENCY=original | zero | <float scale factor, e.g. 0.5>
+CASSETTE_MATCH=exact (method+url+body / prompt) | endpoint (method+url / provider only)
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import defaultdict
+import requests
+from requests.structures import CaseInsensitiveDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()
+CASSETTE_DIR = os.getenv("CASSETTE_DIR", "cassettes")
+CASSETTE_NAME = os.getenv("CASSETTE_NAME", "default")
+CASSETTE_LATENCY = os.getenv("CASSETTE_LATENCY", "original").lower()
+CASSETTE_MATCH = os.getenv("CASSETTE_MATCH", "exact").lower()
+
+# Never written to cassette files
+_REDACTED_HEADERS = {"authorization", "x-api-token", "cookie"}
+
+
+class CassetteMiss(RuntimeError):
+    """Replay mode found no recorded interaction for a request."""
+
+
+def _digest(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()[:24]
+
+
+def _latency_scale() -> float:
+    if CASSETTE_LATENCY == "original":
+        return 1.0
+    if CASSETTE_LATENCY == "zero":
+        return 0.0
+    return float(CASSETTE_LATENCY)
+
+
+class Cassette:
+    """One JSON-lines file of recorded interactions, replayed round-robin per key."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = defaultdict(list)
+        self.cursor = defaultdict(int)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]].append(entry)
+                        self.entries[entry["endpoint_key"]].append(entry)
+
+    def append(self, entry: dict):
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+            self.entries[entry["key"]].append(entry)
+            self.entries[entry["endpoint_key"]].append(entry)
+
+    def next(self, key: str, endpoint_key: str) -> dict:
+        lookup = endpoint_key if CASSETTE_MATCH == "endpoint" else key
+        with self.lock:
+            recorded = self.entries.get(lookup)
+            if not recorded:
+                raise CassetteMiss(f"No recorded interaction for {lookup} in {self.path}")
+            entry = recorded[self.cursor[lookup] % len(recorded)]
+            self.cursor[lookup] += 1
+        return entry
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Cassette:
+    global _cassette
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(os.path.join(CASSETTE_DIR, f"{CASSETTE_NAME}.jsonl"))
+        return _cassette
+
+
+def _sleep_recorded(latency_s: float):
+    delay = latency_s * _latency_scale()
+    if delay > 0:
+        time.sleep(delay)
+
+
+# ============================================================
+# 1️⃣ HTTP (requests-compatible)
+# ============================================================
+
+def _build_response(recorded: dict, url: str) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = recorded["status_code"]
+    resp.headers = CaseInsensitiveDict(recorded.get("headers") or {})
+    resp._content = recorded.get("body", "").encode("utf-8")
+    resp.encoding = "utf-8"
+    resp.url = url
+    return resp
+
+
+def http_request(method: str, url: str, session=None, **kwargs) -> requests.Response:
+    """
+    Drop-in for requests.request / session.request that records or replays.
+    Connection errors are recorded too and re-raised on replay.
+    """
+    method = method.upper()
+    body = kwargs.get("json", kwargs.get("data"))
+    key = _digest("http", method, url, json.dumps(body, sort_keys=True, default=str))
+    endpoint_key = _digest("http", method, url.split("?")[0])
+    sender = session.request if session is not None else requests.request
+
+    if CASSETTE_MODE == "replay":
+        entry = get_cassette().next(key, endpoint_key)
+        _sleep_recorded(entry["latency_s"])
+        if "error" in entry:
+            error_cls = getattr(requests.exceptions, entry["error"]["type"], requests.exceptions.RequestException)
+            raise error_cls(entry["error"]["message"])
+        return _build_response(entry["response"], url)
+
+    if CASSETTE_MODE != "record":
+        return sender(method, url, **kwargs)
+
+    entry = {
+        "kind": "http", "key": key, "endpoint_key": endpoint_key,
+        "request": {
+            "method": method, "url": url, "body": body,
+            "headers": {k: v for k, v in (kwargs.get("headers") or {}).items() if k.lower() not in _REDACTED_HEADERS},
+        },
+        "recorded_at": time.time(),
+    }
+    start = time.perf_counter()
+    try:
+        resp = sender(method, url, **kwargs)
+    except requests.exceptions.RequestException as e:
+        entry["latency_s"] = time.perf_counter() - start
+        entry["error"] = {"type": type(e).__name__, "message": str(e)}
+        get_cassette().append(entry)
+        raise
+    entry["latency_s"] = time.perf_counter() - start
+    entry["response"] = {
+        "status_code": resp.status_code,
+        "headers": {k: v for k, v in resp.headers.items() if k.lower() not in _REDACTED_HEADERS},
+        "body": resp.text,
+    }
+    get_cassette().append(entry)
+    return resp
+
+
+# ============================================================
+# 2️⃣ LLM providers
+# ============================================================
+
+def llm_call(provider: str, model: str, prompt: str, fn) -> str:
+    """Records or replays one completion; fn() performs the real call."""
+    key = _digest("llm", provider, model, prompt)
+    endpoint_key = _digest("llm", provider, model)
+
+    if CASSETTE_MODE == "replay":
+        entry = get_cassette().next(key, endpoint_key)
+        _sleep_recorded(entry["latency_s"])
+        return entry["text"]
+
+    if CASSETTE_MODE != "record":
+        return fn()
+
+    start = time.perf_counter()
+    text = fn()
+    get_cassette().append({
+        "kind": "llm", "key": key, "endpoint_key": endpoint_key,
+        "provider": provider, "model": model, "prompt_chars": len(prompt),
+        "latency_s": time.perf_counter() - start, "text": text,
+        "recorded_at": time.time(),
+    })
+    return text
+
+
+def llm_stream(provider: str, model: str, prompt: str, gen_fn):
+    """
+    Streaming counterpart of llm_call: chunks are recorded with their
+    offsets so replay reproduces time-to-first-token as well as total time.
+    """
+    key = _digest("llm", provider, model, prompt)
+    endpoint_key = _digest("llm", provider, model)
+
+    if CASSETTE_MODE == "replay":
+        entry = get_cassette().next(key, endpoint_key)
+        chunks = entry.get("chunks") or [[entry["latency_s"], entry["text"]]]
+        elapsed = 0.0
+        for offset, text in chunks:
+            _sleep_recorded(max(0.0, offset - elapsed))
+            elapsed = offset
+            yield text
+        return
+
+    if CASSETTE_MODE != "record":
+        yield from gen_fn()
+        return
+
+    start = time.perf_counter()
+    chunks = []
+    try:
+        for text in gen_fn():
+            chunks.append([time.perf_counter() - start, text])
+            yield text
+    finally:
+        # Also record streams the caller closed early (e.g. JSON complete)
+        get_cassette().append({
+            "kind": "llm", "key": key, "endpoint_key": endpoint_key,
+            "provider": provider, "model": model, "prompt_chars": len(prompt),
+            "latency_s": time.perf_counter() - start,
+            "text": "".join(t for _, t in chunks), "chunks": chunks,
+            "recorded_at": time.time(),
+        })
@@ -0,0 +1,224 @@
+# utils/circuit_breaker.py
+"""
+Per-dependency circuit breakers (MCP backends, ServiceNow, LLM providers).
+
+closed     calls flow; a rolling window of outcomes is kept
+open       calls fail fast with CircuitOpenError for BREAKER_OPEN_S
+half_open  up to BREAKER_HALF_OPEN_CALLS probe calls; all succeed → closed,
+           any failure → open again
+
+A breaker opens when, over at least BREAKER_MIN_CALLS calls in the window,
+the error rate reaches BREAKER_ERROR_RATE or the share of calls slower than
+BREAKER_SLOW_CALL_S reaches BREAKER_SLOW_RATE. Calls that fail with NotAttempted (e.g. the local
+rate limiter's queue deadline) never reached the dependency and are not
+counted either way.
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "50"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_CALL_S = float(os.getenv("BREAKER_SLOW_CALL_S", "5"))
+BREAKER_SLOW_RATE = float(os.getenv("BREAKER_SLOW_RATE", "0.8"))
+BREAKER_OPEN_S = float(os.getenv("BREAKER_OPEN_S", "30"))
+BREAKER_HALF_OPEN_CALLS = int(os.getenv("BREAKER_HALF_OPEN_CALLS", "2"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+    def __init__(self, name: str, retry_in_s: float):
+        super().__init__(f"circuit open for {name} (retry in {retry_in_s:.0f}s)")
+        self.name = name
+        self.retry_in_s = retry_in_s
+
+
+class NotAttempted(Exception):
+    """
+    The guarded call gave up before reaching the dependency (local queue
+    deadline, client-side limit). Frees the breaker slot without recording
+    an outcome, so local back-pressure cannot open the breaker.
+    """
+
+
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=BREAKER_WINDOW)   # (ok, slow)
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        self.rejected = 0
+        self.transitions = deque(maxlen=20)
+        self.transition_counts = {}
+
+    def _transition(self, new_state: str, reason: str):
+        old_state, self.state = self.state, new_state
+        key = f"{old_state}->{new_state}"
+        self.transition_counts[key] = self.transition_counts.get(key, 0) + 1
+        self.transitions.append({"at": time.time(), "from": old_state, "to": new_state, "reason": reason})
+        if new_state == OPEN:
+            self.opened_at = time.monotonic()
+            logger.warning("circuit %s opened: %s", self.name, reason)
+        else:
+            logger.info("circuit %s %s -> %s: %s", self.name, old_state, new_state, reason)
+        if new_state != HALF_OPEN:
+            self.probes_in_flight = 0
+            self.probe_successes = 0
+        if new_state == CLOSED:
+            self.outcomes.clear()
+
+    def _retry_in(self) -> float:
+        return max(0.0, BREAKER_OPEN_S - (time.monotonic() - self.opened_at))
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected (cool-down not over); does not take a probe slot."""
+        with self.lock:
+            return self.state == OPEN and self._retry_in() > 0
+
+    def before_call(self):
+        """Raises CircuitOpenError, or admits the call (as a probe when half-open)."""
+        with self.lock:
+            if self.state == OPEN:
+                if self._retry_in() > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, self._retry_in())
+                self._transition(HALF_OPEN, f"cool-down of {BREAKER_OPEN_S:.0f}s elapsed")
+            if self.state == HALF_OPEN:
+                if self.probes_in_flight >= BREAKER_HALF_OPEN_CALLS:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, 0.0)
+                self.probes_in_flight += 1
+
+    def record(self, latency_s: float, ok: bool):
+        slow = latency_s >= BREAKER_SLOW_CALL_S
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+                if not ok or slow:
+                    self._transition(OPEN, "probe call failed" if not ok else f"probe call took {latency_s:.1f}s")
+                    return
+                self.probe_successes += 1
+                if self.probe_successes >= BREAKER_HALF_OPEN_CALLS:
+                    self._transition(CLOSED, f"{self.probe_successes} probe calls succeeded")
+                return
+
+            self.outcomes.append((ok, slow))
+            if self.state != CLOSED or len(self.outcomes) < BREAKER_MIN_CALLS:
+                return
+            calls = len(self.outcomes)
+            error_rate = sum(1 for o, _ in self.outcomes if not o) / calls
+            slow_rate = sum(1 for _, s in self.outcomes if s) / calls
+            if error_rate >= BREAKER_ERROR_RATE:
+                self._transition(OPEN, f"error rate {error_rate:.0%} over last {calls} calls")
+            elif slow_rate >= BREAKER_SLOW_RATE:
+                self._transition(OPEN, f"{slow_rate:.0%} of last {calls} calls slower than {BREAKER_SLOW_CALL_S:.1f}s")
+
+    def release(self):
+        """Admitted call that never reached the dependency: frees its probe slot, records nothing."""
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def call(self, fn, is_ok=lambda result: True):
+        """Runs fn() under the breaker; exceptions count as failures (except NotAttempted) and propagate."""
+        self.before_call()
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except NotAttempted:
+            self.release()
+            raise
+        except Exception:
+            self.record(time.perf_counter() - start, False)
+            raise
+        self.record(time.perf_counter() - start, is_ok(result))
+        return result
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            calls = len(self.outcomes)
+            return {
+                "state": OPEN if self.state == OPEN and self._retry_in() > 0 else self.state,
+                "retry_in_s": round(self._retry_in(), 1) if self.state == OPEN else 0.0,
+                "window_calls": calls,
+                "error_rate": round(sum(1 for o, _ in self.outcomes if not o) / calls, 4) if calls else 0.0,
+                "slow_rate": round(sum(1 for _, s in self.outcomes if s) / calls, 4) if calls else 0.0,
+                "rejected": self.rejected,
+                "transition_counts": dict(self.transition_counts),
+                "recent_transitions": list(self.transitions),
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def get_breaker_stats() -> dict:
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.snapshot() for name, breaker in sorted(breakers.items())}
+
+
+# ============================================================
+# LLM wrappers report failures as "<Provider> Error: ..." text
+# ============================================================
+
+def guarded_llm_call(name: str, error_prefix: str, fn) -> str:
+    """fn() -> text; an open breaker returns error text immediately."""
+    try:
+        return get_breaker(name).call(fn, is_ok=lambda text: not str(text).startswith(error_prefix))
+    except (CircuitOpenError, NotAttempted) as e:
+        return f"{error_prefix} {e}"
+
+
+def guarded_llm_stream(name: str, error_prefix: str, gen_fn):
+    """Streaming counterpart; latency is time to first chunk."""
+    breaker = get_breaker(name)
+    try:
+        breaker.before_call()
+    except CircuitOpenError as e:
+        yield f"{error_prefix} {e}"
+        return
+
+    start = time.perf_counter()
+    first_chunk_s, ok, attempted = None, True, True
+    try:
+        for text in gen_fn():
+            if first_chunk_s is None:
+                first_chunk_s = time.perf_counter() - start
+            if isinstance(text, str) and text.startswith(error_prefix):
+                ok = False
+            yield text
+    except NotAttempted as e:
+        attempted = False
+        yield f"{error_prefix} {e}"
+    except Exception:
+        ok = False
+        raise
+    finally:
+        if not attempted:
+            breaker.release()
+        else:
+            # A stream closed early by the caller (JSON complete) still counts as ok
+            breaker.record(first_chunk_s if first_chunk_s is not None else time.perf_counter() - start, ok)
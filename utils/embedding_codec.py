@@ -0,0 +1,88 @@
+# utils/embedding_codec.py
+"""
+Storage codec for the vectors in embeddings_data.pkl.
+
+generate_embeddings.py can store the corpus vectors as float32 (default),
+float16, or int8 (per-dimension min/max scalar quantization). It can also
+first project them onto the top `pca_dim` principal directions. The codec
+parameters are saved under data["codec"] next to the vectors.
+
+Two read paths:
+    stored_vectors(data)  float32 vectors in index space (PCA-reduced if
+                          enabled); build_faiss_index.py indexes these, and
+                          project_queries() maps a query into the same space
+    model_vectors(data)   float32, L2-normalized vectors in the model's
+                          space, for the trainers that compare against
+                          encode_query() directly (group centroids, action
+                          classifier, cluster playbooks)
+
+The PCA is uncentered, so inner products (= cosine for unit vectors) are
+preserved as well as the kept directions allow.
+"""
+import numpy as np
+
+DTYPES = ("float32", "float16", "int8")
+PCA_FIT_SAMPLE = 100_000
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+def fit_pca(embeddings, dim: int, seed: int = 0):
+    """(dim, model_dim) float32 projection onto the top principal directions."""
+    if not 0 < dim < embeddings.shape[1]:
+        raise ValueError(f"pca_dim must be between 1 and {embeddings.shape[1] - 1}, got {dim}")
+    sample = embeddings
+    if len(embeddings) > PCA_FIT_SAMPLE:
+        rows = np.random.default_rng(seed).choice(len(embeddings), PCA_FIT_SAMPLE, replace=False)
+        sample = embeddings[rows]
+    _, _, vt = np.linalg.svd(np.asarray(sample, dtype=np.float32), full_matrices=False)
+    return np.ascontiguousarray(vt[:dim], dtype=np.float32)
+
+
+def compress(embeddings, dtype: str = "float32", pca_dim: int = 0):
+    """Returns (stored_array, codec) for embeddings_data.pkl."""
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype must be one of {DTYPES}, got {dtype}")
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    codec = {"dtype": dtype, "model_dim": int(vectors.shape[1]), "pca_components": None}
+    if pca_dim:
+        codec["pca_components"] = fit_pca(vectors, pca_dim)
+        vectors = vectors @ codec["pca_components"].T
+
+    if dtype == "float16":
+        return vectors.astype(np.float16), codec
+    if dtype == "int8":
+        vmin = vectors.min(axis=0)
+        scale = np.maximum(vectors.max(axis=0) - vmin, 1e-12) / 255.0
+        codes = np.clip(np.rint((vectors - vmin) / scale) - 128, -128, 127).astype(np.int8)
+        codec.update(int8_min=vmin.astype(np.float32), int8_scale=scale.astype(np.float32))
+        return codes, codec
+    return vectors.astype(np.float32), codec
+
+
+def stored_vectors(data: dict):
+    """float32 vectors in index space. Artifacts without a codec are plain float32."""
+    codec = data.get("codec")
+    vectors = data["embeddings"]
+    if codec and codec["dtype"] == "int8":
+        return ((vectors.astype(np.float32) + 128.0) * codec["int8_scale"] + codec["int8_min"]).astype(np.float32)
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def model_vectors(data: dict):
+    """float32, normalized vectors in the embedding model's space (PCA undone approximately)."""
+    vectors = stored_vectors(data)
+    codec = data.get("codec")
+    if codec and codec.get("pca_components") is not None:
+        vectors = vectors @ codec["pca_components"]
+    return _normalize(vectors)
+
+
+def project_queries(query_vecs, codec):
+    """Normalized (n, model_dim) query embeddings -> index space. Identity without PCA."""
+    if not codec or codec.get("pca_components") is None:
+        return query_vecs
+    return _normalize(query_vecs @ codec["pca_components"].T)
@@ -2,6 +2,13 @@ from langchain.llms.base import LLM
 import google.generativeai as genai
 from dotenv import load_dotenv
 import os
+import time
+from utils.prompt_builder import count_tokens
+from utils.rate_limiter import run_rate_limited
+from utils.cassette import llm_call
+from utils.circuit_breaker import NotAttempted, guarded_llm_call
+from utils.metrics import record_llm_call, record_llm_tokens
+from utils.tracing import span
 
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -11,26 +18,53 @@ class GeminiLangChainWrapper(LLM):
     """
     LangChain-compatible wrapper for gemini-2.0-flash-lite
     """
-    model_name: str = "llama-3.1-70b-versatile"
+    model_name: str = "gemini-2.0-flash-lite"
     temperature: float = 0.0
+    max_tokens: int = 1024
 
     @property
     def _llm_type(self) -> str:
         return "gemini"
 
-    def _call(self, prompt: str, stop=None) -> str:
+    def _call(self, prompt: str, stop=None, **kwargs) -> str:
         """
         Generate content using Gemini API
         """
-        try:
+        max_tokens = kwargs.get("max_tokens") or self.max_tokens
+
+        def request():
             model = genai.GenerativeModel(self.model_name)
             response = model.generate_content(
                 prompt,
                 generation_config={
-                    "temperature": self.temperature
+                    "temperature": self.temperature,
+                    "max_output_tokens": max_tokens,
+                    "stop_sequences": stop or []
                 }
             )
-            return response.text
-        except Exception as e:
-            return f"Gemini Error: {str(e)}"
+            usage = getattr(response, "usage_metadata", None)
+            if usage is not None:
+                record_llm_tokens("gemini", usage.prompt_token_count, usage.candidates_token_count)
+            return response.text, (usage.total_token_count if usage else None)
+
+        def limited():
+            try:
+                # Shared limiter: waits for quota instead of surfacing 429s
+                return run_rate_limited("gemini", count_tokens(prompt) + min(max_tokens, 256), request)
+            except NotAttempted:
+                raise   # guarded_llm_call turns it into error text without blaming Gemini
+            except Exception as e:
+                return f"Gemini Error: {str(e)}"
 
+        start = time.perf_counter()
+        with span("llm:gemini", kind="CLIENT", model=self.model_name, prompt_chars=len(prompt),
+                  prompt_tokens_est=count_tokens(prompt), max_tokens=max_tokens) as s:
+            text = guarded_llm_call(
+                "llm:gemini", "Gemini Error:",
+                lambda: llm_call("gemini", self.model_name, prompt, limited),
+            )
+            ok = not text.startswith("Gemini Error:")
+            if s is not None:
+                s.tag(completion_chars=len(text), error=None if ok else text[:200])
+        record_llm_call("gemini", time.perf_counter() - start, ok)
+        return text
@@ -0,0 +1,193 @@
+# utils/http_client.py
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from utils.cassette import http_request
+from utils.circuit_breaker import get_breaker
+from utils.metrics import record_backend_call
+from utils.tracing import span, outbound_headers
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HTTP_CONNECT_TIMEOUT_S = float(os.getenv("HTTP_CONNECT_TIMEOUT_S", "2"))
+HTTP_READ_TIMEOUT_S = float(os.getenv("HTTP_READ_TIMEOUT_S", "10"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_BACKOFF_BASE_S = float(os.getenv("HTTP_BACKOFF_BASE_S", "0.2"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+
+# Retried only when the backend marks the operation idempotent
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() == "true"
+
+
+# name -> base URL + whether repeating a request is safe. The MCP backends are
+# only called with actions (retry-order, sync, fix-asset) that must not run twice
+# after a read timeout; read / status calls opt in per request (idempotent=True)
+BACKENDS = {
+    "osm": {"base_url": os.getenv("OSM_SERVICE_URL", "http://localhost:7001"),
+            "idempotent": _env_bool("OSM_IDEMPOTENT", "false")},
+    "crm": {"base_url": os.getenv("CRM_SERVICE_URL", "http://localhost:7002"),
+            "idempotent": _env_bool("CRM_IDEMPOTENT", "false")},
+    "brm": {"base_url": os.getenv("BRM_SERVICE_URL", "http://localhost:7003"),
+            "idempotent": _env_bool("BRM_IDEMPOTENT", "false")},
+    # Invoice creation must never be sent twice
+    "ninja": {"base_url": os.getenv("NINJA_URL") or "",
+              "idempotent": False},
+    # Work notes are journal appends, so a repeated PATCH duplicates the note
+    "servicenow": {"base_url": (os.getenv("SERVICENOW_INSTANCE") or "").rstrip("/"),
+                   "idempotent": _env_bool("SERVICENOW_IDEMPOTENT", "false")},
+}
+
+
+def register_backend(name: str, base_url: str, idempotent: bool):
+    """Adds a backend at runtime (per-tenant ServiceNow instances); first registration wins."""
+    with _clients_lock:
+        BACKENDS.setdefault(name, {"base_url": base_url.rstrip("/"), "idempotent": idempotent})
+
+
+class BackendStats:
+    """Request count, errors, retries and a rolling latency window."""
+
+    def __init__(self, window: int = 500):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+
+    def record(self, latency_s: float, ok: bool, retries: int):
+        with self.lock:
+            self.requests += 1
+            self.retries += retries
+            if not ok:
+                self.errors += 1
+            self.latencies.append(latency_s)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            ordered = sorted(self.latencies)
+            requests_, errors, retries = self.requests, self.errors, self.retries
+
+        def pct(p):
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 4) if ordered else None
+
+        return {"requests": requests_, "errors": errors, "retries": retries,
+                "p50_s": pct(0.50), "p95_s": pct(0.95), "p99_s": pct(0.99)}
+
+
+class BackendClient:
+    """
+    Keep-alive connection pool for one backend with connect/read timeouts
+    and bounded, jittered retries for idempotent calls.
+    """
+
+    def __init__(self, name: str, base_url: str, idempotent: bool):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.idempotent = idempotent
+        self.stats = BackendStats()
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def session(self) -> requests.Session:
+        # Sockets must not be shared across a fork; rebuild in each worker
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session, self._pid = session, os.getpid()
+            return self._session
+
+    def _should_retry(self, attempt: int, idempotent: bool, exc=None, status: int = None) -> bool:
+        if attempt >= HTTP_MAX_RETRIES:
+            return False
+        if isinstance(exc, requests.exceptions.ConnectTimeout):
+            return True  # nothing reached the backend
+        if not idempotent:
+            return False
+        if exc is not None:
+            return isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+        return status in RETRY_STATUS_CODES
+
+    def request(self, method: str, path: str, idempotent: bool = None, **kwargs) -> requests.Response:
+        """
+        Raises requests exceptions once retries are exhausted, like requests,
+        and CircuitOpenError without sending anything while the backend's breaker is open.
+        `idempotent` overrides the backend default for this call (e.g. a status GET).
+        """
+        idempotent = self.idempotent if idempotent is None else idempotent
+        url = f"{self.base_url}{path}"
+        kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT_S, HTTP_READ_TIMEOUT_S))
+        breaker = get_breaker(self.name)
+        breaker.before_call()
+        with span(f"http:{self.name}", kind="CLIENT", method=method, path=path) as s:
+            kwargs["headers"] = {**outbound_headers(), **(kwargs.get("headers") or {})}
+            start = time.perf_counter()
+            attempt = 0
+            while True:
+                try:
+                    resp = http_request(method, url, session=self.session(), **kwargs)
+                except requests.exceptions.RequestException as e:
+                    if not self._should_retry(attempt, idempotent, exc=e):
+                        elapsed = time.perf_counter() - start
+                        self.stats.record(elapsed, False, attempt)
+                        breaker.record(elapsed, False)
+                        record_backend_call(self.name, method, type(e).__name__, elapsed, attempt)
+                        if s is not None:
+                            s.tag(retries=attempt or None)
+                        raise
+                    logger.warning("%s %s %s failed (%s), retrying", self.name, method, path, type(e).__name__)
+                    if s is not None:
+                        s.annotate(f"attempt {attempt + 1} failed: {type(e).__name__}")
+                except Exception:
+                    breaker.record(time.perf_counter() - start, False)
+                    raise
+                else:
+                    if not self._should_retry(attempt, idempotent, status=resp.status_code):
+                        ok = resp.status_code < 500
+                        elapsed = time.perf_counter() - start
+                        self.stats.record(elapsed, ok, attempt)
+                        breaker.record(elapsed, ok)
+                        record_backend_call(self.name, method, resp.status_code, elapsed, attempt)
+                        if s is not None:
+                            s.tag(status=resp.status_code, retries=attempt or None)
+                        return resp
+                    logger.warning("%s %s %s -> %s, retrying", self.name, method, path, resp.status_code)
+                    if s is not None:
+                        s.annotate(f"attempt {attempt + 1} -> HTTP {resp.status_code}")
+
+                # Full-jitter exponential backoff
+                time.sleep(random.uniform(0, HTTP_BACKOFF_BASE_S * (2 ** attempt)))
+                attempt += 1
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_backend(name: str) -> BackendClient:
+    with _clients_lock:
+        if name not in _clients:
+            cfg = BACKENDS[name]
+            _clients[name] = BackendClient(name, cfg["base_url"], cfg["idempotent"])
+        return _clients[name]
+
+
+def get_backend_stats() -> dict:
+    with _clients_lock:
+        clients = dict(_clients)
+    return {name: client.stats.snapshot() for name, client in clients.items()}
@@ -0,0 +1,203 @@
+# utils/job_queue.py
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", "jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# A running job whose lease expired (worker crashed / process killed) is picked up again
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", "300"))
+JOB_POLL_INTERVAL_S = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,          -- queued | running | succeeded | failed
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class JobFailed(Exception):
+    """
+    Raised by a handler whose side effects already ran but did not all
+    succeed. The job is marked failed with `result` kept; it is not retried,
+    since a retry would repeat the parts that did go through.
+    """
+
+    def __init__(self, message: str, result=None):
+        super().__init__(message)
+        self.result = result
+
+
+class JobQueue:
+    """
+    Durable local job queue (SQLite, WAL) drained by a bounded pool of
+    worker threads. Jobs survive restarts; expired leases are re-claimed.
+    """
+
+    def __init__(self, db_path: str = JOB_QUEUE_DB, workers: int = JOB_WORKERS):
+        self.db_path = db_path
+        self.workers = max(1, workers)
+        self.handlers = {}
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._started_pid = None
+        self._lock = threading.Lock()
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread (and per process after fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def register_handler(self, kind: str, fn):
+        """
+        fn(payload: dict) -> JSON-serializable result; exceptions mark the
+        attempt failed (retried), JobFailed marks the job failed for good.
+        """
+        self.handlers[kind] = fn
+
+    def start(self):
+        """Starts the worker threads once per process (safe to call repeatedly)."""
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            for i in range(self.workers):
+                threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True).start()
+
+    def checkpoint(self, payload: dict):
+        """
+        From inside a handler: replaces the running job's stored payload, so
+        a retry resumes from it instead of repeating side effects that
+        already happened.
+        """
+        job_id = getattr(self._local, "job_id", None)
+        if job_id is None:
+            raise RuntimeError("checkpoint() called outside a job handler")
+        self._conn().execute(
+            "UPDATE jobs SET payload = ?, updated_at = ? WHERE id = ?",
+            (json.dumps(payload, default=str), time.time(), job_id),
+        )
+
+    def enqueue(self, kind: str, payload: dict) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, status, payload, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+            (job_id, kind, json.dumps(payload, default=str), now, now),
+        )
+        self.start()
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id: str):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _claim(self):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, kind, payload, attempts FROM jobs "
+                "WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated_at = ? WHERE id = ?",
+                (now + JOB_LEASE_S, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+            return row["id"], row["kind"], json.loads(row["payload"]), row["attempts"] + 1
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _finish(self, job_id: str, status: str, result=None, error: str = None):
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, lease_until = NULL, updated_at = ? WHERE id = ?",
+            (status, json.dumps(result, default=str) if result is not None else None, error, time.time(), job_id),
+        )
+
+    def _worker(self):
+        while True:
+            try:
+                claimed = self._claim()
+            except sqlite3.OperationalError as e:
+                logger.warning("job queue claim failed: %s", e)
+                claimed = None
+            if claimed is None:
+                self._wake.wait(JOB_POLL_INTERVAL_S)
+                self._wake.clear()
+                continue
+
+            job_id, kind, payload, attempts = claimed
+            handler = self.handlers.get(kind)
+            self._local.job_id = job_id
+            try:
+                if handler is None:
+                    raise RuntimeError(f"No handler registered for job kind '{kind}'")
+                self._finish(job_id, "succeeded", result=handler(payload))
+            except JobFailed as e:
+                logger.warning("job %s (%s) failed: %s", job_id, kind, e)
+                self._finish(job_id, "failed", result=e.result, error=str(e))
+            except Exception as e:
+                retry = handler is not None and attempts < JOB_MAX_ATTEMPTS
+                logger.warning("job %s (%s) attempt %d failed: %s", job_id, kind, attempts, e)
+                self._finish(job_id, "queued" if retry else "failed", error=str(e))
+            finally:
+                self._local.job_id = None
+
+    def stats(self) -> dict:
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
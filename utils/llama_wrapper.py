@@ -1,36 +1,164 @@
 from langchain.llms.base import LLM
+from langchain.schema.output import GenerationChunk
 from groq import Groq
 import os
+import time
+import logging
 from dotenv import load_dotenv
+from utils.prompt_builder import count_tokens
+from utils.cassette import llm_call, llm_stream
+from utils.circuit_breaker import NotAttempted, guarded_llm_call, guarded_llm_stream
+from utils.metrics import record_llm_call, record_llm_tokens
+from utils.tracing import span, start_span
+from utils.rate_limiter import (
+    LLM_QUEUE_DEADLINE_S,
+    get_limiter,
+    is_rate_limit_error,
+    retry_after_seconds,
+    run_rate_limited,
+)
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Point at a local OpenAI-compatible stand-in (benchmarks/fake_groq.py) for load tests
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+
 class LlamaLangChainWrapper(LLM):
     """
     LangChain-compatible wrapper for Groq LLaMA
     """
     model_name: str = "llama-3.1-8b-instant"  # or llama-3.1-70b-versatile
+    max_tokens: int = 1024
     
     @property
     def _llm_type(self) -> str:
         return "llama"
     
-    def _call(self, prompt: str, stop=None) -> str:
+    def _estimate_tokens(self, prompt: str, max_tokens: int) -> int:
+        # Completion length is unknown up front; settled against usage afterwards
+        return count_tokens(prompt) + min(max_tokens, 256)
+
+    def _call(self, prompt: str, stop=None, **kwargs) -> str:
         """
         Generate content using Groq LLaMA API
+        max_tokens may be passed per call to override the default.
         """
-        client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        
-        try:
+        max_tokens = kwargs.get("max_tokens") or self.max_tokens
+        start = time.perf_counter()
+        with span("llm:groq", kind="CLIENT", model=self.model_name, prompt_chars=len(prompt),
+                  prompt_tokens_est=count_tokens(prompt), max_tokens=max_tokens) as s:
+            text = guarded_llm_call(
+                "llm:groq", "LLaMA Error:",
+                lambda: llm_call("groq", self.model_name, prompt, lambda: self._groq_call(prompt, stop, max_tokens)),
+            )
+            ok = not text.startswith("LLaMA Error:")
+            if s is not None:
+                s.tag(completion_chars=len(text), error=None if ok else text[:200])
+        record_llm_call("groq", time.perf_counter() - start, ok)
+        return text
+
+    def _groq_call(self, prompt: str, stop, max_tokens: int) -> str:
+        client = Groq(api_key=os.getenv("GROQ_API_KEY"), base_url=GROQ_BASE_URL)
+
+        def request():
             response = client.chat.completions.create(
                 model=self.model_name,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.0,
-                max_tokens=1024
+                max_tokens=max_tokens,
+                stop=stop
             )
-            
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                logger.debug("llama call: prompt_tokens=%s completion_tokens=%s",
+                             usage.prompt_tokens, usage.completion_tokens)
+                record_llm_tokens("groq", usage.prompt_tokens, usage.completion_tokens)
+
             # ✅ FIX: Access content as attribute, not dictionary
-            return response.choices[0].message.content
-            
+            return response.choices[0].message.content, (usage.total_tokens if usage else None)
+
+        try:
+            # Shared limiter: waits for quota instead of surfacing 429s
+            return run_rate_limited("groq", self._estimate_tokens(prompt, max_tokens), request)
+        except NotAttempted:
+            raise   # guarded_llm_call turns it into error text without blaming Groq
         except Exception as e:
             return f"LLaMA Error: {str(e)}"
+
+    def _stream(self, prompt: str, stop=None, run_manager=None, **kwargs):
+        """
+        Stream content from Groq LLaMA token by token.
+        Used by LLM.stream(); errors are yielded as text like _call.
+        Closing the generator early closes the HTTP stream, which stops generation.
+        """
+        max_tokens = kwargs.get("max_tokens") or self.max_tokens
+        stream = guarded_llm_stream(
+            "llm:groq", "LLaMA Error:",
+            lambda: llm_stream("groq", self.model_name, prompt, lambda: self._groq_stream(prompt, stop, max_tokens)),
+        )
+        start, ok, chars = time.perf_counter(), True, 0
+        s = start_span("llm:groq", kind="CLIENT", model=self.model_name, mode="stream", prompt_chars=len(prompt),
+                       prompt_tokens_est=count_tokens(prompt), max_tokens=max_tokens)
+        try:
+            for text in stream:
+                ok = ok and not text.startswith("LLaMA Error:")
+                chars += len(text)
+                if run_manager:
+                    run_manager.on_llm_new_token(text)
+                yield GenerationChunk(text=text)
+        finally:
+            record_llm_call("groq", time.perf_counter() - start, ok, mode="stream")
+            if s is not None:
+                s.tag(completion_chars=chars, error=None if ok else "stream error")
+                s.finish()
+
+    def _groq_stream(self, prompt: str, stop, max_tokens: int):
+        client = Groq(api_key=os.getenv("GROQ_API_KEY"), base_url=GROQ_BASE_URL)
+        limiter = get_limiter("groq")
+        deadline = time.monotonic() + LLM_QUEUE_DEADLINE_S
+        permit, used, stream = None, None, None
+
+        try:
+            while True:
+                permit = limiter.acquire(self._estimate_tokens(prompt, max_tokens), deadline)
+                try:
+                    stream = client.chat.completions.create(
+                        model=self.model_name,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=0.0,
+                        max_tokens=max_tokens,
+                        stop=stop,
+                        stream=True
+                    )
+                    break
+                except Exception as e:
+                    throttled = is_rate_limit_error(e)
+                    permit.release(throttled=throttled, retry_after=retry_after_seconds(e) if throttled else 0.0)
+                    permit = None
+                    if not throttled:
+                        raise
+
+            for chunk in stream:
+                # Groq reports usage on the final chunk under x_groq
+                usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+                if usage is not None:
+                    used = usage.total_tokens
+                    logger.debug("llama stream: prompt_tokens=%s completion_tokens=%s",
+                                 usage.prompt_tokens, usage.completion_tokens)
+                    record_llm_tokens("groq", usage.prompt_tokens, usage.completion_tokens)
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    yield text
+
+        except NotAttempted:
+            raise
+        except Exception as e:
+            yield f"LLaMA Error: {str(e)}"
+
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
+            if permit:
+                permit.release(actual_tokens=used)
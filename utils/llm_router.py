@@ -0,0 +1,276 @@
+# utils/llm_router.py
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from langchain.llms.base import LLM
+from langchain.schema.output import GenerationChunk
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Rolling window of calls kept per provider
+ROUTER_WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", "100"))
+# Provider is skipped while its rolling error rate is above this
+ROUTER_MAX_ERROR_RATE = float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5"))
+# Fire the hedged duplicate after this percentile of the primary's latency
+ROUTER_HEDGE_PERCENTILE = float(os.getenv("LLM_ROUTER_HEDGE_PERCENTILE", "95"))
+# Hedge delay used until a provider has enough samples
+ROUTER_DEFAULT_HEDGE_DELAY_S = float(os.getenv("LLM_ROUTER_DEFAULT_HEDGE_DELAY_S", "2.0"))
+ROUTER_MIN_SAMPLES = 5
+ROUTER_MAX_WORKERS = int(os.getenv("LLM_ROUTER_MAX_WORKERS", "16"))
+
+# The provider wrappers report failures as text instead of raising
+ERROR_PREFIXES = ("LLaMA Error:", "Gemini Error:", "Stub Error:")
+
+
+def is_error_text(text) -> bool:
+    return isinstance(text, str) and text.startswith(ERROR_PREFIXES)
+
+
+class ProviderStats:
+    """Rolling latency / error window for one provider."""
+
+    def __init__(self, window: int = ROUTER_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, latency_s: float, ok: bool):
+        with self.lock:
+            if ok:
+                self.latencies.append(latency_s)
+            self.outcomes.append(ok)
+
+    def error_rate(self) -> float:
+        with self.lock:
+            if len(self.outcomes) < ROUTER_MIN_SAMPLES:
+                return 0.0
+            return 1.0 - sum(self.outcomes) / len(self.outcomes)
+
+    def percentile(self, pct: float):
+        with self.lock:
+            if len(self.latencies) < ROUTER_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+    def snapshot(self) -> dict:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "calls": len(self.outcomes),
+            "error_rate": round(self.error_rate(), 4),
+            "p50_s": round(p50, 4) if p50 is not None else None,
+            "p95_s": round(p95, 4) if p95 is not None else None,
+        }
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+_executor = None
+
+
+def provider_stats(name: str) -> ProviderStats:
+    with _stats_lock:
+        if name not in _stats:
+            _stats[name] = ProviderStats()
+        return _stats[name]
+
+
+def get_router_stats() -> dict:
+    with _stats_lock:
+        names = list(_stats)
+    return {name: provider_stats(name).snapshot() for name in names}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _stats_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=ROUTER_MAX_WORKERS, thread_name_prefix="llm-router")
+    return _executor
+
+
+def _submit(fn, *args):
+    """fn on the router pool, in a copy of the caller's context so provider spans join its trace."""
+    return _get_executor().submit(contextvars.copy_context().run, fn, *args)
+
+
+class RouterLangChainWrapper(LLM):
+    """
+    Routes each call to the fastest healthy provider (rolling p50) and,
+    if it has not answered by its rolling p95, fires a hedged duplicate to
+    the next-best provider and returns whichever succeeds first.
+
+    providers: list of (name, LLM) tuples.
+    """
+    providers: list = []
+    max_tokens: int = 1024
+
+    @property
+    def _llm_type(self) -> str:
+        return "router"
+
+    def _ranked(self):
+        """Healthy providers fastest-first (unmeasured first), then unhealthy ones."""
+        def score(entry):
+            p50 = provider_stats(entry[0]).percentile(50)
+            return -1.0 if p50 is None else p50
+
+        healthy, unhealthy = [], []
+        for entry in self.providers:
+            ok = provider_stats(entry[0]).error_rate() <= ROUTER_MAX_ERROR_RATE
+            (healthy if ok else unhealthy).append(entry)
+        # Unhealthy providers stay at the end as last-resort failover, which
+        # is also how they get a chance to recover
+        return sorted(healthy, key=score) + sorted(unhealthy, key=score)
+
+    @staticmethod
+    def _timed_call(name, llm, prompt, stop, kwargs):
+        start = time.perf_counter()
+        try:
+            text = llm._call(prompt, stop=stop, **kwargs)
+            ok = not is_error_text(text)
+        except Exception as e:
+            text, ok = f"LLaMA Error: {name}: {e}", False
+        provider_stats(name).record(time.perf_counter() - start, ok)
+        return name, text, ok
+
+    def _call(self, prompt: str, stop=None, **kwargs) -> str:
+        ranked = self._ranked()
+        if not ranked:
+            return "LLaMA Error: no LLM providers configured"
+
+        primary_name, primary = ranked[0]
+        pending = {_submit(self._timed_call, primary_name, primary, prompt, stop, kwargs)}
+        backups = list(ranked[1:])
+
+        delay = provider_stats(primary_name).percentile(ROUTER_HEDGE_PERCENTILE)
+        delay = ROUTER_DEFAULT_HEDGE_DELAY_S if delay is None else delay
+
+        last_error = None
+        hedged = False
+        while pending:
+            done, pending = wait(pending, timeout=None if hedged or not backups else delay,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                name, text, ok = future.result()
+                if ok:
+                    # Loser keeps running in its thread (HTTP calls cannot be
+                    # interrupted) but its result is discarded.
+                    for other in pending:
+                        other.cancel()
+                    if hedged:
+                        logger.info("llm router: hedged call won by %s", name)
+                    return text
+                last_error = text
+
+            if backups and (not done or not pending):
+                # Primary is slow (hedge) or failed (failover): add the next provider
+                name, llm = backups.pop(0)
+                hedged = hedged or not done
+                pending.add(_submit(self._timed_call, name, llm, prompt, stop, kwargs))
+
+        return last_error or "LLaMA Error: all LLM providers failed"
+
+    @staticmethod
+    def _open_stream(name, llm, prompt, stop, kwargs):
+        """
+        Starts a provider stream and waits for its first chunk. Returns
+        (name, first_chunk, chunks, start, error); chunks is None on error.
+        Providers without streaming support answer in one chunk via _call.
+        """
+        start = time.perf_counter()
+        chunks = None
+        try:
+            if type(llm)._stream is LLM._stream:
+                chunks = iter([GenerationChunk(text=llm._call(prompt, stop=stop, **kwargs))])
+            else:
+                chunks = llm._stream(prompt, stop=stop, **kwargs)
+            first = next(chunks, None)
+            if first is not None and not is_error_text(first.text):
+                return name, first, chunks, start, None
+            error = first.text if first is not None else f"LLaMA Error: {name}: empty stream"
+        except Exception as e:
+            error = f"LLaMA Error: {name}: {e}"
+        _close_stream(chunks)
+        provider_stats(name).record(time.perf_counter() - start, False)
+        return name, None, None, start, error
+
+    def _stream(self, prompt: str, stop=None, run_manager=None, **kwargs):
+        """
+        Same routing as _call, decided on the first chunk: a provider that
+        has not produced one by its rolling p95 gets a hedged duplicate, and
+        one that fails before producing one fails over to the next. Once a
+        chunk has been yielded the stream is committed to that provider.
+        """
+        ranked = self._ranked()
+        if not ranked:
+            yield GenerationChunk(text="LLaMA Error: no LLM providers configured")
+            return
+
+        primary_name, primary = ranked[0]
+        pending = {_submit(self._open_stream, primary_name, primary, prompt, stop, kwargs)}
+        backups = list(ranked[1:])
+
+        delay = provider_stats(primary_name).percentile(ROUTER_HEDGE_PERCENTILE)
+        delay = ROUTER_DEFAULT_HEDGE_DELAY_S if delay is None else delay
+
+        winner = None
+        last_error = None
+        hedged = False
+        while pending and winner is None:
+            done, pending = wait(pending, timeout=None if hedged or not backups else delay,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                opened = future.result()
+                if opened[2] is None:
+                    last_error = opened[4]
+                elif winner is None:
+                    winner = opened
+                else:
+                    _close_stream(opened[2])
+
+            if winner is None and backups and (not done or not pending):
+                name, llm = backups.pop(0)
+                hedged = hedged or not done
+                pending.add(_submit(self._open_stream, name, llm, prompt, stop, kwargs))
+
+        # Losers keep running in their threads; close their streams once they open
+        for other in pending:
+            if not other.cancel():
+                other.add_done_callback(lambda f: _close_stream(f.result()[2]))
+
+        if winner is None:
+            yield GenerationChunk(text=last_error or "LLaMA Error: all LLM providers failed")
+            return
+
+        name, chunk, chunks, start, _ = winner
+        if hedged:
+            logger.info("llm router: hedged stream won by %s", name)
+        ok = True
+        try:
+            while chunk is not None:
+                ok = ok and not is_error_text(chunk.text)
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text)
+                yield chunk
+                chunk = next(chunks, None)
+        except Exception:
+            ok = False
+            raise
+        finally:
+            _close_stream(chunks)
+            provider_stats(name).record(time.perf_counter() - start, ok)
+
+
+def _close_stream(chunks):
+    close = getattr(chunks, "close", None)
+    if close is not None:
+        close()
@@ -1,18 +1,41 @@
-from utils.llama_wrapper import LlamaLangChainWrapper
+import os
+from dotenv import load_dotenv
+from utils.prompt_builder import build_prompt
 
-# Initialize LLaMA LLM
-llm_model = LlamaLangChainWrapper()
+load_dotenv()
 
-def generate_llm_response(query: str, similar_items: list, configuration_item: str = ""):
-    if not llm_model:
-        return "LLM service unavailable."
+# llama (Groq, default) | gemini | stub | router
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "llama").lower()
+# Providers the router balances between, in preference order
+LLM_ROUTER_PROVIDERS = os.getenv("LLM_ROUTER_PROVIDERS", "llama,gemini")
+
+
+def _create_provider(name: str):
+    if name == "llama":
+        from utils.llama_wrapper import LlamaLangChainWrapper
+        return LlamaLangChainWrapper()
+    if name == "gemini":
+        from utils.gemini_wrapper import GeminiLangChainWrapper
+        return GeminiLangChainWrapper()
+    if name.startswith("stub"):
+        from utils.stub_llm import StubLangChainWrapper
+        return StubLangChainWrapper(provider_name=name)
+    raise ValueError(f"Unknown LLM provider '{name}'")
 
-    context = "\n".join([
-        f"Similar {item['source']} {i+1}: {item['training_text']}"
-        for i, item in enumerate(similar_items[:3])
-    ])
 
-    prompt = f"""
+def create_llm(provider: str = LLM_PROVIDER):
+    """Builds the LLM used by every chain, selected by LLM_PROVIDER."""
+    if provider == "router":
+        from utils.llm_router import RouterLangChainWrapper
+        names = [n.strip() for n in LLM_ROUTER_PROVIDERS.split(",") if n.strip()]
+        return RouterLangChainWrapper(providers=[(n, _create_provider(n)) for n in names])
+    return _create_provider(provider)
+
+
+# Initialize the shared LLM (LLaMA unless configured otherwise)
+llm_model = create_llm()
+
+SUGGESTION_TEMPLATE = """
 You are an IT support assistant for ServiceNow.
 
 USER ISSUE:
@@ -33,6 +56,21 @@ Your task:
 Return only the solution steps in a concise format.
 """
 
+
+def build_suggestion_prompt(query: str, similar_items: list, configuration_item: str = "") -> str:
+    return build_prompt(
+        SUGGESTION_TEMPLATE, similar_items,
+        max_completion_tokens=llm_model.max_tokens,
+        query=query, configuration_item=configuration_item
+    )
+
+
+def generate_llm_response(query: str, similar_items: list, configuration_item: str = ""):
+    if not llm_model:
+        return "LLM service unavailable."
+
+    prompt = build_suggestion_prompt(query, similar_items, configuration_item)
+
     # --- Call LLaMA and extract plain text ---
     try:
         llm_response = llm_model.invoke(prompt)  # safer than __call__
@@ -46,3 +84,18 @@ Return only the solution steps in a concise format.
         return f"LLaMA Error: {e}"
 
 
+def stream_llm_response(query: str, similar_items: list, configuration_item: str = ""):
+    """
+    Same prompt as generate_llm_response, yielded as text chunks
+    as soon as the model produces them.
+    """
+    if not llm_model:
+        yield "LLM service unavailable."
+        return
+
+    prompt = build_suggestion_prompt(query, similar_items, configuration_item)
+    try:
+        for chunk in llm_model.stream(prompt):
+            yield chunk if isinstance(chunk, str) else getattr(chunk, "content", str(chunk))
+    except Exception as e:
+        yield f"LLaMA Error: {e}"
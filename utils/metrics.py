@@ -0,0 +1,220 @@
+# utils/metrics.py
+"""
+In-process counters and histograms rendered in the Prometheus text format.
+
+No client library needed: each metric is a dict of label-tuple -> values
+behind one lock, so an observation costs a dict lookup and a bisect.
+Existing *_stats() snapshots are exported through collectors at scrape time.
+"""
+import os
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from utils.tracing import span, tag_current
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Seconds; covers cache hits (sub-ms) up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames, values, extra=None) -> str:
+    pairs = list(zip(labelnames, values)) + list(extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.values = {}   # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self):
+        with self.lock:
+            items = [(key, list(row)) for key, row in sorted(self.values.items())]
+        for key, row in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', bound)])} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {row[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {row[-2]}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {row[-1]}"
+
+
+# ============================================================
+# 1️⃣ Registry
+# ============================================================
+
+_metrics = []
+_collectors = []
+
+
+def counter(name: str, help_text: str, labelnames=()) -> Counter:
+    metric = Counter(name, help_text, labelnames)
+    _metrics.append(metric)
+    return metric
+
+
+def histogram(name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    metric = Histogram(name, help_text, labelnames, buckets)
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(fn):
+    """
+    fn() -> iterable of (name, type, help, [(labels_dict, value), ...]);
+    called at scrape time, e.g. to export an existing *_stats() snapshot as gauges.
+    """
+    _collectors.append(fn)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type_name}")
+        lines.extend(metric.render())
+    for collect in _collectors:
+        try:
+            families = list(collect())
+        except Exception as e:
+            logger.warning("metrics collector %s failed: %s", getattr(collect, "__name__", collect), e)
+            continue
+        for name, type_name, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {type_name}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {float(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ============================================================
+# 2️⃣ Pipeline metrics
+# ============================================================
+
+STAGE_LATENCY = histogram("ticket_stage_duration_seconds", "Latency of each pipeline stage", ("stage",))
+STAGE_ERRORS = counter("ticket_stage_errors_total", "Pipeline stages that raised", ("stage",))
+HTTP_LATENCY = histogram("http_request_duration_seconds", "Flask request latency", ("endpoint", "method", "status"))
+LLM_LATENCY = histogram("llm_request_duration_seconds", "LLM provider call latency", ("provider", "mode"))
+LLM_ERRORS = counter("llm_errors_total", "LLM calls that returned an error", ("provider",))
+LLM_TOKENS = counter("llm_tokens_total", "Tokens reported by the LLM provider", ("provider", "kind"))
+BACKEND_LATENCY = histogram("backend_request_duration_seconds", "Outbound HTTP latency incl. retries",
+                            ("backend", "method", "status"))
+BACKEND_RETRIES = counter("backend_retries_total", "Outbound HTTP retries", ("backend",))
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Records the block's duration under ticket_stage_duration_seconds{stage}
+    and as a span of the current trace.
+    """
+    with span(stage):
+        if not METRICS_ENABLED:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            STAGE_ERRORS.inc(stage=stage)
+            raise
+        finally:
+            STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
+
+
+def record_llm_call(provider: str, latency_s: float, ok: bool, mode: str = "call"):
+    if not METRICS_ENABLED:
+        return
+    LLM_LATENCY.observe(latency_s, provider=provider, mode=mode)
+    if not ok:
+        LLM_ERRORS.inc(provider=provider)
+
+
+def record_llm_tokens(provider: str, prompt_tokens, completion_tokens):
+    tag_current(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    if not METRICS_ENABLED:
+        return
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, provider=provider, kind="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, provider=provider, kind="completion")
+
+
+def record_backend_call(backend: str, method: str, status, latency_s: float, retries: int):
+    if not METRICS_ENABLED:
+        return
+    BACKEND_LATENCY.observe(latency_s, backend=backend, method=method, status=status)
+    if retries:
+        BACKEND_RETRIES.inc(retries, backend=backend)
+
+
+# ============================================================
+# 3️⃣ Logging
+# ============================================================
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" for humans, "logfmt" for key=value lines a log shipper can parse
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+
+def configure_logging():
+    """Root logger set from LOG_LEVEL / LOG_FORMAT; call once at startup."""
+    if LOG_FORMAT == "logfmt":
+        fmt = 'ts=%(asctime)s level=%(levelname)s logger=%(name)s pid=%(process)d thread=%(threadName)s msg="%(message)s"'
+    else:
+        fmt = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+    logging.basicConfig(level=getattr(logging, LOG_LEVEL, logging.INFO), format=fmt)
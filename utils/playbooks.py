@@ -0,0 +1,99 @@
+# utils/playbooks.py
+import os
+import pickle
+import logging
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from utils.metrics import register_collector
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Built offline by data_prep/build_cluster_playbooks.py
+PLAYBOOKS_FILE = os.getenv("PLAYBOOKS_FILE", "data_prep/cluster_playbooks.pkl")
+PLAYBOOKS_ENABLED = os.getenv("PLAYBOOKS_ENABLED", "true").lower() == "true"
+# Cosine similarity to the centroid a ticket needs before the LLM is skipped;
+# a cluster's own radius raises it for loose clusters
+PLAYBOOK_MIN_SIMILARITY = float(os.getenv("PLAYBOOK_MIN_SIMILARITY", "0.8"))
+
+_index = None
+_index_loaded = False
+_stats = {"hits": 0, "misses": 0}
+_lock = threading.Lock()
+
+
+def _load_index():
+    """Approved playbooks + their centroids, loaded once; None when no artifact exists."""
+    global _index, _index_loaded
+    if not _index_loaded:
+        with _lock:
+            if not _index_loaded:
+                if PLAYBOOKS_ENABLED and os.path.exists(PLAYBOOKS_FILE):
+                    with open(PLAYBOOKS_FILE, "rb") as f:
+                        data = pickle.load(f)
+                    approved = [p for p in data["playbooks"] if p.get("approved") and p.get("steps")]
+                    if approved:
+                        centroids = np.asarray(data["centroids"], dtype=np.float32)
+                        _index = {
+                            "centroids": centroids[[p["cluster_id"] for p in approved]],
+                            "thresholds": np.array([max(PLAYBOOK_MIN_SIMILARITY, p.get("radius", 0.0))
+                                                    for p in approved], dtype=np.float32),
+                            "playbooks": approved,
+                            "num_clusters": len(data["playbooks"]),
+                        }
+                    logger.info("📌 Loaded %d/%d approved cluster playbooks",
+                                len(approved), len(data["playbooks"]))
+                _index_loaded = True
+    return _index
+
+
+def match_playbook(query_vec):
+    """
+    Nearest approved cluster centroid to the (normalized) query embedding.
+    Returns (playbook, similarity) when it clears that cluster's threshold,
+    else None. Records a hit or a miss for the coverage rate.
+    """
+    index = _load_index()
+    if index is None:
+        return None
+
+    sims = index["centroids"] @ np.asarray(query_vec, dtype=np.float32).reshape(-1)
+    best = int(sims.argmax())
+    hit = sims[best] >= index["thresholds"][best]
+    with _lock:
+        _stats["hits" if hit else "misses"] += 1
+    if not hit:
+        return None
+    return index["playbooks"][best], float(sims[best])
+
+
+def format_playbook(playbook: dict) -> str:
+    """Same numbered-steps shape as the consolidated LLM suggestion."""
+    return "\n".join(f"{i}. {step}" for i, step in enumerate(playbook["steps"], 1))
+
+
+def get_playbook_stats() -> dict:
+    index = _load_index()
+    with _lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    total = hits + misses
+    return {
+        "playbooks_loaded": len(index["playbooks"]) if index else 0,
+        "clusters": index["num_clusters"] if index else 0,
+        "hits": hits,
+        "misses": misses,
+        "coverage": round(hits / total, 4) if total else 0.0,
+    }
+
+
+def _playbook_metrics():
+    stats = get_playbook_stats()
+    yield ("suggestion_source_total", "counter", "AI suggestions by source",
+           [({"source": "playbook"}, stats["hits"]), ({"source": "llm"}, stats["misses"])])
+    yield ("playbook_coverage_ratio", "gauge", "Share of tickets served a cluster playbook",
+           [({}, stats["coverage"])])
+
+
+register_collector(_playbook_metrics)
@@ -0,0 +1,249 @@
+# utils/profiler.py
+"""
+On-demand sampling profiler for a live worker.
+
+A background thread snapshots every thread's Python stack with
+sys._current_frames() every `interval_s` and counts identical stacks.
+Output is the collapsed-stack format ("frame;frame;frame count" per line)
+that flamegraph.pl, speedscope and inferno read directly.
+
+Native code (torch kernels, FAISS, tokenizers) shows up as the Python
+frame that called into it; summary() buckets samples by the
+innermost frame from a known library so a CPU spike can be attributed
+to tokenization / torch / FAISS / JSON / Flask without reading the graph.
+"""
+import os
+import sys
+import time
+import signal
+import logging
+import sysconfig
+import threading
+from collections import Counter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MAX_S = float(os.getenv("PROFILE_MAX_S", "60"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SIGNAL_SECONDS = float(os.getenv("PROFILE_SIGNAL_SECONDS", "10"))
+
+# Leaf frames of threads parked waiting for work; dropped unless include_idle
+IDLE_LEAVES = {
+    ("threading", "wait"),
+    ("threading", "_wait_for_tstate_lock"),
+    ("selectors", "select"),
+    ("socket", "accept"),
+    ("socketserver", "serve_forever"),
+    ("queue", "get"),
+    ("ssl", "read"),
+    ("socket", "readinto"),
+}
+
+# (component, path fragment) — first match on the innermost matching frame wins
+COMPONENTS = [
+    ("tokenization", "tokenizers"),
+    ("tokenization", "transformers/tokenization"),
+    ("torch", "torch/"),
+    ("sentence_transformers", "sentence_transformers/"),
+    ("faiss", "faiss/"),
+    ("json", "json/"),
+    ("langchain", "langchain"),
+    ("http_client", "requests/"),
+    ("http_client", "urllib3/"),
+    ("http_client", "groq/"),
+    ("flask", "flask/"),
+    ("flask", "werkzeug/"),
+    ("app", "/utils/"),
+    ("app", "/chains/"),
+    ("app", "/mcp_agents/"),
+]
+
+
+def _module_name(filename: str) -> str:
+    base = os.path.basename(filename)
+    return base[:-3] if base.endswith(".py") else base
+
+
+_STDLIB = sysconfig.get_paths()["stdlib"] + os.sep
+
+
+def _short_path(filename: str) -> str:
+    for marker in ("site-packages" + os.sep, "dist-packages" + os.sep):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    if filename.startswith(_STDLIB):
+        return filename[len(_STDLIB):]
+    try:
+        return os.path.relpath(filename)
+    except ValueError:
+        return filename
+
+
+def _stack(frame):
+    """Outermost-first list of (label, filename, module, function)."""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(code)
+        frame = frame.f_back
+    frames.reverse()
+    return [(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})",
+             code.co_filename, _module_name(code.co_filename), code.co_name) for code in frames]
+
+
+class SamplingProfiler:
+    def __init__(self, interval_s: float = 0.005, include_idle: bool = False, thread_ids=None, exclude_ids=()):
+        self.interval_s = interval_s
+        self.include_idle = include_idle
+        self.thread_ids = set(thread_ids) if thread_ids else None
+        self.exclude_ids = set(exclude_ids)
+        self.stacks = Counter()
+        self.components = Counter()
+        self.samples = 0
+        self.ticks = 0
+        self.elapsed_s = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self, own_ident: int):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident or ident in self.exclude_ids or (self.thread_ids and ident not in self.thread_ids):
+                continue
+            stack = _stack(frame)
+            if not stack:
+                continue
+            if not self.include_idle and (stack[-1][2], stack[-1][3]) in IDLE_LEAVES:
+                continue
+            thread_name = names.get(ident, str(ident)).replace(";", ":")
+            self.stacks[";".join([thread_name] + [label.replace(";", ":") for label, *_ in stack])] += 1
+            self.components[_component(stack)] += 1
+            self.samples += 1
+
+    def _run(self):
+        own = threading.get_ident()
+        start = time.perf_counter()
+        next_tick = start
+        while not self._stop.is_set():
+            self._sample(own)
+            self.ticks += 1
+            next_tick += self.interval_s
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                next_tick = time.perf_counter()   # fell behind; don't burst
+        self.elapsed_s = time.perf_counter() - start
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def summary(self, top: int = 15) -> dict:
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = max(1, self.samples)
+        return {
+            "elapsed_s": round(self.elapsed_s, 3),
+            "ticks": self.ticks,
+            "samples": self.samples,
+            "interval_ms": self.interval_s * 1000,
+            "components": {k: round(v / total, 4) for k, v in self.components.most_common()},
+            "top_leaf_frames": [{"frame": k, "share": round(v / total, 4)} for k, v in leaves.most_common(top)],
+        }
+
+
+def _component(stack) -> str:
+    for _, filename, _, _ in reversed(stack):
+        path = filename.replace("\\", "/")
+        for component, fragment in COMPONENTS:
+            if fragment in path:
+                return component
+    return "other"
+
+
+# ============================================================
+# 1️⃣ One profile at a time per process
+# ============================================================
+
+_busy = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def profile_for(seconds: float, interval_ms: float = 5.0, include_idle: bool = False, thread_ids=None):
+    """
+    Samples the whole process for `seconds` (capped at PROFILE_MAX_S) and
+    returns the stopped SamplingProfiler. The calling thread (which only
+    sleeps) is left out. Raises ProfilerBusy if one is running.
+    """
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("a profile is already running in this process")
+    try:
+        profiler = SamplingProfiler(max(0.001, interval_ms / 1000), include_idle, thread_ids,
+                                    exclude_ids=[threading.get_ident()]).start()
+        time.sleep(max(0.0, min(seconds, PROFILE_MAX_S)))
+        return profiler.stop()
+    finally:
+        _busy.release()
+
+
+def write_profile(profiler: SamplingProfiler, prefix: str = "profile") -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{prefix}_{os.getpid()}_{time.strftime('%Y%m%d_%H%M%S')}.collapsed")
+    with open(path, "w") as f:
+        f.write(profiler.collapsed())
+    return path
+
+
+# ============================================================
+# 2️⃣ Signal trigger
+# ============================================================
+
+def _profile_to_file(seconds: float):
+    try:
+        profiler = profile_for(seconds)
+    except ProfilerBusy as e:
+        logger.warning("profile signal ignored: %s", e)
+        return
+    path = write_profile(profiler)
+    logger.warning("profile written to %s (%s)", path, profiler.summary(top=5)["components"])
+
+
+def install_signal_handler(signame: str = None) -> bool:
+    """
+    `kill -USR2 <pid>` profiles that process for PROFILE_SIGNAL_SECONDS and
+    writes the collapsed stacks under PROFILE_DIR. Must be called from the
+    main thread (after fork, for pre-fork servers). Returns False if unsupported.
+    """
+    signame = signame or os.getenv("PROFILE_SIGNAL", "SIGUSR2")
+    signum = getattr(signal, signame, None)
+    if signum is None:
+        return False
+
+    def handler(_signum, _frame):
+        # Never sample from inside the handler; it runs on the main thread
+        threading.Thread(target=_profile_to_file, args=(PROFILE_SIGNAL_SECONDS,),
+                         name="profile-signal", daemon=True).start()
+
+    try:
+        signal.signal(signum, handler)
+    except ValueError:
+        return False   # not the main thread
+    return True
@@ -0,0 +1,122 @@
+# utils/prompt_builder.py
+import os
+import re
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Token budget for retrieved context inside a single prompt
+PROMPT_CONTEXT_TOKEN_BUDGET = int(os.getenv("PROMPT_CONTEXT_TOKEN_BUDGET", "600"))
+# Model context window (llama-3.1-8b-instant serves 8k on Groq's free tier)
+LLM_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "8192"))
+# Snippets are only truncated to fit if at least this many tokens remain
+MIN_SNIPPET_TOKENS = 24
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+# ============================================================
+# 1️⃣ Local tokenizer
+# ============================================================
+
+def _load_tokenizer():
+    """
+    tiktoken (cl100k_base, close to LLaMA-3's BPE) when installed,
+    else the embedding model's tokenizer that is already in memory,
+    else a ~4 chars/token estimate.
+    """
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding(os.getenv("PROMPT_TOKENIZER", "cl100k_base"))
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        pass
+    try:
+        from utils.vector_store import model
+        tokenizer = model.tokenizer
+        return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+    except Exception:
+        return lambda text: (len(text) + 3) // 4
+
+
+_count = None
+
+
+def count_tokens(text: str) -> int:
+    global _count
+    if _count is None:
+        _count = _load_tokenizer()
+    return _count(text or "")
+
+
+# ============================================================
+# 2️⃣ Context packing
+# ============================================================
+
+def _sentence_key(sentence: str) -> str:
+    return " ".join(sentence.lower().split())
+
+
+def pack_context(similar_items: list, budget_tokens: int, max_items: int = 3, label: str = "Similar") -> str:
+    """
+    Packs retrieved snippets most-relevant first within budget_tokens.
+    Sentences already present in an earlier snippet (e.g. identical
+    "Resolution:" lines) are dropped; the last snippet is trimmed by
+    sentence if it does not fit whole.
+    """
+    ranked = sorted(
+        enumerate(similar_items[:max_items]),
+        key=lambda pair: pair[1].get("similarity_score", 0.0),
+        reverse=True
+    )
+
+    seen, blocks, used = set(), [], 0
+    for i, item in ranked:
+        sentences = []
+        for sentence in _SENTENCE_SPLIT.split(item.get("training_text", "")):
+            key = _sentence_key(sentence)
+            if key and key not in seen:
+                seen.add(key)
+                sentences.append(sentence.strip())
+        if not sentences:
+            continue
+
+        header = " ".join(filter(None, [label, item.get("source", "item"), str(i + 1)])) + ": "
+        remaining = budget_tokens - used
+        block = header + " ".join(sentences)
+        tokens = count_tokens(block) + 1  # newline separator
+
+        if tokens > remaining:
+            if remaining < MIN_SNIPPET_TOKENS:
+                break
+            block, tokens = header, count_tokens(header) + 1
+            for sentence in sentences:
+                cost = count_tokens(" " + sentence)
+                if tokens + cost > remaining:
+                    break
+                block, tokens = f"{block} {sentence}", tokens + cost
+            if block == header:
+                break
+
+        blocks.append(block)
+        used += tokens
+
+    return "\n".join(blocks)
+
+
+def build_prompt(template: str, similar_items: list, max_completion_tokens: int = 1024,
+                 budget_tokens: int = None, label: str = "Similar", max_items: int = 3, **fields) -> str:
+    """
+    Fills `template` (str.format style, with a {context} slot) so that the
+    whole prompt plus max_completion_tokens fits the model context window.
+    """
+    skeleton = template.format(context="", **fields)
+    room = LLM_CONTEXT_WINDOW - max_completion_tokens - count_tokens(skeleton)
+    budget = max(0, min(budget_tokens or PROMPT_CONTEXT_TOKEN_BUDGET, room))
+
+    prompt = template.format(context=pack_context(similar_items, budget, max_items=max_items, label=label), **fields)
+    logger.debug("prompt built: %d tokens (context budget %d)", count_tokens(prompt), budget)
+    return prompt
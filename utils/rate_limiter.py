@@ -0,0 +1,236 @@
+# utils/rate_limiter.py
+import os
+import time
+import threading
+from collections import deque
+from dotenv import load_dotenv
+from utils.tracing import annotate_current
+from utils.circuit_breaker import NotAttempted
+
+load_dotenv()
+
+# Provider quotas are per account; split them across pre-forked workers
+WORKER_PROCESSES = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+# How long a queued LLM call may wait for capacity before giving up
+LLM_QUEUE_DEADLINE_S = float(os.getenv("LLM_QUEUE_DEADLINE_S", "30"))
+
+# Per-provider defaults (Groq free tier for llama-3.1-8b-instant)
+LIMITER_DEFAULTS = {
+    "groq": {
+        "rpm": float(os.getenv("GROQ_RPM", "30")),
+        "tpm": float(os.getenv("GROQ_TPM", "6000")),
+        "max_concurrency": int(os.getenv("GROQ_MAX_CONCURRENCY", "8")),
+        "target_latency_s": float(os.getenv("GROQ_TARGET_LATENCY_S", "2.0")),
+    },
+    "gemini": {
+        "rpm": float(os.getenv("GEMINI_RPM", "30")),
+        "tpm": float(os.getenv("GEMINI_TPM", "1000000")),
+        "max_concurrency": int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+        "target_latency_s": float(os.getenv("GEMINI_TARGET_LATENCY_S", "3.0")),
+    },
+}
+
+
+class RateLimitTimeout(NotAttempted):
+    """Raised when a queued call cannot get capacity before its deadline; not a provider failure."""
+
+
+def is_rate_limit_error(exc) -> bool:
+    """True for provider 429 / quota errors (Groq, Gemini, raw HTTP)."""
+    for attr in ("status_code", "code"):
+        if getattr(exc, attr, None) == 429:
+            return True
+    text = str(exc)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text or "rate_limit" in text.lower()
+
+
+def retry_after_seconds(exc, default: float = 1.0) -> float:
+    """Reads Retry-After from the provider error response when present."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after", default)))
+    except (TypeError, ValueError):
+        return default
+
+
+class TokenBucket:
+    """Continuous-refill bucket; may go negative when actual usage exceeds the estimate."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = max(1.0, per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= amount
+
+
+class Permit:
+    """Handed out by AdaptiveRateLimiter.acquire; release exactly once."""
+
+    def __init__(self, limiter, tokens: float):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self, throttled: bool = False, actual_tokens: float = None, retry_after: float = 0.0):
+        if not self.released:
+            self.released = True
+            self.limiter._release(self, throttled, actual_tokens, retry_after)
+
+
+class AdaptiveRateLimiter:
+    """
+    Requests/min + tokens/min token buckets with an AIMD concurrency limit.
+
+    - Callers queue FIFO and wait (up to a deadline) instead of failing.
+    - A 429 halves the concurrency limit and pauses for Retry-After.
+    - Each fast success adds ~1 to the limit per window of calls; calls
+      slower than target_latency_s shrink it slightly.
+    """
+
+    def __init__(self, name: str, rpm: float, tpm: float, max_concurrency: int = 8,
+                 min_concurrency: int = 1, target_latency_s: float = 2.0):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+        self.target_latency_s = target_latency_s
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.stats = {"acquired": 0, "throttled": 0, "timeouts": 0, "waited_s": 0.0}
+
+    def acquire(self, tokens: float = 1.0, deadline: float = None) -> Permit:
+        """Blocks until capacity is available; raises RateLimitTimeout at `deadline` (monotonic)."""
+        deadline = deadline if deadline is not None else time.monotonic() + LLM_QUEUE_DEADLINE_S
+        ticket = object()
+        start = time.monotonic()
+        with self.cond:
+            self.queue.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.requests.refill(now)
+                    self.tokens.refill(now)
+
+                    wait_s = None
+                    if self.queue[0] is ticket and self.in_flight < int(self.limit):
+                        wait_s = max(
+                            self.paused_until - now,
+                            self.requests.wait_time(1),
+                            self.tokens.wait_time(tokens),
+                        )
+                        if wait_s <= 0:
+                            self.requests.take(1)
+                            self.tokens.take(tokens)
+                            self.in_flight += 1
+                            self.stats["acquired"] += 1
+                            self.stats["waited_s"] += now - start
+                            return Permit(self, tokens)
+
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.stats["timeouts"] += 1
+                        raise RateLimitTimeout(
+                            f"{self.name} rate limit: no capacity within deadline "
+                            f"(queued={len(self.queue)}, in_flight={self.in_flight})"
+                        )
+                    self.cond.wait(timeout=remaining if wait_s is None else min(remaining, wait_s))
+            finally:
+                self.queue.remove(ticket)
+                self.cond.notify_all()
+
+    def _release(self, permit: Permit, throttled: bool, actual_tokens, retry_after: float):
+        latency = time.monotonic() - permit.started
+        with self.cond:
+            self.in_flight -= 1
+            if actual_tokens is not None:
+                # Settle the estimate against real usage
+                self.tokens.take(actual_tokens - permit.tokens)
+
+            if throttled:
+                self.stats["throttled"] += 1
+                self.limit = max(float(self.min_concurrency), self.limit / 2.0)
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            elif latency <= self.target_latency_s:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            else:
+                self.limit = max(float(self.min_concurrency), self.limit * 0.95)
+            self.cond.notify_all()
+
+    def snapshot(self) -> dict:
+        with self.cond:
+            return {
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queued": len(self.queue),
+                **self.stats,
+                "waited_s": round(self.stats["waited_s"], 3),
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str) -> AdaptiveRateLimiter:
+    """Process-wide limiter per provider, shared by every wrapper instance."""
+    with _limiters_lock:
+        if name not in _limiters:
+            cfg = LIMITER_DEFAULTS.get(name, LIMITER_DEFAULTS["groq"])
+            _limiters[name] = AdaptiveRateLimiter(
+                name,
+                rpm=cfg["rpm"] / WORKER_PROCESSES,
+                tpm=cfg["tpm"] / WORKER_PROCESSES,
+                max_concurrency=cfg["max_concurrency"],
+                target_latency_s=cfg["target_latency_s"],
+            )
+        return _limiters[name]
+
+
+def get_limiter_stats() -> dict:
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.snapshot() for name, limiter in limiters.items()}
+
+
+def run_rate_limited(name: str, est_tokens: float, fn, deadline_s: float = LLM_QUEUE_DEADLINE_S):
+    """
+    Runs fn() under the provider's limiter. fn returns (result, used_tokens_or_None).
+    A 429 shrinks concurrency, waits for Retry-After and re-queues the call
+    until the deadline; other exceptions propagate.
+    """
+    limiter = get_limiter(name)
+    deadline = time.monotonic() + deadline_s
+    while True:
+        queued_at = time.monotonic()
+        permit = limiter.acquire(est_tokens, deadline)
+        waited = time.monotonic() - queued_at
+        if waited >= 0.01:
+            annotate_current(f"waited {waited * 1000:.0f}ms for {name} quota")
+        try:
+            result, used = fn()
+        except Exception as e:
+            throttled = is_rate_limit_error(e)
+            permit.release(throttled=throttled, retry_after=retry_after_seconds(e) if throttled else 0.0)
+            if throttled:
+                annotate_current(f"{name} throttled (429), re-queued")
+                continue
+            raise
+        permit.release(actual_tokens=used)
+        return result
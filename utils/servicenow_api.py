@@ -1,12 +1,18 @@
 
 # utils/servicenow_api.py
 import os
+import logging
 import requests
 from dotenv import load_dotenv
+from utils.http_client import BACKENDS, get_backend, register_backend
+from utils.circuit_breaker import CircuitOpenError
+from utils.metrics import timed
 
 # Load environment variables from .env (if present)
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Read and normalize ServiceNow credentials/settings
 SNOW_INSTANCE = (os.getenv("SERVICENOW_INSTANCE") or "").rstrip("/")   # e.g., https://yourinstance.service-now.com
 SNOW_USER = os.getenv("SERVICENOW_USERNAME")
@@ -24,32 +30,71 @@ def _headers():
         "Accept": "application/json"
     }
 
-def _patch_incident(sys_id: str, payload: dict, timeout: int = 15):
+def servicenow_target(tenant: str = None) -> dict:
+    """
+    Instance, credentials and assignment-group mapping for a tenant's
+    ServiceNow. The default tenant uses the SERVICENOW_* env vars; any other
+    tenant uses the "servicenow" block of its tenants.json entry:
+
+        "servicenow": {
+          "instance": "https://emea.service-now.com",
+          "username_env": "EMEA_SNOW_USERNAME",     (or "username": "...")
+          "password_env": "EMEA_SNOW_PASSWORD",     (or "password": "...")
+          "assignment_groups": {"Network Operations": "EMEA Network L2"}
+        }
+
+    Each tenant instance gets its own pooled client and circuit breaker.
+    """
+    if tenant:
+        # Imported lazily: the registry pulls in FAISS, which the
+        # ServiceNow-only tools (bench_servicenow_writes.py) don't need
+        from utils.tenant_registry import is_default_tenant, get_tenant_registry
+        if not is_default_tenant(tenant):
+            spec = get_tenant_registry().config(tenant).get("servicenow") or {}
+            instance = (spec.get("instance") or "").rstrip("/")
+            backend = f"servicenow:{tenant}"
+            if instance:
+                register_backend(backend, instance, BACKENDS["servicenow"]["idempotent"])
+            return {
+                "tenant": tenant,
+                "backend": backend,
+                "instance": instance,
+                "user": spec.get("username") or os.getenv(spec.get("username_env") or "") or None,
+                "password": spec.get("password") or os.getenv(spec.get("password_env") or "") or None,
+                "assignment_groups": spec.get("assignment_groups") or {},
+            }
+    return {"tenant": None, "backend": "servicenow", "instance": SNOW_INSTANCE,
+            "user": SNOW_USER, "password": SNOW_PASS, "assignment_groups": {}}
+
+def _patch_incident(sys_id: str, payload: dict, timeout: int = 15, tenant: str = None):
     """
-    Low-level helper to PATCH an incident.
+    Low-level helper to PATCH an incident on the tenant's instance.
     Returns (ok_bool, response_json_or_text).
     """
     # Validate env config early
-    if not (SNOW_INSTANCE and SNOW_USER and SNOW_PASS):
-        return False, {
-            "error": "Missing SERVICENOW_INSTANCE / SERVICENOW_USERNAME / SERVICENOW_PASSWORD env vars",
-            "instance": SNOW_INSTANCE,
-            "user_set": SNOW_USER is not None,
-            "password_set": SNOW_PASS is not None
-        }
+    target = servicenow_target(tenant)
+    config_error = _check_config(target)
+    if config_error:
+        return False, config_error
 
-    url = f"{SNOW_INSTANCE}/api/now/table/incident/{sys_id}"
-    print(f"[SNOW] PATCH {url} payload={payload}")
+    path = f"/api/now/table/incident/{sys_id}"
+    logger.debug("[SNOW] PATCH %s fields=%s", path, sorted(payload))
 
     try:
-        resp = requests.patch(
-            url,
-            auth=(SNOW_USER, SNOW_PASS),
-            headers=_headers(),
-            json=payload,
-            timeout=timeout
-        )
-        print(f"[SNOW] -> status={resp.status_code}")
+        # Pooled keep-alive session (see utils/http_client.py)
+        with timed("servicenow_patch"):
+            resp = get_backend(target["backend"]).request(
+                "PATCH",
+                path,
+                auth=(target["user"], target["password"]),
+                headers=_headers(),
+                json=payload,
+                timeout=timeout
+            )
+        logger.debug("[SNOW] -> status=%s", resp.status_code)
+    except CircuitOpenError as e:
+        # ServiceNow has been failing; don't wait on another timeout
+        return False, {"error": f"ServiceNow unavailable: {e}", "circuit_open": True}
     except requests.exceptions.RequestException as e:
         # Network/timeouts/connection issues
         return False, {"error": f"Network error updating ServiceNow: {e}"}
@@ -67,39 +112,80 @@ def _patch_incident(sys_id: str, payload: dict, timeout: int = 15):
 
     return ok, data
 
-def update_ticket_v2(ticket_id: str, update_type: str, message: str):
-    """
-    Flexible updater for Incident records.
+def _check_config(target: dict = None):
+    """Same missing-credentials payload as _patch_incident, or None when configured."""
+    target = target or servicenow_target()
+    if target["instance"] and target["user"] and target["password"]:
+        return None
+    if target["tenant"]:
+        error = (f"Missing servicenow instance / credentials for tenant '{target['tenant']}' "
+                 f"in tenants.json")
+    else:
+        error = "Missing SERVICENOW_INSTANCE / SERVICENOW_USERNAME / SERVICENOW_PASSWORD env vars"
+    return {
+        "error": error,
+        "instance": target["instance"],
+        "user_set": target["user"] is not None,
+        "password_set": target["password"] is not None
+    }
 
-    update_type:
-      - "worknote": add work_notes (internal note).
-      - "resolve" : set state=Resolved (6), add close_notes + work_notes.
-      - "escalate": set state=In Progress (2) + work_notes (no assignment).
+def map_assignment_group(group: str, tenant: str = None):
+    """The tenant's ServiceNow name for a predicted assignment group, or None when unmapped."""
+    return servicenow_target(tenant)["assignment_groups"].get(group) if group else None
 
-    Returns (ok_bool, response_json_or_text).
+def build_update_payload(update_type: str, message: str):
+    """
+    PATCH body for an update_type ("worknote" | "resolve" | "escalate"),
+    or None for an unknown type.
     """
     update_type = (update_type or "").strip().lower()
     message = message or ""
 
     if update_type == "worknote":
-        return _patch_incident(ticket_id, {"work_notes": message})
+        return {"work_notes": message}
 
     if update_type == "resolve":
-        payload = {
+        return {
             "state": STATE_RESOLVED,
             "close_notes": message,
             "work_notes": f"Resolution details:\n{message}",
         }
-        return _patch_incident(ticket_id, payload)
 
     if update_type == "escalate":
-        payload = {
+        return {
             "state": STATE_IN_PROGRESS,
             "work_notes": f"Escalated to human: {message}",
         }
-        return _patch_incident(ticket_id, payload)
 
-    return False, {"error": f"Unknown update_type '{update_type}'"}
+    return None
+
+def build_incident_update(field_updates: dict, note_text: str, update_type: str, message: str):
+    """
+    Coalesces set_fields_and_note + update_ticket_v2 into ONE PATCH body:
+    fields, state/close_notes and a single combined work note.
+    """
+    payload = dict(field_updates or {})
+    state_payload = build_update_payload(update_type, message) or {}
+    notes = [note_text or "", state_payload.pop("work_notes", "")]
+    payload.update(state_payload)
+    payload["work_notes"] = "\n\n".join(n for n in notes if n)
+    return payload
+
+def update_ticket_v2(ticket_id: str, update_type: str, message: str):
+    """
+    Flexible updater for Incident records.
+
+    update_type:
+      - "worknote": add work_notes (internal note).
+      - "resolve" : set state=Resolved (6), add close_notes + work_notes.
+      - "escalate": set state=In Progress (2) + work_notes (no assignment).
+
+    Returns (ok_bool, response_json_or_text).
+    """
+    payload = build_update_payload(update_type, message)
+    if payload is None:
+        return False, {"error": f"Unknown update_type '{update_type}'"}
+    return _patch_incident(ticket_id, payload)
 
 def set_fields_and_note(ticket_id: str, field_updates: dict, note_text: str):
     """
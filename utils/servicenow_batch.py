@@ -0,0 +1,343 @@
+# utils/servicenow_batch.py
+"""
+Batched ServiceNow incident writer.
+
+Each ticket update is already ONE coalesced PATCH (build_incident_update).
+With SNOW_BATCH_ENABLED=true, PATCHes for many tickets are grouped into a
+single POST /api/now/v1/batch request, flushed when SNOW_BATCH_SIZE updates
+are pending or SNOW_BATCH_WINDOW_MS after the first one arrived. Each
+tenant's instance (see servicenow_api.servicenow_target) has its own writer.
+"""
+import os
+import json
+import time
+import uuid
+import base64
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+from urllib3.exceptions import NewConnectionError
+from dotenv import load_dotenv
+from utils.http_client import get_backend
+from utils.circuit_breaker import CircuitOpenError
+from utils.metrics import timed
+from utils.tracing import current_request_id, tag_current
+from utils.servicenow_api import servicenow_target, _check_config, _headers, _patch_incident
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SNOW_BATCH_ENABLED = os.getenv("SNOW_BATCH_ENABLED", "false").lower() == "true"
+SNOW_BATCH_SIZE = int(os.getenv("SNOW_BATCH_SIZE", "20"))
+SNOW_BATCH_WINDOW_MS = float(os.getenv("SNOW_BATCH_WINDOW_MS", "200"))
+SNOW_BATCH_TIMEOUT_S = float(os.getenv("SNOW_BATCH_TIMEOUT_S", "30"))
+# Parallel direct PATCHes for updates the batch API did not service
+SNOW_FALLBACK_CONCURRENCY = int(os.getenv("SNOW_FALLBACK_CONCURRENCY", "8"))
+
+BATCH_PATH = "/api/now/v1/batch"
+# Before coalescing every ticket cost two PATCHes (fields+note, then state)
+REQUESTS_PER_TICKET_BEFORE = 2
+
+
+# ============================================================
+# 1️⃣ Requests-saved accounting
+# ============================================================
+
+class WriteStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tickets = 0
+        self.http_requests = 0
+        self.batches = 0
+        self.fallbacks = 0
+
+    def record(self, tickets: int, http_requests: int, batch: bool = False):
+        with self.lock:
+            self.tickets += tickets
+            self.http_requests += http_requests
+            self.batches += int(batch)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            tickets, http_requests = self.tickets, self.http_requests
+            batches, fallbacks = self.batches, self.fallbacks
+        per_ticket = (http_requests / tickets) if tickets else None
+        return {
+            "batch_enabled": SNOW_BATCH_ENABLED,
+            "tickets_updated": tickets,
+            "http_requests": http_requests,
+            "batches": batches,
+            "batch_fallbacks": fallbacks,
+            "requests_per_ticket": round(per_ticket, 3) if per_ticket is not None else None,
+            "requests_saved_per_ticket": round(REQUESTS_PER_TICKET_BEFORE - per_ticket, 3) if per_ticket is not None else None,
+        }
+
+
+write_stats = WriteStats()
+
+
+# ============================================================
+# 2️⃣ Batch writer
+# ============================================================
+
+def _encode_body(payload: dict) -> str:
+    return base64.b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+
+def _decode_body(body: str):
+    if not body:
+        return {}
+    raw = base64.b64decode(body).decode("utf-8")
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
+
+
+def _merge_payloads(current: dict, new: dict) -> dict:
+    """Two updates for the same ticket inside one window → one PATCH (notes concatenated)."""
+    merged = dict(current)
+    for key, value in new.items():
+        if key == "work_notes" and merged.get(key):
+            merged[key] = f"{merged[key]}\n\n{value}"
+        else:
+            merged[key] = value
+    return merged
+
+
+def _nothing_sent(exc) -> bool:
+    """True only when the batch request provably never reached ServiceNow."""
+    if isinstance(exc, (CircuitOpenError, requests.exceptions.ConnectTimeout)):
+        return True
+    if isinstance(exc, requests.exceptions.ConnectionError):
+        reason = getattr(exc.args[0], "reason", exc.args[0]) if exc.args else None
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+def _unknown_outcome(reason: str) -> tuple:
+    # Work notes are journal appends: replaying a batch that may have been
+    # applied would post every note twice, so the caller gets a failure instead
+    return False, {"error": f"ServiceNow batch outcome unknown ({reason}); not retried", "outcome_unknown": True}
+
+
+class ServiceNowBatchWriter:
+    """
+    Collects incident PATCHes from any thread and sends them as ServiceNow
+    batch API requests. submit() returns a Future of (ok_bool, response,
+    batch_info). The batch request runs in the trace context of its first
+    ticket, and a fallback PATCH runs in its own ticket's context.
+    """
+
+    def __init__(self, tenant: str = None, batch_size: int = SNOW_BATCH_SIZE, window_ms: float = SNOW_BATCH_WINDOW_MS):
+        self.tenant = tenant
+        self.batch_size = max(1, batch_size)
+        self.window_s = window_ms / 1000.0
+        self.cond = threading.Condition()
+        self.pending = {}          # sys_id -> (payload, [futures], first submitter's contextvars.Context)
+        self.first_pending_at = None
+        self._started_pid = None
+        self._fallback_pool = None
+
+    def _ensure_started(self):
+        # Flusher thread and fallback pool are started lazily, once per (forked) process
+        if self._started_pid != os.getpid():
+            self._started_pid = os.getpid()
+            self._fallback_pool = ThreadPoolExecutor(max_workers=max(1, SNOW_FALLBACK_CONCURRENCY),
+                                                     thread_name_prefix="snow-fallback")
+            threading.Thread(target=self._flush_loop, name=f"snow-batch-writer-{self.tenant or 'default'}",
+                             daemon=True).start()
+
+    def _patch_directly(self, sys_id: str, payload: dict, futures: list, context, info: dict):
+        """One direct PATCH on the fallback pool; the flusher thread never waits for it."""
+        with write_stats.lock:
+            write_stats.fallbacks += 1
+
+        def run():
+            try:
+                ok, resp = _patch_incident(sys_id, payload, tenant=self.tenant)
+            except Exception as e:
+                ok, resp = False, {"error": f"ServiceNow PATCH failed: {e}"}
+            write_stats.record(0, 1)
+            for future in futures:
+                if not future.done():
+                    future.set_result((ok, resp, {**info, "fallback": True}))
+
+        # The ticket's own trace gets the http span of its PATCH (a copy: the
+        # flusher may still be running inside the first ticket's context)
+        self._fallback_pool.submit(context.copy().run, run)
+
+    def submit(self, sys_id: str, payload: dict) -> Future:
+        future = Future()
+        with self.cond:
+            self._ensure_started()
+            if sys_id in self.pending:
+                merged, futures, context = self.pending[sys_id]
+                self.pending[sys_id] = (_merge_payloads(merged, payload), futures + [future], context)
+            else:
+                self.pending[sys_id] = (dict(payload), [future], contextvars.copy_context())
+            if self.first_pending_at is None:
+                self.first_pending_at = time.monotonic()
+            self.cond.notify()
+        return future
+
+    def _take_due(self):
+        """Blocks until a batch is full or its window elapsed, then drains it."""
+        with self.cond:
+            while True:
+                if self.pending:
+                    waited = time.monotonic() - self.first_pending_at
+                    if len(self.pending) >= self.batch_size or waited >= self.window_s:
+                        break
+                    self.cond.wait(self.window_s - waited)
+                else:
+                    self.cond.wait()
+            items = list(self.pending.items())[:self.batch_size]
+            for sys_id, _ in items:
+                del self.pending[sys_id]
+            self.first_pending_at = time.monotonic() if self.pending else None
+            return items
+
+    def _flush_loop(self):
+        while True:
+            items = self._take_due()
+            # The batch HTTP span lands in the first ticket's trace
+            context = items[0][1][2]
+            info = {"size": len(items), "request_id": context.run(current_request_id)}
+            try:
+                context.run(self._send, items, info)
+            except Exception as e:
+                logger.exception("ServiceNow batch flush failed")
+                for _, (_, futures, _) in items:
+                    for future in futures:
+                        if not future.done():
+                            future.set_result((False, {"error": f"Batch flush failed: {e}"}, info))
+
+    def _send(self, items, info: dict):
+        target = servicenow_target(self.tenant)
+        config_error = _check_config(target)
+        if config_error:
+            for _, (_, futures, _) in items:
+                for future in futures:
+                    future.set_result((False, config_error, info))
+            return
+
+        headers = [{"name": k, "value": v} for k, v in _headers().items()]
+        by_id = {}
+        rest_requests = []
+        for sys_id, (payload, futures, context) in items:
+            request_id = uuid.uuid4().hex
+            by_id[request_id] = (sys_id, payload, futures, context)
+            rest_requests.append({
+                "id": request_id,
+                "url": f"/api/now/table/incident/{sys_id}",
+                "method": "PATCH",
+                "headers": headers,
+                "body": _encode_body(payload),
+            })
+
+        body = {"batch_request_id": uuid.uuid4().hex, "rest_requests": rest_requests}
+        # ids that provably were not applied and may be sent again as direct PATCHes
+        resend = set()
+        data = {}
+        unknown = None
+        try:
+            with timed("servicenow_batch"):
+                resp = get_backend(target["backend"]).request(
+                    "POST", BATCH_PATH,
+                    auth=(target["user"], target["password"]), headers=_headers(), json=body,
+                    timeout=SNOW_BATCH_TIMEOUT_S,
+                )
+            if 200 <= resp.status_code < 300:
+                data = resp.json()
+                resend = {r.get("id") if isinstance(r, dict) else r for r in data.get("unserviced_requests", [])}
+            elif 400 <= resp.status_code < 500:
+                # Rejected as a whole (batch API unavailable, auth, malformed): nothing applied
+                logger.warning("ServiceNow batch request rejected (HTTP %s); sending PATCHes individually",
+                               resp.status_code)
+                resend = set(by_id)
+            else:
+                unknown = f"HTTP {resp.status_code}"
+        except (requests.exceptions.RequestException, CircuitOpenError) as e:
+            if _nothing_sent(e):
+                logger.warning("ServiceNow batch request not sent (%s); sending PATCHes individually", e)
+                resend = set(by_id)
+            else:
+                unknown = type(e).__name__
+        except ValueError as e:
+            unknown = f"unreadable response: {e}"
+        if unknown:
+            logger.warning("ServiceNow batch of %d updates failed with unknown outcome (%s); not replaying",
+                           len(by_id), unknown)
+
+        write_stats.record(len(items), 1, batch=True)
+
+        for served in data.get("serviced_requests", []):
+            entry = by_id.pop(served.get("id"), None)
+            if entry is None:
+                continue
+            status = int(served.get("status_code") or 0)
+            result = _decode_body(served.get("body"))
+            ok = 200 <= status < 300
+            if not ok and isinstance(result, dict):
+                result.setdefault("http_status", status)
+            for future in entry[2]:
+                future.set_result((ok, result, info))
+
+        # Unserviced, or the batch never reached ServiceNow → direct PATCHes, concurrently.
+        # Anything else may already be applied and is reported as failed, never replayed.
+        for request_id, (sys_id, payload, futures, context) in by_id.items():
+            if request_id in resend:
+                self._patch_directly(sys_id, payload, futures, context, info)
+            else:
+                ok, result = _unknown_outcome(unknown or "not in the batch response")
+                for future in futures:
+                    future.set_result((ok, result, info))
+
+
+_writers = {}
+_writer_lock = threading.Lock()
+
+
+def get_batch_writer(tenant: str = None) -> ServiceNowBatchWriter:
+    """One writer per ServiceNow instance: None is the default tenant's."""
+    with _writer_lock:
+        if tenant not in _writers:
+            _writers[tenant] = ServiceNowBatchWriter(tenant)
+        return _writers[tenant]
+
+
+# ============================================================
+# 3️⃣ Entry point used by app.py
+# ============================================================
+
+def write_incident_update(ticket_id: str, payload: dict, tenant: str = None):
+    """
+    Sends one coalesced incident update to the tenant's instance, batched
+    when SNOW_BATCH_ENABLED. Returns (ok_bool, response_json_or_text) like
+    _patch_incident.
+    """
+    tenant = servicenow_target(tenant)["tenant"]   # default tenant -> None
+    if not SNOW_BATCH_ENABLED:
+        result = _patch_incident(ticket_id, payload, tenant=tenant)
+        write_stats.record(1, 1)
+        return result
+
+    future = get_batch_writer(tenant).submit(ticket_id, payload)
+    try:
+        ok, resp, info = future.result(timeout=SNOW_BATCH_TIMEOUT_S + SNOW_BATCH_WINDOW_MS / 1000.0 + 5)
+    except Exception as e:
+        tag_current(snow_batch_status="timeout")
+        return False, {"error": f"ServiceNow batch write timed out: {e}"}
+    # The batch request's http span (with retries) is in the trace named by snow_batch_request_id
+    tag_current(snow_batch_size=info["size"], snow_batch_request_id=info["request_id"],
+                snow_batch_fallback=info.get("fallback"), snow_batch_ok=ok,
+                snow_batch_outcome_unknown=isinstance(resp, dict) and resp.get("outcome_unknown") or None)
+    return ok, resp
+
+
+def get_write_stats() -> dict:
+    return write_stats.snapshot()
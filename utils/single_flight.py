@@ -0,0 +1,118 @@
+# utils/single_flight.py
+"""
+In-flight deduplication for repeated webhook deliveries.
+
+Concurrent calls with the same key share one execution of fn (the leader's);
+the result is then kept for IDEMPOTENCY_WINDOW_S so late replays of the same
+delivery get it back without re-running the pipeline.
+State is per process.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+IDEMPOTENCY_WINDOW_S = float(os.getenv("IDEMPOTENCY_WINDOW_S", "60"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+# Also share RAG + decision + remediation between different tickets with identical query+CI
+DEDUP_BY_CONTENT = os.getenv("DEDUP_BY_CONTENT", "false").lower() == "true"
+
+LEADER, JOINED, REPLAYED = "leader", "joined", "replayed"
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, window_s: float = IDEMPOTENCY_WINDOW_S, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.window_s = window_s
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.completed = OrderedDict()     # key -> (expires_at, result)
+        self.counts = {LEADER: 0, JOINED: 0, REPLAYED: 0, "errors": 0}
+
+    def _expire(self, now: float):
+        while self.completed:
+            key, (expires_at, _) = next(iter(self.completed.items()))
+            if expires_at > now and len(self.completed) <= self.max_entries:
+                break
+            self.completed.popitem(last=False)
+
+    def do(self, key: str, fn):
+        """
+        Returns (result, how) where how is "leader" | "joined" | "replayed".
+        Exceptions from the leader propagate to everyone attached and are not cached.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._expire(now)
+            if key in self.completed:
+                self.counts[REPLAYED] += 1
+                return self.completed[key][1], REPLAYED
+            call = self.in_flight.get(key)
+            if call is not None:
+                self.counts[JOINED] += 1
+                leader = False
+            else:
+                call = self.in_flight[key] = _Call()
+                self.counts[LEADER] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, JOINED
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            with self.lock:
+                self.counts["errors"] += 1
+            raise
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+                if call.error is None and self.window_s > 0:
+                    self.completed[key] = (time.monotonic() + self.window_s, call.result)
+            call.done.set()
+        return call.result, LEADER
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {**self.counts, "in_flight": len(self.in_flight), "cached": len(self.completed)}
+
+
+def ticket_key(ticket_id: str, tenant: str = None, payload: dict = None) -> str:
+    # Tenants have their own ServiceNow instances, so ticket IDs can collide
+    key = f"ticket:{tenant}:{ticket_id}" if tenant else f"ticket:{ticket_id}"
+    if payload is not None:
+        # Only an identical delivery replays; an edited query / CI on the same ticket runs again
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        key += ":" + hashlib.sha256(encoded).hexdigest()[:16]
+    return key
+
+
+def content_key(query: str, ci: str, tenant: str = None) -> str:
+    normalized = f"{' '.join((query or '').lower().split())}\x00{(ci or '').strip().lower()}"
+    if tenant:
+        normalized += f"\x00{tenant}"
+    return "content:" + hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+
+_flight = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    return _flight
@@ -0,0 +1,130 @@
+# utils/structured_output.py
+import json
+import re
+
+
+def llm_text(llm_response) -> str:
+    """Normalize a LangChain LLM response (str or message list) to plain text."""
+    if isinstance(llm_response, list):
+        return llm_response[0].content
+    return str(llm_response)
+
+
+class InvalidJSONError(ValueError):
+    """The completion arrived but holds no usable JSON object (as opposed to a failed LLM call)."""
+
+
+def extract_json_object(text: str) -> dict:
+    """
+    Pull the JSON object out of an LLM completion.
+    Strips ```json fences and takes the outermost {...} block.
+    Raises InvalidJSONError (a ValueError) if nothing parseable is found.
+    """
+    cleaned = (text or "").strip()
+    if cleaned.startswith("```json"):
+        cleaned = cleaned.replace("```json", "").replace("```", "").strip()
+    elif cleaned.startswith("```"):
+        cleaned = cleaned.replace("```", "").strip()
+
+    match = re.search(r'\{.*\}', cleaned, re.DOTALL)
+    if not match:
+        raise InvalidJSONError(f"No JSON found in output: {(text or '')[:200]}")
+
+    try:
+        obj = json.loads(match.group())
+    except ValueError as e:
+        raise InvalidJSONError(f"{e}. Output was: {(text or '')[:200]}") from e
+    if not isinstance(obj, dict):
+        raise InvalidJSONError("Top-level JSON value is not an object")
+    return obj
+
+
+def validate_fields(obj: dict, schema: dict):
+    """
+    Validate each field of `obj` against `schema` independently.
+
+    schema maps field name -> callable(value) returning True when valid.
+    Returns (valid_fields, invalid_field_names) so callers can repair only
+    the fields that failed instead of discarding the whole object.
+    """
+    valid, invalid = {}, []
+    for field, check in schema.items():
+        value = obj.get(field) if isinstance(obj, dict) else None
+        try:
+            ok = bool(check(value))
+        except Exception:
+            ok = False
+        if ok:
+            valid[field] = value
+        else:
+            invalid.append(field)
+    return valid, invalid
+
+
+class IncrementalJSONParser:
+    """
+    Feed streamed text; returns the first complete, valid top-level JSON
+    object as soon as its closing brace arrives. Prose or code fences
+    around the object are skipped, so generation can be stopped right away.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, text: str):
+        for ch in text:
+            if self.depth == 0:
+                if ch == "{":
+                    self.buffer = [ch]
+                    self.depth = 1
+                continue
+
+            self.buffer.append(ch)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        return json.loads("".join(self.buffer))
+                    except ValueError:
+                        # Balanced but not JSON (e.g. "{placeholder}" in prose); keep scanning
+                        self.buffer = []
+        return None
+
+
+def complete_json(llm, prompt: str, max_tokens: int = None, stop=None):
+    """
+    Streams a completion and stops generation once a balanced, valid JSON
+    object is complete. Returns (obj, raw_text); falls back to
+    extract_json_object on the full text if the stream ends first.
+    """
+    parser = IncrementalJSONParser()
+    parts = []
+    kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+    stream = llm.stream(prompt, stop=stop, **kwargs)
+    try:
+        for chunk in stream:
+            text = chunk if isinstance(chunk, str) else getattr(chunk, "content", str(chunk))
+            parts.append(text)
+            obj = parser.feed(text)
+            if isinstance(obj, dict):
+                return obj, "".join(parts)
+    finally:
+        # Closing the generator closes the provider's HTTP stream
+        stream.close()
+
+    raw = "".join(parts)
+    return extract_json_object(raw), raw
@@ -0,0 +1,61 @@
+from langchain.llms.base import LLM
+import hashlib
+import json
+import threading
+import time
+from utils.metrics import record_llm_call
+from utils.tracing import span
+
+
+class StubLangChainWrapper(LLM):
+    """
+    Deterministic offline LLM for tests, benchmarks and router experiments.
+    Latency is base_latency_s plus a jitter derived from the prompt hash;
+    every `fail_every`-th call returns an error string like the real wrappers.
+    """
+    provider_name: str = "stub"
+    base_latency_s: float = 0.05
+    jitter_s: float = 0.0
+    fail_every: int = 0
+    max_tokens: int = 1024
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _next_call_number(self) -> int:
+        # Per-instance counter kept outside pydantic fields
+        lock = self.__dict__.setdefault("_lock", threading.Lock())
+        with lock:
+            n = self.__dict__.get("_calls", 0) + 1
+            self.__dict__["_calls"] = n
+        return n
+
+    def _call(self, prompt: str, stop=None, **kwargs) -> str:
+        start = time.perf_counter()
+        with span(f"llm:{self.provider_name}", kind="CLIENT", prompt_chars=len(prompt)):
+            text = self._respond(prompt)
+        record_llm_call(self.provider_name, time.perf_counter() - start, not text.startswith("Stub Error:"))
+        return text
+
+    def _respond(self, prompt: str) -> str:
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        time.sleep(self.base_latency_s + self.jitter_s * digest[0] / 255.0)
+
+        if self.fail_every and self._next_call_number() % self.fail_every == 0:
+            return f"Stub Error: simulated failure from {self.provider_name}"
+
+        if "JSON" in prompt:
+            return json.dumps({
+                "action": "none",
+                "confidence": 0.0,
+                "reasoning": f"stub decision from {self.provider_name}",
+                "suggestion_steps": ["Check service status.", "Review recent changes.", "Escalate if unresolved."],
+                "assignment_group": "Service Desk",
+                "invoice_payload": None,
+            })
+        return (
+            "1. Check service status.\n"
+            "2. Review recent changes.\n"
+            "3. Escalate to Service Desk if unresolved."
+        )
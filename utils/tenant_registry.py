@@ -0,0 +1,238 @@
+# utils/tenant_registry.py
+"""
+Per-tenant FAISS index, metadata and config, loaded on first use.
+
+Tenants are declared in TENANTS_FILE (JSON):
+
+    {
+      "emea": {
+        "faiss_index_file": "data/emea/faiss_index.index",
+        "embeddings_file": "data/emea/embeddings_data.pkl",
+        "group_centroids_file": "data/emea/group_centroids.pkl",
+        "top_k": 8,
+        "servicenow": {
+          "instance": "https://emea.service-now.com",
+          "username_env": "EMEA_SNOW_USERNAME",
+          "password_env": "EMEA_SNOW_PASSWORD",
+          "assignment_groups": {"Network Operations": "EMEA Network L2"}
+        }
+      }
+    }
+
+Every tenant corpus must be embedded with the shared SentenceTransformer
+in utils/vector_store.py; only the index and metadata are per tenant.
+Ticket updates go to the tenant's own ServiceNow instance ("servicenow",
+see utils/servicenow_api.servicenow_target).
+Resident tenants are kept in LRU order and the least recently used ones
+are evicted once their estimated footprint exceeds TENANT_MEMORY_BUDGET_MB
+or more than TENANT_MAX_RESIDENT are loaded. The default tenant is the
+index utils/vector_store.py loads at import; it is never evicted and is
+not counted against the budget.
+"""
+import os
+import json
+import time
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+import faiss
+from dotenv import load_dotenv
+from utils.metrics import counter, histogram, register_collector
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TENANTS_FILE = os.getenv("TENANTS_FILE", "tenants.json")
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+TENANT_HEADER = "X-Tenant"
+TENANT_MEMORY_BUDGET_MB = float(os.getenv("TENANT_MEMORY_BUDGET_MB", "2048"))
+TENANT_MAX_RESIDENT = int(os.getenv("TENANT_MAX_RESIDENT", "8"))
+
+# Keys in a tenant entry that name artifacts; everything else is tenant config
+FILE_KEYS = ("faiss_index_file", "embeddings_file", "group_centroids_file")
+
+TENANT_LOADS = counter("tenant_index_loads_total", "Tenant indexes loaded from disk", ("tenant",))
+TENANT_EVICTIONS = counter("tenant_index_evictions_total", "Tenant indexes evicted from memory", ("tenant",))
+TENANT_LOAD_LATENCY = histogram("tenant_index_load_seconds", "Time to load one tenant index + metadata",
+                                buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+
+
+class UnknownTenant(Exception):
+    pass
+
+
+def is_default_tenant(tenant) -> bool:
+    return not tenant or tenant == DEFAULT_TENANT
+
+
+class TenantIndex:
+    __slots__ = ("tenant", "index", "metadata", "codec", "group_centroids", "config", "footprint_bytes", "loaded_at")
+
+    def __init__(self, tenant, index, metadata, codec, group_centroids, config, footprint_bytes):
+        self.tenant = tenant
+        self.index = index
+        self.metadata = metadata
+        self.codec = codec
+        self.group_centroids = group_centroids
+        self.config = config
+        self.footprint_bytes = footprint_bytes
+        self.loaded_at = time.time()
+
+
+class TenantRegistry:
+    def __init__(self, tenants: dict, model_name: str,
+                 budget_bytes: float = TENANT_MEMORY_BUDGET_MB * 2 ** 20, max_resident: int = TENANT_MAX_RESIDENT):
+        self.tenants = tenants
+        self.model_name = model_name
+        self.budget_bytes = budget_bytes
+        self.max_resident = max(1, max_resident)
+        self.lock = threading.Lock()
+        self.resident = OrderedDict()
+        self.load_locks = {}
+        self.counts = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0}
+
+    def config(self, tenant: str) -> dict:
+        if tenant not in self.tenants:
+            raise UnknownTenant(f"unknown tenant '{tenant}'")
+        return {k: v for k, v in self.tenants[tenant].items() if k not in FILE_KEYS}
+
+    def get(self, tenant: str) -> TenantIndex:
+        """Resident TenantIndex for `tenant`, loading (and evicting) as needed."""
+        if tenant not in self.tenants:
+            raise UnknownTenant(f"unknown tenant '{tenant}'")
+        with self.lock:
+            entry = self.resident.get(tenant)
+            if entry is not None:
+                self.resident.move_to_end(tenant)
+                self.counts["hits"] += 1
+                return entry
+            self.counts["misses"] += 1
+            load_lock = self.load_locks.setdefault(tenant, threading.Lock())
+
+        # One load per tenant at a time; other tenants keep being served
+        with load_lock:
+            with self.lock:
+                entry = self.resident.get(tenant)
+                if entry is not None:
+                    self.resident.move_to_end(tenant)
+                    return entry
+            entry = self._load(tenant)
+            with self.lock:
+                self.resident[tenant] = entry
+                self.counts["loads"] += 1
+                self._evict()
+        return entry
+
+    def _load(self, tenant: str) -> TenantIndex:
+        spec = self.tenants[tenant]
+        start = time.perf_counter()
+        index = faiss.read_index(spec["faiss_index_file"])
+        with open(spec["embeddings_file"], "rb") as f:
+            data = pickle.load(f)
+
+        model_name = (data.get("model_info") or {}).get("model_name", self.model_name)
+        if model_name != self.model_name:
+            raise ValueError(f"tenant '{tenant}' was embedded with {model_name}, not the shared {self.model_name}")
+        if len(data["metadata"]) != index.ntotal:
+            raise ValueError(f"tenant '{tenant}': {index.ntotal} vectors but {len(data['metadata'])} metadata records")
+
+        # The vectors are already in the index; only the metadata stays resident
+        footprint = os.path.getsize(spec["faiss_index_file"])
+        footprint += max(0, os.path.getsize(spec["embeddings_file"]) - getattr(data.get("embeddings"), "nbytes", 0))
+        group_centroids = None
+        centroids_file = spec.get("group_centroids_file")
+        if centroids_file and os.path.exists(centroids_file):
+            with open(centroids_file, "rb") as f:
+                group_centroids = pickle.load(f)
+            footprint += os.path.getsize(centroids_file)
+
+        elapsed = time.perf_counter() - start
+        TENANT_LOADS.inc(tenant=tenant)
+        TENANT_LOAD_LATENCY.observe(elapsed)
+        logger.info("📌 Loaded tenant %s: %d vectors, ~%.1f MB in %.2fs",
+                    tenant, index.ntotal, footprint / 2 ** 20, elapsed)
+        return TenantIndex(tenant, index, data["metadata"], data.get("codec"), group_centroids,
+                           self.config(tenant), footprint)
+
+    def _evict(self):
+        """Caller holds self.lock. The newest entry is never evicted."""
+        while len(self.resident) > 1 and (
+                len(self.resident) > self.max_resident or self.resident_bytes() > self.budget_bytes):
+            tenant, entry = self.resident.popitem(last=False)
+            self.counts["evictions"] += 1
+            TENANT_EVICTIONS.inc(tenant=tenant)
+            logger.info("♻️ Evicted tenant %s (~%.1f MB)", tenant, entry.footprint_bytes / 2 ** 20)
+        if self.resident_bytes() > self.budget_bytes:
+            tenant = next(iter(self.resident))
+            logger.warning("tenant %s alone exceeds TENANT_MEMORY_BUDGET_MB", tenant)
+
+    def resident_bytes(self) -> int:
+        return sum(entry.footprint_bytes for entry in self.resident.values())
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                **self.counts,
+                "tenants": len(self.tenants),
+                "resident": list(self.resident),
+                "resident_bytes": self.resident_bytes(),
+                "budget_bytes": int(self.budget_bytes),
+            }
+
+
+def _read_tenants(path: str) -> dict:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        tenants = json.load(f)
+    for name, spec in tenants.items():
+        missing = [k for k in ("faiss_index_file", "embeddings_file") if not spec.get(k)]
+        if missing:
+            raise ValueError(f"{path}: tenant '{name}' is missing {', '.join(missing)}")
+        snow = spec.get("servicenow")
+        if snow is None:
+            logger.warning("%s: tenant '%s' has no servicenow instance; its ticket updates will fail", path, name)
+        elif not snow.get("instance") or not isinstance(snow.get("assignment_groups", {}), dict):
+            raise ValueError(f"{path}: tenant '{name}' servicenow needs an instance "
+                             f"(and assignment_groups must be an object)")
+    tenants.pop(DEFAULT_TENANT, None)   # always the index utils/vector_store.py loads
+    return tenants
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_tenant_registry() -> TenantRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                from utils.vector_store import EMBEDDING_MODEL_NAME
+                _registry = TenantRegistry(_read_tenants(TENANTS_FILE), EMBEDDING_MODEL_NAME)
+                if _registry.tenants:
+                    logger.info("📌 %d tenants declared in %s", len(_registry.tenants), TENANTS_FILE)
+    return _registry
+
+
+def known_tenant(tenant) -> bool:
+    return is_default_tenant(tenant) or tenant in get_tenant_registry().tenants
+
+
+def get_tenant_stats() -> dict:
+    return get_tenant_registry().stats()
+
+
+def _tenant_metrics():
+    stats = get_tenant_stats()
+    yield ("tenant_indexes_resident", "gauge", "Tenant indexes in memory (excl. default)",
+           [({}, len(stats["resident"]))])
+    yield ("tenant_index_resident_bytes", "gauge", "Estimated footprint of resident tenant indexes",
+           [({}, stats["resident_bytes"])])
+    yield ("tenant_index_lookups_total", "counter", "Tenant index lookups by result",
+           [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])])
+
+
+register_collector(_tenant_metrics)
@@ -0,0 +1,308 @@
+# utils/tracing.py
+"""
+Per-request span tracing.
+
+A trace is started per HTTP request (or queued job) and carried in a
+contextvar, so span() anywhere below it — timed() stages, LLM calls,
+outbound HTTP — nests under the right parent without passing anything
+around. Outside a trace span() is a no-op.
+
+Finished traces are written as Zipkin v2 JSON (one array of spans per
+line) to a rotating file; traces slower than SLOW_REQUEST_THRESHOLD_S are
+also written to the slow-request log as an indented span tree with tags
+(prompt sizes, token counts, statuses, retries).
+"""
+import os
+import re
+import time
+import json
+import uuid
+import random
+import hashlib
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_FILE_MAX_MB = float(os.getenv("TRACE_FILE_MAX_MB", "50"))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "5"))
+# Share of traces written to TRACE_FILE; slow requests are always logged
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+SLOW_REQUEST_THRESHOLD_S = float(os.getenv("SLOW_REQUEST_THRESHOLD_S", "10"))
+SLOW_REQUEST_LOG = os.getenv("SLOW_REQUEST_LOG", "slow_requests.log")
+# Pre-fork servers: each process writes <name>.<pid><ext>, so no two processes
+# append to (or roll over) the same file. serve.py turns this on.
+TRACE_FILE_PER_PROCESS = os.getenv("TRACE_FILE_PER_PROCESS", "false").lower() == "true"
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "ticket-resolver")
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Client-supplied IDs end up in log lines, headers and file names; anything else is replaced
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+
+
+def _now_us() -> int:
+    return int(time.time() * 1_000_000)
+
+
+def _span_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def valid_request_id(request_id) -> bool:
+    return isinstance(request_id, str) and REQUEST_ID_PATTERN.fullmatch(request_id) is not None
+
+
+def trace_id_for(request_id: str) -> str:
+    """Zipkin needs 16 or 32 hex chars; other request IDs are hashed to 32."""
+    rid = (request_id or "").lower()
+    if len(rid) in (16, 32) and all(c in "0123456789abcdef" for c in rid):
+        return rid
+    return hashlib.sha256(rid.encode("utf-8")).hexdigest()[:32]
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_us", "duration_us", "tags", "annotations")
+
+    def __init__(self, trace, name: str, parent_id=None, kind=None, tags=None):
+        self.trace = trace
+        self.span_id = _span_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_us = _now_us()
+        self.duration_us = None
+        self.tags = dict(tags or {})
+        self.annotations = []
+
+    def tag(self, **tags):
+        self.tags.update(tags)
+
+    def annotate(self, value: str):
+        self.annotations.append({"timestamp": _now_us(), "value": value})
+
+    def finish(self):
+        self.duration_us = max(1, _now_us() - self.start_us)
+        self.trace.add(self)
+
+    def to_zipkin(self) -> dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "id": self.span_id,
+            "name": self.name,
+            "timestamp": self.start_us,
+            "duration": self.duration_us,
+            "localEndpoint": {"serviceName": SERVICE_NAME},
+            "tags": {k: str(v) for k, v in self.tags.items() if v is not None},
+        }
+        if self.parent_id:
+            span["parentId"] = self.parent_id
+        if self.kind:
+            span["kind"] = self.kind
+        if self.annotations:
+            span["annotations"] = self.annotations
+        return span
+
+
+class Trace:
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.trace_id = trace_id_for(request_id)
+        self.lock = threading.Lock()
+        self.spans = []
+
+    def add(self, span: Span):
+        with self.lock:
+            self.spans.append(span)
+
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+# ============================================================
+# 1️⃣ Span API
+# ============================================================
+
+def current_span():
+    return _current_span.get()
+
+
+def current_request_id():
+    span = _current_span.get()
+    return span.trace.request_id if span else None
+
+
+@contextmanager
+def span(name: str, kind: str = None, **tags):
+    """Child of the current span; yields the Span (None outside a trace)."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent.span_id, kind, tags)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.tag(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current_span.reset(token)
+        child.finish()
+
+
+def start_span(name: str, kind: str = None, **tags):
+    """
+    Child of the current span that is NOT made current, for generators whose
+    body outlives one context; the caller must call .finish(). None outside a trace.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    return Span(parent.trace, name, parent.span_id, kind, tags)
+
+
+def tag_current(**tags):
+    span_ = _current_span.get()
+    if span_ is not None:
+        span_.tag(**tags)
+
+
+def annotate_current(value: str):
+    span_ = _current_span.get()
+    if span_ is not None:
+        span_.annotate(value)
+
+
+def outbound_headers() -> dict:
+    """Request ID + B3 single header for calls to other services."""
+    span_ = _current_span.get()
+    if span_ is None:
+        return {}
+    return {
+        REQUEST_ID_HEADER: span_.trace.request_id,
+        "b3": f"{span_.trace.trace_id}-{span_.span_id}-1",
+    }
+
+
+# ============================================================
+# 2️⃣ Trace lifecycle
+# ============================================================
+
+def start_trace(name: str, request_id: str = None, kind: str = "SERVER", **tags):
+    """
+    Opens the root span and makes it current. Returns (root, token) for
+    end_trace(), or (None, None) when tracing is off.
+    """
+    if not TRACING_ENABLED:
+        return None, None
+    if not valid_request_id(request_id):
+        request_id = uuid.uuid4().hex
+    root = Span(Trace(request_id), name, kind=kind, tags=tags)
+    return root, _current_span.set(root)
+
+
+def end_trace(root, token, **tags):
+    if root is None:
+        return
+    root.tag(**tags)
+    try:
+        _current_span.reset(token)
+    except ValueError:
+        # Finished from a different context (e.g. a streamed response)
+        _current_span.set(None)
+    root.finish()
+    try:
+        _export(root)
+    except Exception as e:
+        logger.warning("trace export failed: %s", e)
+
+
+@contextmanager
+def trace(name: str, request_id: str = None, kind: str = None, **tags):
+    """start_trace/end_trace as a block, for work outside a Flask request."""
+    root, token = start_trace(name, request_id, kind, **tags)
+    try:
+        yield root
+    except Exception as e:
+        if root is not None:
+            root.tag(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        end_trace(root, token)
+
+
+# ============================================================
+# 3️⃣ Export
+# ============================================================
+
+_writers_lock = threading.Lock()
+_writers = {}
+
+
+def _process_path(path: str) -> str:
+    if not TRACE_FILE_PER_PROCESS:
+        return path
+    base, ext = os.path.splitext(path)
+    return f"{base}.{os.getpid()}{ext}"
+
+
+def _writer(name: str, path: str) -> logging.Logger:
+    """One file handler per (name, pid); a handler inherited across fork is not reused."""
+    key = (name, os.getpid())
+    with _writers_lock:
+        if key not in _writers:
+            path = _process_path(path)
+            out = logging.getLogger(f"tracing.{name}.{os.getpid()}")
+            out.propagate = False
+            out.setLevel(logging.INFO)
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(path, maxBytes=int(TRACE_FILE_MAX_MB * 2 ** 20),
+                                          backupCount=TRACE_FILE_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            out.addHandler(handler)
+            _writers[key] = out
+        return _writers[key]
+
+
+def _export(root: Span):
+    with root.trace.lock:
+        spans = sorted(root.trace.spans, key=lambda s: s.start_us)
+    if TRACE_FILE and random.random() < TRACE_SAMPLE_RATE:
+        _writer("spans", TRACE_FILE).info(json.dumps([s.to_zipkin() for s in spans], default=str))
+    duration_s = root.duration_us / 1e6
+    if SLOW_REQUEST_LOG and duration_s >= SLOW_REQUEST_THRESHOLD_S:
+        _writer("slow", SLOW_REQUEST_LOG).info(format_tree(root, spans))
+        logger.warning("slow request %s: %s took %.2fs (see %s)",
+                       root.trace.request_id, root.name, duration_s, _process_path(SLOW_REQUEST_LOG))
+
+
+def format_tree(root: Span, spans) -> str:
+    """Indented span tree: offset from start, duration, name, tags."""
+    children = {}
+    for s in spans:
+        children.setdefault(s.parent_id, []).append(s)
+    lines = [f"=== {time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(root.start_us / 1e6))} "
+             f"request_id={root.trace.request_id} trace_id={root.trace.trace_id} "
+             f"{root.name} {root.duration_us / 1000:.1f}ms"]
+
+    def walk(span_, depth):
+        tags = " ".join(f"{k}={v}" for k, v in span_.tags.items() if v is not None)
+        lines.append(f"{'  ' * depth}+{(span_.start_us - root.start_us) / 1000:>9.1f}ms "
+                     f"{span_.duration_us / 1000:>9.1f}ms  {span_.name}" + (f"  [{tags}]" if tags else ""))
+        for a in span_.annotations:
+            lines.append(f"{'  ' * (depth + 1)}@{(a['timestamp'] - root.start_us) / 1000:>8.1f}ms  {a['value']}")
+        for child in children.get(span_.span_id, []):
+            walk(child, depth + 1)
+
+    walk(root, 0)
+    return "\n".join(lines)
@@ -1,26 +1,70 @@
 
+import os
+import logging
 import faiss
 import pickle
 import numpy as np
+from functools import lru_cache
 from sentence_transformers import SentenceTransformer
+from utils.metrics import timed, register_collector
+from utils.tenant_registry import get_tenant_registry, is_default_tenant
+from utils.embedding_codec import project_queries
 
-FAISS_INDEX_FILE = "data_prep/faiss_index.index"
-EMBEDDINGS_FILE = "data_prep/embeddings_data.pkl"
+logger = logging.getLogger(__name__)
+
+FAISS_INDEX_FILE = os.getenv("FAISS_INDEX_FILE", "data_prep/faiss_index.index")
+EMBEDDINGS_FILE = os.getenv("EMBEDDINGS_FILE", "data_prep/embeddings_data.pkl")
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# Optional, built by data_prep/build_group_centroids.py
+GROUP_CENTROIDS_FILE = os.getenv("GROUP_CENTROIDS_FILE", "data_prep/group_centroids.pkl")
 
-print("📌 Loading FAISS index and metadata...")
+logger.info("📌 Loading FAISS index and metadata...")
 index = faiss.read_index(FAISS_INDEX_FILE)
 with open(EMBEDDINGS_FILE, "rb") as f:
     data = pickle.load(f)
 metadata = data["metadata"]
+# float16 / int8 / PCA settings from data_prep/generate_embeddings.py; None for plain float32
+codec = data.get("codec")
 model = SentenceTransformer(EMBEDDING_MODEL_NAME)
 
+group_centroids = None
+if os.path.exists(GROUP_CENTROIDS_FILE):
+    with open(GROUP_CENTROIDS_FILE, "rb") as f:
+        group_centroids = pickle.load(f)
+    logger.info("📌 Loaded %d assignment group centroids", len(group_centroids["groups"]))
+
 
-def search_similar(query: str, top_k: int = 5):
-    query_vec = model.encode([query], normalize_embeddings=True)
+@lru_cache(maxsize=256)
+def encode_query(query: str):
+    """
+    Normalized (1, dim) float32 query embedding.
+    Cached so retrieval and the local classifiers share one encode per ticket.
+    Callers must not modify the returned array in place.
+    """
+    query_vec = model.encode([query], normalize_embeddings=True).astype("float32")
     faiss.normalize_L2(query_vec)
-    distances, indices = index.search(query_vec, top_k)
+    return query_vec
+
+
+def search_similar(query: str, top_k: int = 5, tenant: str = None):
+    """tenant=None (or DEFAULT_TENANT) searches the index loaded above."""
+    with timed("encode"):
+        query_vec = encode_query(query)
+    if is_default_tenant(tenant):
+        tenant_index, tenant_metadata, tenant_codec = index, metadata, codec
+    else:
+        with timed("tenant_index"):
+            entry = get_tenant_registry().get(tenant)
+        tenant_index, tenant_metadata, tenant_codec = entry.index, entry.metadata, entry.codec
+    with timed("index_search"):
+        # PCA-reduced index: same projection as the stored vectors
+        distances, indices = tenant_index.search(project_queries(query_vec, tenant_codec), top_k)
 
+    with timed("materialize"):
+        return _materialize(distances, indices, tenant_metadata)
+
+
+def _materialize(distances, indices, metadata=metadata):
     results = []
     for rank, (dist, idx) in enumerate(zip(distances[0], indices[0]), 1):
         item = metadata[idx]
@@ -39,3 +83,31 @@ def search_similar(query: str, top_k: int = 5):
 
     return results
 
+
+def _encode_cache_metrics():
+    info = encode_query.cache_info()
+    yield ("query_embedding_cache_hits_total", "counter", "encode_query LRU cache hits", [({}, info.hits)])
+    yield ("query_embedding_cache_misses_total", "counter", "encode_query LRU cache misses", [({}, info.misses)])
+    yield ("query_embedding_cache_size", "gauge", "Cached query embeddings", [({}, info.currsize)])
+
+
+register_collector(_encode_cache_metrics)
+
+
+def known_assignment_groups(tenant: str = None) -> list:
+    """Group names in the tenant's centroid index, or [] without one."""
+    centroids = group_centroids if is_default_tenant(tenant) else get_tenant_registry().get(tenant).group_centroids
+    return list(centroids["groups"]) if centroids is not None else []
+
+
+def nearest_group_centroids(query: str, k: int = 2, tenant: str = None):
+    """
+    Cosine similarity of the query to each assignment-group centroid.
+    Returns [(group, similarity), ...] best first, or [] without a centroid index.
+    """
+    centroids = group_centroids if is_default_tenant(tenant) else get_tenant_registry().get(tenant).group_centroids
+    if centroids is None:
+        return []
+    sims = centroids["centroids"] @ encode_query(query)[0]
+    top = np.argsort(sims)[::-1][:k]
+    return [(centroids["groups"][i], float(sims[i])) for i in top]